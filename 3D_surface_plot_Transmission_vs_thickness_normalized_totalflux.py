@@ -1,12 +1,14 @@
-import h5py
 import numpy as np
 import pandas as pd
 import os
-import re
 import matplotlib.pyplot as plt
-from scipy.interpolate import griddata
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from Build_Spectra_Store import update_spectra_store
+from Spectra_Extraction import print_error_summary, to_wavelength_um, values_at_wavelengths
+from Surface_Interpolation import interpolate_surfaces
+from Task_Registry import campaign_tasks
+from Polarization_Synthesis import circular_spectra
 
 # --- 1. CONFIGURATION ---
 CACHE_DIR = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_Circular_polar_tasks"
@@ -14,114 +16,95 @@ EXCEL_FILE = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_t
 PLOT_DIR = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_Circular_polar_plots"
 TARGET_WLs = [0.795, 0.8, 0.895]
 
-T_PATH = "data/0/flux/__xarray_dataarray_variable__"
-FREQ_PATH = "data/0/flux/f"
+# POLARIZATION_MODE the campaign was run with (see the job script): sets the normalization
+# (Polarization_Synthesis.MODE_BEAMS) and, for "synthesize", merges the x- and y-polarized runs
+POLARIZATION_MODE = "dual_source"
+JONES = "circular"
 
 COL_TASK_ID = "Task ID"
 COL_TASK_NAME = "Task Name"
 
-if not os.path.exists(PLOT_DIR):
-    os.makedirs(PLOT_DIR)
-
-# --- 2. DATA LOADING & THICKNESS EXTRACTION ---
-df = pd.read_excel(EXCEL_FILE)
-
-def extract_thickness(name, part):
-    match = re.search(fr'{part}(\d+)', str(name))
-    return float(match.group(1)) if match else None
-
-if 'SiN_T' not in df.columns:
-    df['SiN_T'] = df[COL_TASK_NAME].apply(lambda x: extract_thickness(x, 'T'))
-    df['SiN_B'] = df[COL_TASK_NAME].apply(lambda x: extract_thickness(x, 'B'))
-
-# --- 3. HDF5 EXTRACTION ---
-results = {wl: {} for wl in TARGET_WLs}
-files = [f for f in os.listdir(CACHE_DIR) if f.endswith(".hdf5")]
-
-for filename in files:
-    task_id = filename.replace(".hdf5", "")
-    filepath = os.path.join(CACHE_DIR, filename)
-    try:
-        with h5py.File(filepath, "r") as f:
-            freqs = f[FREQ_PATH][()]
-            wavelengths = 299792458 / freqs * 1e6
-            # --- MODIFICATION: Normalize Transmission values by 2 ---
-            # Original was * 100 for %, now we divide by 2 (effectively * 50)
-            t_vals = (np.abs(f[T_PATH][()]) * 100) / 2 
-            
-            for wl in TARGET_WLs:
-                idx = np.abs(wavelengths - wl).argmin()
-                results[wl][task_id] = t_vals[idx]
-    except Exception:
-        continue
-
-# --- 4. STATIC PLOTTING (MATPLOTLIB) ---
-fig_static = plt.figure(figsize=(22, 8), dpi=300)
-
-for i, wl in enumerate(TARGET_WLs):
-    temp_df = df.copy()
-    temp_df['Transmission'] = temp_df[COL_TASK_ID].astype(str).map(results[wl])
-    temp_df = temp_df.dropna(subset=['SiN_T', 'SiN_B', 'Transmission'])
-
-    ax = fig_static.add_subplot(1, 3, i+1, projection='3d')
-    xi = np.linspace(temp_df['SiN_T'].min(), temp_df['SiN_T'].max(), 100)
-    yi = np.linspace(temp_df['SiN_B'].min(), temp_df['SiN_B'].max(), 100)
-    X, Y = np.meshgrid(xi, yi)
-    Z = griddata((temp_df['SiN_T'], temp_df['SiN_B']), temp_df['Transmission'], (X, Y), method='cubic')
-
-    surf = ax.plot_surface(X, Y, Z, cmap='viridis', edgecolor='none', alpha=0.8)
-    ax.scatter(temp_df['SiN_T'], temp_df['SiN_B'], temp_df['Transmission'], color='red', s=15)
-
-    # --- MODIFICATION: Updated Title and Z-label ---
-    ax.set_title(fr"Norm. Transmission at {wl} $\mu m$", fontsize=16, fontweight='bold', pad=20)
-    ax.set_xlabel(r"Top SiN ($\AA$)", fontsize=11, labelpad=10)
-    ax.set_ylabel(r"Bottom SiN ($\AA$)", fontsize=11, labelpad=10)
-    ax.set_zlabel("T / 2 (%)", fontsize=11, labelpad=10)
-    ax.view_init(elev=28, azim=135)
-    fig_static.colorbar(surf, ax=ax, shrink=0.5, aspect=12, pad=0.1)
-
-plt.subplots_adjust(left=0.05, right=0.95, wspace=0.3)
-static_save_path = os.path.join(PLOT_DIR, "3D_Surface_Normalized_Transmission.png")
-plt.savefig(static_save_path, bbox_inches='tight')
-
-# --- 5. INTERACTIVE PLOTTING (PLOTLY) ---
-fig_interactive = make_subplots(
-    rows=1, cols=3,
-    specs=[[{'type': 'surface'}, {'type': 'surface'}, {'type': 'surface'}]],
-    subplot_titles=[f"Norm. Transmission at {wl} µm" for wl in TARGET_WLs]
-)
-
-for i, wl in enumerate(TARGET_WLs):
-    temp_df = df.copy()
-    temp_df['Transmission'] = temp_df[COL_TASK_ID].astype(str).map(results[wl])
-    temp_df = temp_df.dropna(subset=['SiN_T', 'SiN_B', 'Transmission'])
-
-    xi = np.linspace(temp_df['SiN_T'].min(), temp_df['SiN_T'].max(), 50)
-    yi = np.linspace(temp_df['SiN_B'].min(), temp_df['SiN_B'].max(), 50)
-    X, Y = np.meshgrid(xi, yi)
-    Z = griddata((temp_df['SiN_T'], temp_df['SiN_B']), temp_df['Transmission'], (X, Y), method='linear')
 
-    fig_interactive.add_trace(
-        go.Surface(z=Z, x=xi, y=yi, colorscale='Viridis', showscale=(i == 2), name=f"{wl}µm"),
-        row=1, col=i+1
-    )
-    fig_interactive.add_trace(
-        go.Scatter3d(x=temp_df['SiN_T'], y=temp_df['SiN_B'], z=temp_df['Transmission'],
-                     mode='markers', marker=dict(size=4, color='red'), name=f"Points {wl}µm"),
-        row=1, col=i+1
+if __name__ == "__main__":
+    if not os.path.exists(PLOT_DIR):
+        os.makedirs(PLOT_DIR)
+
+    # --- 2. DATA LOADING (names and SiN_T/SiN_B come from the task registry, parsed once) ---
+    df = campaign_tasks(EXCEL_FILE).reset_index()
+
+    # --- 3. HDF5 EXTRACTION (incremental: only new or changed files are parsed) ---
+    spectra = update_spectra_store(CACHE_DIR)
+    print_error_summary(spectra["errors"], len(spectra["task_id"]) + len(spectra["errors"]))
+    # --- MODIFICATION: Normalize Transmission values by the total incident power ---
+    # One row per design; in synthesize mode the y-polarized runs are merged into their x runs
+    spectra = circular_spectra(spectra, df.set_index(COL_TASK_ID)[COL_TASK_NAME].to_dict(),
+                               POLARIZATION_MODE, JONES)
+    t_vals = spectra["T"] * 100
+    t_at_targets = values_at_wavelengths(to_wavelength_um(spectra["freq"]), t_vals, TARGET_WLs)
+    # One (SiN_T, SiN_B, T at every target) table; the surfaces below share its triangulation
+    transmission = pd.DataFrame(t_at_targets, index=spectra["task_id"])
+    df = df[df[COL_TASK_ID].astype(str).isin(transmission.index)]
+    points = df[['SiN_T', 'SiN_B']].to_numpy(dtype=float)
+    values = transmission.reindex(df[COL_TASK_ID].astype(str)).to_numpy(dtype=float)
+    surfaces = interpolate_surfaces(points, values)
+
+    # --- 4. STATIC PLOTTING (MATPLOTLIB) ---
+    fig_static = plt.figure(figsize=(22, 8), dpi=300)
+
+    xi, yi, Z_all = surfaces[("cubic", 100)]
+    X, Y = np.meshgrid(xi, yi)
+    for i, wl in enumerate(TARGET_WLs):
+        ok = np.isfinite(values[:, i]) & np.all(np.isfinite(points), axis=1)
+
+        ax = fig_static.add_subplot(1, 3, i+1, projection='3d')
+        surf = ax.plot_surface(X, Y, Z_all[:, :, i], cmap='viridis', edgecolor='none', alpha=0.8)
+        ax.scatter(points[ok, 0], points[ok, 1], values[ok, i], color='red', s=15)
+
+        # --- MODIFICATION: Updated Title and Z-label ---
+        ax.set_title(fr"Norm. Transmission at {wl} $\mu m$", fontsize=16, fontweight='bold', pad=20)
+        ax.set_xlabel(r"Top SiN ($\AA$)", fontsize=11, labelpad=10)
+        ax.set_ylabel(r"Bottom SiN ($\AA$)", fontsize=11, labelpad=10)
+        ax.set_zlabel("Norm. T (%)", fontsize=11, labelpad=10)
+        ax.view_init(elev=28, azim=135)
+        fig_static.colorbar(surf, ax=ax, shrink=0.5, aspect=12, pad=0.1)
+
+    plt.subplots_adjust(left=0.05, right=0.95, wspace=0.3)
+    static_save_path = os.path.join(PLOT_DIR, "3D_Surface_Normalized_Transmission.png")
+    plt.savefig(static_save_path, bbox_inches='tight')
+
+    # --- 5. INTERACTIVE PLOTTING (PLOTLY) ---
+    fig_interactive = make_subplots(
+        rows=1, cols=3,
+        specs=[[{'type': 'surface'}, {'type': 'surface'}, {'type': 'surface'}]],
+        subplot_titles=[f"Norm. Transmission at {wl} µm" for wl in TARGET_WLs]
     )
 
-# --- MODIFICATION: Update Z-axis title in Plotly layout ---
-fig_interactive.update_layout(
-    title="Interactive ARC Analysis (Transmission Normalized by 2)",
-    scene=dict(zaxis_title='T / 2 (%)', xaxis_title='Top SiN (Å)', yaxis_title='Bottom SiN (Å)'),
-    scene2=dict(zaxis_title='T / 2 (%)', xaxis_title='Top SiN (Å)', yaxis_title='Bottom SiN (Å)'),
-    scene3=dict(zaxis_title='T / 2 (%)', xaxis_title='Top SiN (Å)', yaxis_title='Bottom SiN (Å)'),
-    height=800, width=1800,
-    margin=dict(l=50, r=50, b=50, t=100)
-)
+    xi, yi, Z_all = surfaces[("linear", 50)]
+    for i, wl in enumerate(TARGET_WLs):
+        ok = np.isfinite(values[:, i]) & np.all(np.isfinite(points), axis=1)
+        Z = Z_all[:, :, i]
+
+        fig_interactive.add_trace(
+            go.Surface(z=Z, x=xi, y=yi, colorscale='Viridis', showscale=(i == 2), name=f"{wl}µm"),
+            row=1, col=i+1
+        )
+        fig_interactive.add_trace(
+            go.Scatter3d(x=points[ok, 0], y=points[ok, 1], z=values[ok, i],
+                         mode='markers', marker=dict(size=4, color='red'), name=f"Points {wl}µm"),
+            row=1, col=i+1
+        )
+
+    # --- MODIFICATION: Update Z-axis title in Plotly layout ---
+    fig_interactive.update_layout(
+        title=f"Interactive ARC Analysis (Transmission Normalized by Total Incident Power, {POLARIZATION_MODE})",
+        scene=dict(zaxis_title='Norm. T (%)', xaxis_title='Top SiN (Å)', yaxis_title='Bottom SiN (Å)'),
+        scene2=dict(zaxis_title='Norm. T (%)', xaxis_title='Top SiN (Å)', yaxis_title='Bottom SiN (Å)'),
+        scene3=dict(zaxis_title='Norm. T (%)', xaxis_title='Top SiN (Å)', yaxis_title='Bottom SiN (Å)'),
+        height=800, width=1800,
+        margin=dict(l=50, r=50, b=50, t=100)
+    )
 
-interactive_save_path = os.path.join(PLOT_DIR, "3D_Interactive_Normalized_Transmission.html")
-fig_interactive.write_html(interactive_save_path)
+    interactive_save_path = os.path.join(PLOT_DIR, "3D_Interactive_Normalized_Transmission.html")
+    fig_interactive.write_html(interactive_save_path)
 
-plt.show()
\ No newline at end of file
+    plt.show()
\ No newline at end of file
@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+import os
+import importlib
+from scipy.spatial import Delaunay
+from scipy.interpolate import CloughTocher2DInterpolator
+
+# --- 1. CONFIGURATION ---
+OUTPUT_FILE = r"C:\Users\ssatter\Documents\Midnight\Adaptive_DOE_results.xlsx"
+DATA_DIR = "data"
+
+# "tmm" evaluates locally with Transfer_Matrix_Prescreen.py (free, for trying settings out),
+# "fdtd" runs every round as a web.Batch with make_doe_sim from JOB_MODULE
+EVALUATOR = "tmm"
+JOB_MODULE = "QWL_optimized_SiN23_Si_SiN1947_transmission_job"
+FOLDER_NAME = "Adaptive_DOE"
+
+# Thickness window in Angstrom and the coarse starting grid (points per axis)
+SIN_T_RANGE = (750, 1200)
+SIN_B_RANGE = (750, 1200)
+COARSE_POINTS = 4
+GRID_STEP = 5           # New points are rounded to this (Angstrom), like a hand-written DOE
+
+# Response: the worst transmission (%) over the target wavelengths, checked against the
+# same 90% lower spec limit used in Process_capability.py
+TARGET_WL = [0.795, 0.8, 0.895]
+LSL = 90.0
+LSL_BAND = 3.0          # Triangles with a vertex within this many % of LSL are refined
+OPTIMUM_BAND = 1.0      # ...and so are triangles with a vertex within this many % of the best design
+
+MAX_ROUNDS = 6
+POINTS_PER_ROUND = 12
+MIN_SPACING = 10        # Angstrom; stop refining cells smaller than this
+
+TO_UM = 1e-4
+
+
+# --- 2. EVALUATORS ---
+def tmm_evaluator(points):
+    """ T (%) at TARGET_WL for an (n x 2) array of (SiN_T, SiN_B) in Angstrom, computed locally. """
+    from Transfer_Matrix_Prescreen import stack_rt
+    T, _ = stack_rt(points[:, 0:1] * TO_UM, points[:, 1:2] * TO_UM, np.asarray(TARGET_WL)[None, :])
+    return T * 100
+
+
+def fdtd_evaluator(make_sim, folder_name=FOLDER_NAME, path_dir=DATA_DIR):
+    """
+    Returns an evaluator that runs each batch of points as one web.Batch and reads
+    T (%) at TARGET_WL back from the results.
+    :param make_sim: make_doe_sim(t_top_um, t_bot_um) from one of the job scripts
+    """
+    import tidy3d.web as web
+    from Spectra_Extraction import to_wavelength_um, values_at_wavelengths
+    batch_count = 0
+
+    def evaluate(points):
+        nonlocal batch_count
+        batch_count += 1
+        sims = {}
+        for i, (t_top, t_bot) in enumerate(points):
+            task_name = f"Adaptive_R{batch_count}_{i}_T{int(t_top)}_B{int(t_bot)}"
+            sims[task_name] = make_sim(t_top * TO_UM, t_bot * TO_UM)
+
+        batch = web.Batch(simulations=sims, folder_name=folder_name)
+        batch_results = batch.run(path_dir=path_dir)
+
+        out = np.empty((len(points), len(TARGET_WL)))
+        for i, task_name in enumerate(sims):
+            flux = batch_results[task_name]["T"].flux
+            out[i] = values_at_wavelengths(to_wavelength_um(flux.f.values), np.abs(flux.values) * 100, TARGET_WL)[0]
+        return out
+
+    return evaluate
+
+
+# --- 3. REFINEMENT ---
+def coarse_grid():
+    t_axis = np.linspace(SIN_T_RANGE[0], SIN_T_RANGE[1], COARSE_POINTS)
+    b_axis = np.linspace(SIN_B_RANGE[0], SIN_B_RANGE[1], COARSE_POINTS)
+    T, B = np.meshgrid(t_axis, b_axis, indexing="ij")
+    return snap(np.column_stack([T.ravel(), B.ravel()]))
+
+
+def snap(points):
+    return np.round(np.asarray(points, dtype=float) / GRID_STEP) * GRID_STEP
+
+
+def propose_points(points, response, n_new=POINTS_PER_ROUND):
+    """
+    Scores every Delaunay triangle of the evaluated designs and returns the centroids of
+    the best ones. A triangle scores high when the response changes a lot across it
+    (steep region), when it touches the LSL band or when it borders the current optimum,
+    and is skipped once it is too small. The maximum of a cubic interpolant of the
+    response is added every round as well.
+    :param response: Worst-case T (%) per point
+    """
+    tri = Delaunay(points)
+    vertices = response[tri.simplices]
+    steepness = vertices.max(axis=1) - vertices.min(axis=1)
+    crosses_lsl = (vertices.min(axis=1) <= LSL) & (vertices.max(axis=1) >= LSL)
+    near_lsl = np.any(np.abs(vertices - LSL) <= LSL_BAND, axis=1)
+    near_best = vertices.max(axis=1) >= response.max() - OPTIMUM_BAND
+    score = steepness + 100 * crosses_lsl + 50 * near_lsl + 200 * near_best
+
+    corners = points[tri.simplices]
+    edges = np.linalg.norm(corners - np.roll(corners, 1, axis=1), axis=2)
+    score[edges.max(axis=1) < 2 * MIN_SPACING] = -np.inf
+
+    existing = {tuple(p) for p in points}
+    new_points = []
+
+    # Always probe the predicted optimum of a cubic surface through the current results
+    t_axis = np.arange(SIN_T_RANGE[0], SIN_T_RANGE[1] + GRID_STEP, GRID_STEP)
+    b_axis = np.arange(SIN_B_RANGE[0], SIN_B_RANGE[1] + GRID_STEP, GRID_STEP)
+    T, B = np.meshgrid(t_axis, b_axis, indexing="ij")
+    predicted = CloughTocher2DInterpolator(tri, response)(T, B)
+    if np.any(np.isfinite(predicted)):
+        best = np.unravel_index(np.nanargmax(predicted), predicted.shape)
+        candidate = (float(T[best]), float(B[best]))
+        if candidate not in existing:
+            existing.add(candidate)
+            new_points.append(candidate)
+
+    for idx in np.argsort(score)[::-1]:
+        if not np.isfinite(score[idx]) or len(new_points) >= n_new:
+            break
+        # Centroid first; once that is taken, split the longest edge instead
+        longest = edges[idx].argmax()
+        midpoint = (corners[idx][longest] + corners[idx][longest - 1]) / 2
+        for candidate in (tuple(snap(corners[idx].mean(axis=0))), tuple(snap(midpoint))):
+            if candidate not in existing:
+                existing.add(candidate)
+                new_points.append(candidate)
+                break
+    return np.asarray(new_points, dtype=float).reshape(-1, 2)
+
+
+def run_adaptive_doe(evaluate, max_rounds=MAX_ROUNDS):
+    """
+    Evaluates the coarse grid, then refines for up to max_rounds.
+    :param evaluate: Callable taking an (n x 2) array of Angstrom thicknesses and
+                     returning an (n x len(TARGET_WL)) array of T (%)
+    :return: DataFrame with one row per evaluated design
+    """
+    points = coarse_grid()
+    values = evaluate(points)
+    rounds = np.zeros(len(points), dtype=int)
+    print(f"Round 0: {len(points)} coarse designs")
+
+    for round_idx in range(1, max_rounds + 1):
+        new_points = propose_points(points, values.min(axis=1))
+        if len(new_points) == 0:
+            print("No region left to refine.")
+            break
+        new_values = evaluate(new_points)
+        points = np.vstack([points, new_points])
+        values = np.vstack([values, new_values])
+        rounds = np.concatenate([rounds, np.full(len(new_points), round_idx)])
+        print(f"Round {round_idx}: +{len(new_points)} designs, best worst-case T = {values.min(axis=1).max():.2f}%")
+
+    df = pd.DataFrame({"SiN_T": points[:, 0], "SiN_B": points[:, 1], "Round": rounds})
+    for i, wl in enumerate(TARGET_WL):
+        df[f"T_{wl}"] = values[:, i]
+    df["Min_T"] = values.min(axis=1)
+    df["Pass_LSL"] = df["Min_T"] >= LSL
+    return df
+
+
+if __name__ == "__main__":
+    if EVALUATOR == "fdtd":
+        make_doe_sim = importlib.import_module(JOB_MODULE).make_doe_sim
+        evaluate = fdtd_evaluator(make_doe_sim)
+    else:
+        evaluate = tmm_evaluator
+
+    results = run_adaptive_doe(evaluate)
+
+    out_dir = os.path.dirname(OUTPUT_FILE)
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    results.to_excel(OUTPUT_FILE, index=False)
+
+    best = results.sort_values("Min_T", ascending=False).iloc[0]
+    full_grid = int(((SIN_T_RANGE[1] - SIN_T_RANGE[0]) / GRID_STEP + 1) * ((SIN_B_RANGE[1] - SIN_B_RANGE[0]) / GRID_STEP + 1))
+    print("\n" + "="*40)
+    print(f"ADAPTIVE DOE COMPLETE ({EVALUATOR})")
+    print(f"Designs evaluated: {len(results)} (full {GRID_STEP} A grid would be {full_grid})")
+    print(f"Designs passing T > {LSL}% at all targets: {int(results['Pass_LSL'].sum())}")
+    print(f"Best: SiN_T = {best['SiN_T']:.0f} A, SiN_B = {best['SiN_B']:.0f} A, worst-case T = {best['Min_T']:.2f}%")
+    print(f"Results saved to: {OUTPUT_FILE}")
+    print("="*40)
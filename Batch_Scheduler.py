@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+import os
+import re
+import time
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# --- 1. CONFIGURATION ---
+MAX_IN_FLIGHT = 20       # Tasks uploaded and running in the cloud at the same time
+CREDIT_BUDGET = 50.0     # Stop submitting once the estimated FlexCredits would exceed this
+POLL_INTERVAL = 15.0     # Seconds between status checks of the running tasks
+POLL_RETRIES = 3         # Failed status checks in a row before a task is given up as 'error'
+DOWNLOAD_WORKERS = 4     # Downloads running next to the scheduler, so finished slots are refilled at once
+
+# Status strings Tidy3D reports once a task will not change any more
+TERMINAL_STATUSES = {"success", "error", "diverged", "deleted", "aborted"}
+
+
+# --- 2. PRIORITY ---
+def nominal_first_priority(task_names, nominal=None):
+    """
+    Orders designs by their distance from the nominal (SiN_T, SiN_B), parsed from task names
+    like 'Run_3_T750_B1200'. The nominal defaults to the median of the DOE.
+    :return: dict of task name -> priority (lower runs first)
+    """
+    parsed = {}
+    for name in task_names:
+        match = re.search(r'_T(\d+)_B(\d+)', str(name))
+        parsed[name] = (float(match.group(1)), float(match.group(2))) if match else (np.nan, np.nan)
+    values = np.array(list(parsed.values()), dtype=float).reshape(-1, 2)
+    if nominal is None:
+        nominal = np.nanmedian(values, axis=0) if np.any(np.isfinite(values)) else (0.0, 0.0)
+    span = np.nanmax(values, axis=0) - np.nanmin(values, axis=0) if np.any(np.isfinite(values)) else np.ones(2)
+    span = np.where(np.isfinite(span) & (span > 0), span, 1.0)
+
+    priority = {}
+    for name, (t, b) in parsed.items():
+        distance = np.hypot((t - nominal[0]) / span[0], (b - nominal[1]) / span[1])
+        priority[name] = float(distance) if np.isfinite(distance) else np.inf
+    return priority
+
+
+# --- 3. SCHEDULER ---
+def task_status(web_api, task_id):
+    """ Lower-case status string of a task, from a dict or an object returned by get_info. """
+    info = web_api.get_info(task_id)
+    status = info.get("status") if isinstance(info, dict) else getattr(info, "status", None)
+    return str(status).lower()
+
+
+def schedule_frame(records):
+    """ One row per task, in priority order. """
+    df = pd.DataFrame(list(records.values()),
+                      columns=["Task Name", "Task ID", "Status", "Priority", "Estimated Cost", "Error"])
+    return df.sort_values(["Priority", "Task Name"]).reset_index(drop=True)
+
+
+def run_scheduled(sims, folder_name, web_api, max_in_flight=MAX_IN_FLIGHT, budget=CREDIT_BUDGET,
+                  priority=None, poll_interval=POLL_INTERVAL, on_finished=None, records=None):
+    """
+    Runs a dict of task name -> td.Simulation with at most max_in_flight tasks in the cloud.
+    Whenever a task finishes the next one in priority order is submitted, so the pipeline
+    stays full. Submission stops cleanly once the estimated cost of the next task would
+    push the total over budget; tasks already running are still waited for.
+    :param web_api: tidy3d.web, or a local stand-in with upload/estimate_cost/start/get_info
+    :param priority: dict of task name -> number (lower first); DOE order if None
+    :param on_finished: Optional callback(task_name, task_id, status) when a task ends,
+                        e.g. to download it right away
+    :param records: Optional dict filled in place with one record per task, so the caller still
+                    has them if the run is interrupted
+    :return: DataFrame with one row per task (tasks never submitted have status 'not_submitted');
+             an API error on one task marks it 'error' with the message and the rest carry on
+    """
+    if priority is None:
+        priority = {name: i for i, name in enumerate(sims)}
+    queue = [(priority.get(name, np.inf), seq, name) for seq, name in enumerate(sims)]
+    heapq.heapify(queue)
+
+    records = {} if records is None else records
+    records.update({name: {"Task Name": name, "Task ID": None, "Status": "not_submitted",
+                           "Priority": priority.get(name, np.inf), "Estimated Cost": np.nan, "Error": None}
+                    for name in sims})
+    in_flight = {}
+    poll_failures = {}
+    committed = 0.0
+    budget_reached = False
+
+    print(f"Scheduling {len(sims)} tasks: max {max_in_flight} in flight, budget {budget} credits")
+    while True:
+        while queue and not budget_reached and len(in_flight) < max_in_flight:
+            _, _, name = heapq.heappop(queue)
+            task_id = None
+            try:
+                task_id = web_api.upload(sims[name], task_name=name, folder_name=folder_name, verbose=False)
+                records[name]["Task ID"] = task_id
+                cost = float(web_api.estimate_cost(task_id, verbose=False) or 0.0)
+            except Exception as e:
+                records[name].update({"Status": "error", "Error": f"{type(e).__name__}: {e}"})
+                print(f"  [!] {name}: submission failed ({records[name]['Error']})")
+                continue
+            if committed + cost > budget:
+                # Leave nothing half-submitted: the uploaded draft is removed again
+                if hasattr(web_api, "delete"):
+                    web_api.delete(task_id)
+                records[name]["Task ID"] = None
+                budget_reached = True
+                print(f"Budget reached ({committed:.2f} + {cost:.2f} > {budget}); "
+                      f"{len(queue) + 1} tasks not submitted")
+                break
+            try:
+                web_api.start(task_id)
+            except Exception as e:
+                records[name].update({"Status": "error", "Error": f"{type(e).__name__}: {e}"})
+                print(f"  [!] {name} ({task_id}): start failed ({records[name]['Error']})")
+                continue
+            committed += cost
+            in_flight[task_id] = name
+            records[name].update({"Task ID": task_id, "Status": "queued", "Estimated Cost": cost})
+
+        if not in_flight:
+            break
+        time.sleep(poll_interval)
+
+        for task_id, name in list(in_flight.items()):
+            try:
+                status = task_status(web_api, task_id)
+                if poll_failures.pop(task_id, None):
+                    records[name]["Error"] = None
+            except Exception as e:
+                # A failed status check is usually transient; give up only after POLL_RETRIES in a row
+                poll_failures[task_id] = poll_failures.get(task_id, 0) + 1
+                records[name]["Error"] = f"{type(e).__name__}: {e}"
+                if poll_failures[task_id] < POLL_RETRIES:
+                    continue
+                status = "error"
+            records[name]["Status"] = status
+            if status in TERMINAL_STATUSES or "error" in status:
+                del in_flight[task_id]
+                print(f"{name} ({task_id}): {status} [{len(in_flight)} in flight, {len(queue)} queued]")
+                if on_finished is not None:
+                    on_finished(name, task_id, status)
+
+    df = schedule_frame(records)
+    print(f"Scheduler done: {int((df['Status'] == 'success').sum())} succeeded, "
+          f"{int((df['Status'] == 'error').sum())} errors, estimated spend {committed:.2f} credits")
+    return df
+
+
+# --- 4. JOB SCRIPT HELPER ---
+def run_doe_scheduled(sims, folder_name, data_dir, web_api, sim_index=None, **kwargs):
+    """
+    Schedules a DOE, downloads every successful task into data_dir as soon as it finishes
+    (in a few background threads, so the scheduler keeps submitting meanwhile) and records
+    it in the simulation index (see Simulation_Cache.py).
+    Writes '<folder_name>_schedule.xlsx' with the outcome of every task, also when the run
+    is interrupted.
+    """
+    from Download_Tasks_from_Tidy3d import download_one
+    from Simulation_Cache import record_task, simulation_hash
+
+    os.makedirs(data_dir, exist_ok=True)
+    records = {}
+    index_lock = threading.Lock()
+
+    def download(name, task_id):
+        _, _, error, _ = download_one(task_id, data_dir, web_api.download)
+        if error is not None:
+            records[name]["Error"] = f"download: {error}"
+            print(f"  [!] Download of {task_id} failed: {error} (rerun Download_Tasks_from_Tidy3d.py)")
+        if sim_index is not None:
+            hdf5_path = os.path.join(data_dir, f"{task_id}.hdf5")
+            with index_lock:
+                record_task(sim_index, simulation_hash(sims[name]), task_id, name, folder_name,
+                            hdf5_path if error is None else None)
+
+    downloads = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS)
+
+    def on_finished(name, task_id, status):
+        if status == "success":
+            downloads.submit(download, name, task_id)
+
+    try:
+        run_scheduled(sims, folder_name, web_api, on_finished=on_finished, records=records, **kwargs)
+    finally:
+        # Every started download finishes before the schedule is written
+        downloads.shutdown(wait=True)
+        schedule_df = schedule_frame(records)
+        schedule_df.to_excel(os.path.join(data_dir, f"{folder_name}_schedule.xlsx"), index=False)
+    return schedule_df
@@ -0,0 +1,177 @@
+import h5py
+import numpy as np
+import pandas as pd
+import os
+import json
+import time
+import shutil
+import tracemalloc
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from Build_Spectra_Store import update_spectra_store, load_task_metadata
+from Spectra_Extraction import (T_PATH, R_PATH, FREQ_PATH, C_LIGHT, build_target_summary,
+                                extract_files, extract_targets, list_task_files)
+from Surface_Interpolation import interpolate_surfaces
+
+# --- 1. CONFIGURATION ---
+BENCH_DIR = r"C:\Users\ssatter\Documents\Midnight\benchmark"
+RESULTS_FILE = os.path.join(BENCH_DIR, "benchmark_results.csv")
+
+# The synthetic campaigns are registered here, not in the shared task registry
+REGISTRY_FILE = os.path.join(BENCH_DIR, "benchmark_registry.sqlite")
+
+TASK_COUNTS = [100, 1000, 10000]
+N_FREQ = 23                      # Same 0.79-0.9 um sampling as the job scripts
+TARGET_WL = [0.795, 0.8, 0.895]
+SIN_RANGE = (750, 1200)          # Angstrom, for the synthetic Task Names
+SEED = 0
+
+# Peak memory needs a second, traced run of every stage; set False for timings only
+TRACE_MEMORY = True
+
+# Synthetic campaigns are kept between runs; set True to write them again
+REGENERATE = False
+
+
+# --- 2. SYNTHETIC CAMPAIGN ---
+def write_synthetic_campaign(campaign_dir, n_tasks, n_freq=N_FREQ, seed=SEED):
+    """
+    Writes n_tasks Tidy3D-like result files ('<task_id>.hdf5' with T at data/0 and R at
+    data/1, plus a JSON_STRING naming the monitors) and the matching task Excel sheet
+    with Task Name 'Run_<i>_T<top>_B<bottom>'.
+    :return: Path of the Excel sheet
+    """
+    if os.path.exists(campaign_dir):
+        shutil.rmtree(campaign_dir)
+    os.makedirs(campaign_dir)
+
+    rng = np.random.default_rng(seed)
+    freqs = C_LIGHT / (np.linspace(0.79, 0.9, n_freq) * 1e-6)
+    side = int(np.ceil(np.sqrt(n_tasks)))
+    axis = np.linspace(SIN_RANGE[0], SIN_RANGE[1], side).round()
+    json_string = json.dumps({"data": [{"monitor": {"name": "T"}}, {"monitor": {"name": "R"}}]}).encode()
+
+    rows = []
+    for i in range(n_tasks):
+        t_top, t_bot = axis[i % side], axis[i // side]
+        task_id = f"fdve-bench-{i:06d}"
+        # Smooth, thickness-dependent spectra so the surface interpolation has real work to do
+        phase = 2 * np.pi * (t_top + 0.7 * t_bot) / 600
+        t_flux = 0.85 + 0.1 * np.sin(phase + np.linspace(0, 3, n_freq)) + 0.01 * rng.standard_normal(n_freq)
+        with h5py.File(os.path.join(campaign_dir, f"{task_id}.hdf5"), "w") as f:
+            f["JSON_STRING"] = json_string
+            f[T_PATH] = t_flux
+            f[FREQ_PATH] = freqs
+            f[R_PATH] = -(1 - t_flux)
+            f[R_PATH.replace("__xarray_dataarray_variable__", "f")] = freqs
+        rows.append({"Task Name": f"Run_{i}_T{int(t_top)}_B{int(t_bot)}", "Task ID": task_id})
+
+    excel_file = campaign_dir + ".xlsx"
+    pd.DataFrame(rows).to_excel(excel_file, index=False)
+    return excel_file
+
+
+# --- 3. TIMED STAGES ---
+def measure(func, *args, setup=None, trace_memory=TRACE_MEMORY, **kwargs):
+    """
+    Runs func and returns (result, seconds, peak MB).
+    tracemalloc slows Python code down a lot, so the timing comes from an untraced run and
+    the peak from a second, traced run (setup, if given, is called before each run).
+    Worker processes of a process pool are not seen by tracemalloc, which is why the
+    extraction is also timed with max_workers=1.
+    """
+    if setup is not None:
+        setup()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+
+    peak = np.nan
+    if trace_memory:
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        func(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak /= 1e6
+    return result, elapsed, peak
+
+
+def surface_stage(metadata, values, task_ids):
+    """ Cubic and linear surfaces for every target wavelength, as in the 3D surface scripts. """
+    thickness = metadata.reindex(task_ids)[["SiN_T", "SiN_B"]].to_numpy(dtype=float)
+    xi, yi, Z = interpolate_surfaces(thickness, values)[("cubic", 100)]
+    X, Y = np.meshgrid(xi, yi)
+    return X, Y, [Z[:, :, i] for i in range(Z.shape[2])]
+
+
+def export_figure(X, Y, surfaces, path):
+    fig = plt.figure(figsize=(22, 8), dpi=300)
+    for i, Z in enumerate(surfaces):
+        ax = fig.add_subplot(1, len(surfaces), i + 1, projection="3d")
+        ax.plot_surface(X, Y, Z, cmap="viridis", edgecolor="none", alpha=0.8)
+    fig.savefig(path, bbox_inches="tight")
+    plt.close(fig)
+
+
+def benchmark_campaign(campaign_dir, excel_file, registry_file=REGISTRY_FILE):
+    """ Times every stage on one campaign. :return: list of result dicts """
+    files = list_task_files(campaign_dir)
+    metadata = load_task_metadata(excel_file, registry_file)
+    store_path = os.path.join(campaign_dir, "spectra_store.h5")
+
+    def remove_store():
+        if os.path.exists(store_path):
+            os.remove(store_path)
+
+    results = []
+
+    def record(stage_name, func, *args, **kwargs):
+        result, seconds, peak = measure(func, *args, **kwargs)
+        results.append({"Tasks": len(files), "Stage": stage_name, "Seconds": round(seconds, 4),
+                        "Peak MB": round(peak, 2), "Per Task ms": round(1000 * seconds / max(len(files), 1), 4)})
+        print(f"  {stage_name:<28} {seconds:9.3f} s   peak {peak:8.2f} MB")
+        return result
+
+    record("extract (1 process)", extract_files, files, max_workers=1)
+    spectra = record("extract (pool)", extract_files, files)
+    record("targets only (pool)", extract_targets, files, TARGET_WL, ("T",))
+    record("store ingest (cold)", update_spectra_store, campaign_dir, store_path, metadata, setup=remove_store)
+    record("store ingest (warm)", update_spectra_store, campaign_dir, store_path, metadata)
+
+    name_mapping = metadata["Task Name"].to_dict()
+    summary_path = campaign_dir + "_summary.csv"
+    record("summary CSV", lambda: build_target_summary(spectra, name_mapping, TARGET_WL).to_csv(summary_path, index=False))
+
+    lazy = extract_targets(files, TARGET_WL, ("T",))
+    X, Y, surfaces = record("surface interpolation", surface_stage, metadata,
+                            lazy["values"][:, 0, :] * 100, lazy["task_id"])
+    record("figure export", export_figure, X, Y, surfaces, campaign_dir + "_surface.png")
+    return results
+
+
+if __name__ == "__main__":
+    if not os.path.exists(BENCH_DIR):
+        os.makedirs(BENCH_DIR)
+
+    # --- 4. RUN ---
+    all_results = []
+    for n_tasks in TASK_COUNTS:
+        campaign_dir = os.path.join(BENCH_DIR, f"campaign_{n_tasks}")
+        excel_file = campaign_dir + ".xlsx"
+        if REGENERATE or not os.path.exists(excel_file):
+            print(f"Writing synthetic campaign with {n_tasks} tasks...")
+            write_synthetic_campaign(campaign_dir, n_tasks)
+        print(f"Benchmarking {n_tasks} tasks:")
+        all_results.extend(benchmark_campaign(campaign_dir, excel_file))
+
+    df = pd.DataFrame(all_results)
+    df.to_csv(RESULTS_FILE, index=False)
+
+    print("\n" + "="*40)
+    print("BENCHMARK COMPLETE (seconds)")
+    print(df.pivot_table(index="Stage", columns="Tasks", values="Seconds", sort=False).to_string())
+    print(f"Results saved to: {RESULTS_FILE}")
+    print("="*40)
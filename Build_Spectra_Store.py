@@ -0,0 +1,219 @@
+import h5py
+import numpy as np
+import pandas as pd
+import os
+import time
+from Spectra_Extraction import extract_files, list_task_files, print_error_summary
+from Task_Registry import campaign_tasks, parse_thickness, REGISTRY_FILE
+
+# --- 1. CONFIGURATION ---
+CACHE_DIR = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_Circular_polar_tasks"
+EXCEL_FILE = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_Circular_polar.xlsx"
+
+# One consolidated file per campaign; analysis scripts read this instead of every task file
+STORE_NAME = "spectra_store.h5"
+STORE_FILE = os.path.join(CACHE_DIR, STORE_NAME)
+
+COL_TASK_ID = "Task ID"
+COL_TASK_NAME = "Task Name"
+
+# Rows per HDF5 chunk; a whole chunk is read in one go, so keep it large for network drives
+CHUNK_ROWS = 256
+STORE_VERSION = 2
+
+
+# --- 2. TASK METADATA ---
+def load_task_metadata(excel_file, registry_file=REGISTRY_FILE):
+    """
+    Returns a DataFrame indexed by Task ID with 'Task Name', 'SiN_T' and 'SiN_B' for the
+    campaign of this task listing, looked up in the task registry. The Excel file itself
+    is only read when it changed since it was last registered.
+    :param registry_file: Registry the listing is registered in; benchmarks and tests pass
+                          their own so the shared registry is left alone
+    """
+    return campaign_tasks(excel_file, registry_file=registry_file)[[COL_TASK_NAME, 'SiN_T', 'SiN_B']]
+
+
+def task_metadata_from_frame(df):
+    """ Same as load_task_metadata for a task listing that is already in memory. """
+    df = df.copy()
+    df[COL_TASK_ID] = df[COL_TASK_ID].astype(str).str.strip()
+
+    if 'SiN_T' not in df.columns or 'SiN_B' not in df.columns:
+        # Vectorized parse of the whole column instead of a per-row regex
+        df[['SiN_T', 'SiN_B']] = parse_thickness(df[COL_TASK_NAME]).to_numpy()
+
+    df = df.drop_duplicates(subset=COL_TASK_ID, keep='last')
+    return df.set_index(COL_TASK_ID)[[COL_TASK_NAME, 'SiN_T', 'SiN_B']]
+
+
+# --- 3. WRITING ---
+def write_store(store_path, store):
+    """
+    Writes the consolidated store. All matrices are tasks x frequency, chunked by rows.
+    Flux is stored raw (no abs, no %, no /2) so every script can keep its own normalization.
+    The 'manifest' group records the size, mtime and SHA-256 of each source task file.
+    """
+    n_tasks, n_freq = store["T"].shape
+    chunks = (max(1, min(CHUNK_ROWS, n_tasks)), max(1, n_freq))
+    str_dtype = h5py.string_dtype()
+    tmp_path = store_path + ".part"
+    with h5py.File(tmp_path, "w") as f:
+        for key in ("freq", "T", "R"):
+            f.create_dataset(key, data=store[key], chunks=chunks if n_tasks else None,
+                             compression="gzip", compression_opts=4, shuffle=True)
+        for key in ("task_id", "task_name"):
+            f.create_dataset(key, data=np.asarray(store[key], dtype=object), dtype=str_dtype)
+        f.create_dataset("SiN_T", data=np.asarray(store["SiN_T"], dtype=float))
+        f.create_dataset("SiN_B", data=np.asarray(store["SiN_B"], dtype=float))
+        f.create_dataset("manifest/size", data=np.asarray(store["file_size"], dtype=np.int64))
+        f.create_dataset("manifest/mtime_ns", data=np.asarray(store["file_mtime_ns"], dtype=np.int64))
+        f.create_dataset("manifest/sha256", data=np.asarray(store["sha256"], dtype=object), dtype=str_dtype)
+        f.attrs["version"] = STORE_VERSION
+        f.attrs["created"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    os.replace(tmp_path, store_path)
+
+
+# --- 4. LOADING ---
+def load_spectra_store(store_path):
+    """
+    Reads the whole store in one pass.
+    :return: dict with 'task_id', 'task_name', 'SiN_T', 'SiN_B' (1D), 'freq', 'T', 'R' (tasks x freq)
+             and the manifest columns 'file_size', 'file_mtime_ns', 'sha256'
+    """
+    with h5py.File(store_path, "r") as f:
+        store = {key: f[key][()] for key in ("freq", "T", "R", "SiN_T", "SiN_B")}
+        store["task_id"] = f["task_id"].asstr()[()].astype(object)
+        store["task_name"] = f["task_name"].asstr()[()].astype(object)
+        n_tasks = len(store["task_id"])
+        if "manifest" in f:
+            store["file_size"] = f["manifest/size"][()]
+            store["file_mtime_ns"] = f["manifest/mtime_ns"][()]
+            store["sha256"] = f["manifest/sha256"].asstr()[()].astype(object)
+        else:
+            # Stores written before the manifest existed are re-ingested on the next update
+            store["file_size"] = np.full(n_tasks, -1, dtype=np.int64)
+            store["file_mtime_ns"] = np.full(n_tasks, -1, dtype=np.int64)
+            store["sha256"] = np.full(n_tasks, "", dtype=object)
+    return store
+
+
+def _pad_columns(matrix, n_freq):
+    if matrix.shape[1] == n_freq:
+        return matrix
+    out = np.full((matrix.shape[0], n_freq), np.nan)
+    out[:, :matrix.shape[1]] = matrix
+    return out
+
+
+def _metadata_changed(store, old):
+    if len(store["task_id"]) != len(old["task_id"]) or np.any(store["task_id"] != old["task_id"]):
+        return True
+    return (np.any(store["task_name"] != old["task_name"])
+            or not np.array_equal(store["SiN_T"], old["SiN_T"], equal_nan=True)
+            or not np.array_equal(store["SiN_B"], old["SiN_B"], equal_nan=True))
+
+
+# --- 5. INCREMENTAL INGEST ---
+def update_spectra_store(cache_dir, store_path=None, metadata=None, max_workers=None):
+    """
+    Brings the store up to date with cache_dir and returns its contents.
+    Files whose size and mtime match the manifest are reused without being opened.
+    Files whose size or mtime changed are hashed first and only parsed if the content
+    really differs. New files are parsed and files removed from the cache are dropped.
+    :param metadata: Optional DataFrame from load_task_metadata; otherwise names/thicknesses
+                     already in the store are kept
+    :return: Store dict (see load_spectra_store) plus 'errors', a list of (filename, message)
+    """
+    if store_path is None:
+        store_path = os.path.join(cache_dir, STORE_NAME)
+
+    old = None
+    if os.path.exists(store_path):
+        try:
+            old = load_spectra_store(store_path)
+        except Exception as e:
+            print(f"  [!] Store unreadable, rebuilding: {e}")
+    old_rows = {tid: i for i, tid in enumerate(old["task_id"])} if old is not None else {}
+
+    files = list_task_files(cache_dir)
+    stats = {}
+    for path in files:
+        st = os.stat(path)
+        stats[os.path.basename(path).replace(".hdf5", "")] = (st.st_size, st.st_mtime_ns)
+
+    reused, to_check, known_hashes = [], [], {}
+    for path in files:
+        task_id = os.path.basename(path).replace(".hdf5", "")
+        row = old_rows.get(task_id)
+        if row is not None and (old["file_size"][row], old["file_mtime_ns"][row]) == stats[task_id]:
+            reused.append(task_id)
+            continue
+        to_check.append(path)
+        if row is not None and old["sha256"][row]:
+            known_hashes[task_id] = old["sha256"][row]
+
+    fresh = extract_files(to_check, max_workers=max_workers, known_hashes=known_hashes)
+    reused.extend(fresh["unchanged"])
+    n_removed = len(set(old_rows) - set(stats))
+    print(f"Ingest: {len(reused)} reused, {len(fresh['task_id'])} parsed, "
+          f"{len(fresh['errors'])} unreadable, {n_removed} removed")
+
+    reused_rows = np.asarray([old_rows[tid] for tid in reused], dtype=int)
+    task_ids = np.concatenate([np.asarray(reused, dtype=object), fresh["task_id"]])
+    n_freq = max(fresh["T"].shape[1], old["T"].shape[1] if old is not None else 0)
+
+    store = {"task_id": task_ids}
+    for key in ("freq", "T", "R"):
+        parts = [_pad_columns(fresh[key], n_freq)]
+        if old is not None:
+            parts.insert(0, _pad_columns(old[key][reused_rows], n_freq))
+        store[key] = np.concatenate(parts)
+
+    metadata_given = metadata is not None
+    if metadata is None and old is not None:
+        metadata = pd.DataFrame({COL_TASK_NAME: old["task_name"], 'SiN_T': old["SiN_T"],
+                                 'SiN_B': old["SiN_B"]}, index=old["task_id"])
+    if metadata is None:
+        metadata = pd.DataFrame(columns=[COL_TASK_NAME, 'SiN_T', 'SiN_B'])
+    meta = metadata.reindex(task_ids)
+    # Tasks without a name in the metadata fall back to their Task ID
+    names = meta[COL_TASK_NAME].where(meta[COL_TASK_NAME].notna(), pd.Series(task_ids, index=meta.index))
+    store["task_name"] = names.astype(str).to_numpy(dtype=object)
+    store["SiN_T"] = meta['SiN_T'].to_numpy(dtype=float)
+    store["SiN_B"] = meta['SiN_B'].to_numpy(dtype=float)
+
+    store["file_size"] = np.asarray([stats[tid][0] for tid in task_ids], dtype=np.int64)
+    store["file_mtime_ns"] = np.asarray([stats[tid][1] for tid in task_ids], dtype=np.int64)
+    new_hashes = dict(zip(fresh["task_id"], fresh["sha256"]))
+    store["sha256"] = np.asarray([new_hashes[tid] if tid in new_hashes else old["sha256"][old_rows[tid]]
+                                  for tid in task_ids], dtype=object)
+
+    # Keep a stable task order so reruns give identical stores and plots
+    order = np.argsort(task_ids.astype(str), kind="stable")
+    store = {key: value[order] for key, value in store.items()}
+
+    unchanged = (old is not None and not len(fresh["task_id"]) and not n_removed and not fresh["unchanged"]
+                 and not (metadata_given and _metadata_changed(store, old)))
+    if not unchanged:
+        write_store(store_path, store)
+    store["errors"] = fresh["errors"]
+    return store
+
+
+if __name__ == "__main__":
+    try:
+        metadata = load_task_metadata(EXCEL_FILE)
+        print(f"Loaded metadata for {len(metadata)} tasks.")
+    except Exception as e:
+        print(f"Error reading Excel: {e}")
+        metadata = None
+
+    store = update_spectra_store(CACHE_DIR, STORE_FILE, metadata)
+    errors = store["errors"]
+    print_error_summary(errors, len(store["task_id"]) + len(errors))
+    print("\n" + "="*40)
+    print(f"STORE COMPLETE: {STORE_FILE}")
+    print(f"Tasks: {len(store['task_id'])}, frequency points: {store['T'].shape[1]}")
+    print(f"Unreadable files: {len(errors)}")
+    print("="*40)
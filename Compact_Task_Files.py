@@ -0,0 +1,185 @@
+import h5py
+import numpy as np
+import pandas as pd
+import os
+import json
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from Spectra_Extraction import (list_task_files, monitor_groups, file_sha256, FLUX_DATASET, FREQ_DATASET,
+                                MIN_FILES_FOR_POOL, CHUNKSIZE)
+from Download_Tasks_from_Tidy3d import load_journal, save_journal, PART_SUFFIX
+
+# --- 1. CONFIGURATION ---
+CACHE_DIR = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_Circular_polar_tasks"
+
+# Originals are moved here (e.g. a slower or archive drive) once their compact copy is
+# verified; None deletes them instead
+COLD_DIR = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_Circular_polar_tasks_originals"
+
+COMPRESSION = "gzip"
+COMPRESSION_LEVEL = 4
+MAX_WORKERS = None
+
+# Written to the root of every compact file; files that have it are left alone
+ARCHIVE_FORMAT = "flux_only/1"
+
+
+# --- 2. ONE FILE ---
+def is_compact(path):
+    with h5py.File(path, "r") as f:
+        return f.attrs.get("archive_format") is not None
+
+
+def _flux_groups(f):
+    """ monitor name -> data group of every flux monitor; field monitors are left out. """
+    return {name: group for name, group in monitor_groups(f).items()
+            if f"{group}/{FLUX_DATASET}" in f and f"{group}/{FREQ_DATASET}" in f}
+
+
+def write_flux_archive(path, fluxes, simulation=None, log=None, attrs=None,
+                       compression=COMPRESSION, level=COMPRESSION_LEVEL):
+    """
+    Writes a flux-only archive (ARCHIVE_FORMAT), the one file layout shared by the compact
+    task files and Substrate_Recombination.py: a 'data/<i>' group per monitor tagged with a
+    'monitor_name' attribute and holding its flux and frequency axis, a small JSON_STRING
+    (monitor list, simulation and solver log) and the archive attributes at the root.
+    :param fluxes: {monitor name: (group path, flux, freqs)}, in monitor order
+    :param attrs: Further root attributes, e.g. provenance
+    :return: dict with every root attribute written
+    """
+    json_string = {"type": "SimulationData", "log": log, "simulation": simulation or {},
+                   "data": [{"monitor": {"name": name}} for name in fluxes]}
+    root = {"archive_format": ARCHIVE_FORMAT, "compacted": time.strftime("%Y-%m-%d %H:%M:%S"), **(attrs or {})}
+    with h5py.File(path, "w") as dst:
+        dst["JSON_STRING"] = json.dumps(json_string).encode()
+        for name, (group_path, flux, freqs) in fluxes.items():
+            group = dst.create_group(group_path)
+            group.attrs["monitor_name"] = name
+            for dataset, values in ((FLUX_DATASET, flux), (FREQ_DATASET, freqs)):
+                group.create_dataset(dataset, data=values, chunks=True, shuffle=True,
+                                     compression=compression, compression_opts=level)
+        dst.attrs.update(root)
+    return root
+
+
+def write_compact(src_path, dst_path, compression=COMPRESSION, level=COMPRESSION_LEVEL):
+    """
+    Writes the flux monitors of one Tidy3D result file to dst_path under the same
+    'data/<i>/flux/...' paths, each group tagged with a 'monitor_name' attribute, plus a
+    small JSON_STRING (monitor list, the full simulation and the solver log; the simulation is
+    kept whole so Simulation_Cache.index_cache_dir hashes it the same as before). The original's
+    SHA-256, size and name are kept as root attributes. The result is read by the scripts in
+    this repository, not by td.SimulationData.from_file.
+    :return: dict with the provenance attributes
+    """
+    with h5py.File(src_path, "r") as src:
+        groups = _flux_groups(src)
+        if not groups:
+            raise KeyError("no flux monitors found")
+        info = json.loads(src["JSON_STRING"][()]) if "JSON_STRING" in src else {}
+        order = sorted(groups, key=lambda name: int(groups[name].split("/")[1]))
+        fluxes = {name: (groups[name], src[f"{groups[name]}/{FLUX_DATASET}"][()],
+                         src[f"{groups[name]}/{FREQ_DATASET}"][()]) for name in order}
+
+    provenance = {"source_name": os.path.basename(src_path), "source_size": os.path.getsize(src_path),
+                  "source_sha256": file_sha256(src_path)}
+    return write_flux_archive(dst_path, fluxes, info.get("simulation"), info.get("log"), provenance,
+                              compression, level)
+
+
+def verify_compact(src_path, dst_path):
+    """ True if every flux monitor and frequency axis of the original is in the compact copy, bit for bit. """
+    with h5py.File(src_path, "r") as src, h5py.File(dst_path, "r") as dst:
+        src_groups, dst_groups = _flux_groups(src), _flux_groups(dst)
+        if set(src_groups) != set(dst_groups):
+            return False
+        for name, group in src_groups.items():
+            for dataset in (FLUX_DATASET, FREQ_DATASET):
+                if not np.array_equal(src[f"{group}/{dataset}"][()], dst[f"{dst_groups[name]}/{dataset}"][()]):
+                    return False
+    return True
+
+
+def compact_file(path, cold_dir=COLD_DIR):
+    """
+    Replaces one task file by its verified compact copy and moves the original to cold_dir
+    (or deletes it). The copy is written next to the file first, so an interrupted run never
+    leaves a half-written or missing task file behind.
+    :return: dict with 'File', 'Status' ('compacted', 'skipped' or 'error'), 'MB Before',
+             'MB After', 'Source SHA-256' and 'Error'
+    """
+    row = {"File": os.path.basename(path), "Status": "error", "MB Before": os.path.getsize(path) / 1e6,
+           "MB After": np.nan, "Source SHA-256": None, "Error": None}
+    part_path = path + PART_SUFFIX
+    try:
+        if is_compact(path):
+            row["Status"], row["MB After"] = "skipped", row["MB Before"]
+            return row
+        provenance = write_compact(path, part_path)
+        if not verify_compact(path, part_path):
+            raise IOError("compact copy does not match the original")
+
+        # The original reaches cold storage before it is replaced, so the task file is never missing
+        if cold_dir is not None:
+            os.makedirs(cold_dir, exist_ok=True)
+            cold_path = os.path.join(cold_dir, os.path.basename(path))
+            shutil.copy2(path, cold_path + PART_SUFFIX)
+            os.replace(cold_path + PART_SUFFIX, cold_path)
+        os.replace(part_path, path)
+        row["Status"], row["MB After"] = "compacted", os.path.getsize(path) / 1e6
+        row["Source SHA-256"] = provenance["source_sha256"]
+    except Exception as e:
+        row["Error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    return row
+
+
+# --- 3. WHOLE CACHE ---
+def compact_cache(cache_dir, cold_dir=COLD_DIR, max_workers=MAX_WORKERS):
+    """
+    Compacts every task file of a cache folder in worker processes (call under __main__).
+    The download journal is updated with the new file sizes, so Download_Tasks_from_Tidy3d.py
+    still counts compacted tasks as complete.
+    :return: DataFrame with one row per file (see compact_file)
+    """
+    files = list_task_files(cache_dir)
+    if len(files) < MIN_FILES_FOR_POOL or max_workers == 1:
+        rows = [compact_file(path, cold_dir) for path in files]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            rows = list(pool.map(compact_file, files, [cold_dir] * len(files), chunksize=CHUNKSIZE))
+    report = pd.DataFrame(rows, columns=["File", "Status", "MB Before", "MB After", "Source SHA-256", "Error"])
+
+    journal, changed = load_journal(cache_dir), False
+    for name, status in zip(report["File"], report["Status"]):
+        task_id = name.replace(".hdf5", "")
+        if status == "compacted" and task_id in journal["completed"]:
+            journal["completed"][task_id] = os.path.getsize(os.path.join(cache_dir, name))
+            changed = True
+    if changed:
+        save_journal(cache_dir, journal)
+    return report
+
+
+def print_compaction(report):
+    done = report[report["Status"] == "compacted"]
+    print("\n" + "="*40)
+    print(f"COMPACTION: {len(done)} compacted, {int((report['Status'] == 'skipped').sum())} already compact, "
+          f"{int((report['Status'] == 'error').sum())} failed")
+    if len(done):
+        before, after = done["MB Before"].sum(), done["MB After"].sum()
+        print(f"Size: {before:,.1f} MB -> {after:,.2f} MB ({after / before * 100:.1f}%)")
+    for _, row in report[report["Status"] == "error"].iterrows():
+        print(f"  [!] {row['File']}: {row['Error']} (original kept)")
+    print("="*40)
+
+
+if __name__ == "__main__":
+    # --- 4. COMPACT THE CACHE ---
+    report = compact_cache(CACHE_DIR)
+    print_compaction(report)
+    if COLD_DIR is not None and (report["Status"] == "compacted").any():
+        print(f"Originals moved to: {COLD_DIR}")
@@ -1,104 +1,165 @@
-import h5py
 import numpy as np
 import pandas as pd
 import os
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker  # Added for tick control
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+from concurrent.futures import ProcessPoolExecutor
+from Build_Spectra_Store import update_spectra_store
+from Spectra_Extraction import print_error_summary, to_wavelength_um, values_at_wavelengths
+from Task_Registry import campaign_tasks
+from Polarization_Synthesis import circular_spectra
 
 # --- 1. CONFIGURATION (CORRECTED) ---
 CACHE_DIR = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_Circular_polar_tasks"
 EXCEL_FILE = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_Circular_polar.xlsx"
 PLOT_DIR = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_Circular_polar_plots"
 
-# Path indices for HDF5
-T_PATH = "data/0/flux/__xarray_dataarray_variable__"
-R_PATH = "data/1/flux/__xarray_dataarray_variable__"
-FREQ_PATH = "data/0/flux/f"
-
-# --- 2. INITIALIZE DIRECTORIES ---
-if not os.path.exists(PLOT_DIR):
-    os.makedirs(PLOT_DIR)
-    print(f"Created plot directory: {PLOT_DIR}")
-
-# --- 3. LOAD TASK MAPPING ---
-try:
-    mapping_df = pd.read_excel(EXCEL_FILE)
-    name_mapping = dict(zip(mapping_df["Task ID"].astype(str), mapping_df["Task Name"]))
-    print(f"Loaded {len(name_mapping)} task name mappings.")
-except Exception as e:
-    print(f"Error reading Excel: {e}")
-    name_mapping = {}
-
-# --- 4. PREPARE STORAGE ---
-t_data = {}
-r_data = {}
-wavelengths_set = False
-
-# --- 5. EXTRACTION LOOP ---
-files = [f for f in os.listdir(CACHE_DIR) if f.endswith(".hdf5")]
-print(f"Processing {len(files)} files...")
-
-for filename in files:
-    filepath = os.path.join(CACHE_DIR, filename)
-    task_id = filename.replace(".hdf5", "")
-    column_name = name_mapping.get(task_id, task_id)
-    
-    try:
-        with h5py.File(filepath, "r") as f:
-            # --- MODIFIED: Normalized by 2 ---
-            if T_PATH in f:
-                # Original: np.abs(f[T_PATH][()]) * 100
-                t_data[column_name] = (np.abs(f[T_PATH][()]) * 100) / 2
-            if R_PATH in f:
-                # Original: np.abs(f[R_PATH][()]) * 100
-                r_data[column_name] = (np.abs(f[R_PATH][()]) * 100) / 2
-                
-            if not wavelengths_set and FREQ_PATH in f:
-                freqs = f[FREQ_PATH][()]
-                wavelengths = 299792458 / freqs * 1e6
-                t_data["Wavelength_um"] = wavelengths
-                r_data["Wavelength_um"] = wavelengths
-                wavelengths_set = True
-    except Exception as e:
-        print(f"  [!] Error reading {filename}: {e}")
+# POLARIZATION_MODE the campaign was run with (see the job script): sets the normalization
+# (Polarization_Synthesis.MODE_BEAMS) and, for "synthesize", merges the x- and y-polarized runs
+POLARIZATION_MODE = "dual_source"
+JONES = "circular"
+
+
+# Rendering: "lines" draws one ax.plot per run (the original look), "collection" draws every
+# run as one LineCollection, "envelope" draws the median with percentile bands over a density
+# image. "auto" uses collection up to ENVELOPE_ABOVE runs and envelope beyond that.
+PLOT_MODE = "auto"
+ENVELOPE_ABOVE = 300
+LEGEND_MAX = 40                      # Runs are only listed in the legend up to this many
+PERCENTILES = (5, 25, 50, 75, 95)
+DENSITY_BINS = (400, 200)            # (wavelength, value) bins of the density image
+PARALLEL_FIGURES = True              # Render the T and R figures in two worker processes
+
+
+# --- 2. PLOTTING FUNCTION ---
+def _density_image(wavelengths, values, bins):
+    """ 2D histogram of all curves, each resampled densely so steep sections are not gaps. """
+    order = np.argsort(wavelengths)
+    x_sorted = wavelengths[order]
+    fine_x = np.linspace(x_sorted[0], x_sorted[-1], bins[0])
+    pos = np.clip(np.searchsorted(x_sorted, fine_x), 1, len(x_sorted) - 1)
+    w = (fine_x - x_sorted[pos - 1]) / (x_sorted[pos] - x_sorted[pos - 1])
+    curves = values[:, order]
+    fine_y = curves[:, pos - 1] * (1 - w) + curves[:, pos] * w
+    ok = np.isfinite(fine_y)
+    return np.histogram2d(np.broadcast_to(fine_x, fine_y.shape)[ok], fine_y[ok], bins=bins)
 
-# --- 6. PLOTTING FUNCTION ---
-def save_doe_plot(data_dict, title, filename, ylabel):
-    if not data_dict:
+
+def save_doe_plot(wavelengths, values, names, title, save_path, ylabel, mode=PLOT_MODE):
+    """
+    Plots every run's spectrum in one figure.
+    :param wavelengths: 1D wavelength axis in um
+    :param values: runs x wavelengths array
+    :param names: run names, used for the legend when there are at most LEGEND_MAX runs
+    """
+    if len(values) == 0:
         print(f"No data found for {title}. Skipping plot.")
         return
-        
-    df = pd.DataFrame(data_dict)
-    fig, ax = plt.subplots(figsize=(14, 8), dpi=300) 
-    plt.title(title, fontsize=16, fontweight='bold')
-    
-    x = df["Wavelength_um"]
-    for col in df.columns:
-        if col != "Wavelength_um":
-            ax.plot(x, df[col], alpha=0.5, linewidth=1, label=col)
-            
-    plt.xlabel(r"Wavelength ($\mu m$)", fontsize=12)
-    plt.ylabel(ylabel, fontsize=12)
-    
+    if mode == "auto":
+        mode = "envelope" if len(values) > ENVELOPE_ABOVE else "collection"
+
+    # The object-oriented Figure needs no GUI backend, so it renders the same in a worker process
+    fig = Figure(figsize=(14, 8), dpi=300)
+    ax = fig.add_subplot(1, 1, 1)
+    ax.set_title(title, fontsize=16, fontweight='bold')
+    show_legend = len(values) <= LEGEND_MAX
+
+    if mode == "lines":
+        for name, row in zip(names, values):
+            ax.plot(wavelengths, row, alpha=0.5, linewidth=1, label=name)
+    elif mode == "collection":
+        colors = plt.get_cmap("tab20")(np.arange(len(values)) % 20)
+        segments = np.stack([np.broadcast_to(wavelengths, values.shape), values], axis=-1)
+        ax.add_collection(LineCollection(segments, colors=colors, alpha=0.5, linewidths=1))
+        ax.autoscale_view()
+        if show_legend:
+            for name, color in zip(names, colors):
+                ax.plot([], [], color=color, linewidth=1, label=name)
+    elif mode == "envelope":
+        hist, x_edges, y_edges = _density_image(wavelengths, values, DENSITY_BINS)
+        ax.imshow(np.log1p(hist.T), origin="lower", aspect="auto", cmap="Greys",
+                  extent=(x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]))
+        bands = np.nanpercentile(values, PERCENTILES, axis=0)
+        half = len(PERCENTILES) // 2
+        for k in range(half):
+            ax.fill_between(wavelengths, bands[k], bands[-k - 1], color="tab:blue", alpha=0.15 + 0.15 * k,
+                            label=f"P{PERCENTILES[k]}-P{PERCENTILES[-k - 1]}")
+        ax.plot(wavelengths, bands[half], color="tab:red", linewidth=2, label=f"P{PERCENTILES[half]}")
+        ax.text(0.01, 0.01, f"{len(values)} runs", transform=ax.transAxes, fontsize=10)
+        show_legend = True
+    else:
+        raise ValueError(f"Unknown PLOT_MODE '{mode}'")
+
+    ax.set_xlabel(r"Wavelength ($\mu m$)", fontsize=12)
+    ax.set_ylabel(ylabel, fontsize=12)
+
     # X-AXIS SCALE
     ax.xaxis.set_major_locator(ticker.MultipleLocator(0.005))
-    plt.grid(True, linestyle='--', alpha=0.6)
-    
+    ax.grid(True, linestyle='--', alpha=0.6)
+
     # Legend
-    plt.legend(fontsize='7', loc='upper left', bbox_to_anchor=(1, 1), ncol=2)
-    
-    full_save_path = os.path.join(PLOT_DIR, filename)
-    plt.tight_layout()
-    plt.savefig(full_save_path)
-    print(f"Saved: {full_save_path}")
-    plt.close()
-
-# --- 7. EXECUTE ---
-# Updated labels to indicate normalization
-save_doe_plot(t_data, "DOE Comparison: Transmission (Normalized by 2)", "Transmission_Full_DOE.png", "Transmission (%) / 2")
-save_doe_plot(r_data, "DOE Comparison: Reflection (Normalized by 2)", "Reflection_Full_DOE.png", "Reflection (%) / 2")
-
-print("\n" + "="*40)
-print(f"ANALYSIS COMPLETE")
-print(f"All plots are in: {PLOT_DIR}")
-print("="*40)
\ No newline at end of file
+    if show_legend:
+        ax.legend(fontsize='7', loc='upper left', bbox_to_anchor=(1, 1), ncol=2)
+
+    fig.tight_layout()
+    fig.savefig(save_path)
+    print(f"Saved: {save_path}")
+
+
+if __name__ == "__main__":
+    # --- 3. INITIALIZE DIRECTORIES ---
+    if not os.path.exists(PLOT_DIR):
+        os.makedirs(PLOT_DIR)
+        print(f"Created plot directory: {PLOT_DIR}")
+
+    # --- 4. LOAD TASK MAPPING ---
+    try:
+        name_mapping = campaign_tasks(EXCEL_FILE)["Task Name"].to_dict()
+        print(f"Loaded {len(name_mapping)} task name mappings.")
+    except Exception as e:
+        print(f"Error reading task list: {e}")
+        name_mapping = {}
+
+    # --- 5. EXTRACTION (incremental: only new or changed files are parsed) ---
+    spectra = update_spectra_store(CACHE_DIR)
+    print_error_summary(spectra["errors"], len(spectra["task_id"]) + len(spectra["errors"]))
+    # One row per design, T and R as fractions of the total incident power
+    spectra = circular_spectra(spectra, name_mapping, POLARIZATION_MODE, JONES)
+
+    # --- 6. PREPARE STORAGE ---
+    wavelengths = np.empty(0)
+    t_values = r_values = np.empty((0, 0))
+    if len(spectra["task_id"]):
+        # The first file's frequency axis is used for every curve; tasks simulated on
+        # a different grid are interpolated onto it instead of being plotted misaligned
+        all_wavelengths = to_wavelength_um(spectra["freq"])
+        wavelengths = all_wavelengths[0][~np.isnan(all_wavelengths[0])]
+        # --- MODIFIED: Normalized by the total incident power ---
+        # Original: np.abs(flux) * 100
+        t_values = values_at_wavelengths(all_wavelengths, spectra["T"] * 100, wavelengths)
+        r_values = values_at_wavelengths(all_wavelengths, spectra["R"] * 100, wavelengths)
+
+    column_names = [name_mapping.get(tid, tid) for tid in spectra["task_id"]]
+
+    # --- 7. EXECUTE ---
+    # Updated labels to indicate normalization
+    jobs = [
+        (wavelengths, t_values, column_names, f"DOE Comparison: Transmission (Normalized, {POLARIZATION_MODE})",
+         os.path.join(PLOT_DIR, "Transmission_Full_DOE.png"), "Norm. Transmission (%)"),
+        (wavelengths, r_values, column_names, f"DOE Comparison: Reflection (Normalized, {POLARIZATION_MODE})",
+         os.path.join(PLOT_DIR, "Reflection_Full_DOE.png"), "Norm. Reflection (%)"),
+    ]
+    if PARALLEL_FIGURES:
+        with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+            for future in [pool.submit(save_doe_plot, *job) for job in jobs]:
+                future.result()
+    else:
+        for job in jobs:
+            save_doe_plot(*job)
+
+    print("\n" + "="*40)
+    print(f"ANALYSIS COMPLETE")
+    print(f"All plots are in: {PLOT_DIR}")
+    print("="*40)
\ No newline at end of file
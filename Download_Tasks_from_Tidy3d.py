@@ -1,53 +1,202 @@
-import pandas as pd
-import tidy3d.web as web
+import h5py
 import os
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
+from Task_Registry import campaign_name, campaign_tasks, connect, register_files
 
 # --- 1. SETTINGS & DIRECTORY ---
 # Use 'r' before the path to handle Windows backslashes correctly
 DOWNLOAD_DIR = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_Circular_polar_tasks"
 EXCEL_FILE = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_Circular_polar.xlsx"
-ID_COLUMN = "Task ID"
-
-# Create the folder if it doesn't exist yet
-if not os.path.exists(DOWNLOAD_DIR):
-    os.makedirs(DOWNLOAD_DIR)
-    print(f"Created new directory: {DOWNLOAD_DIR}")
-
-# --- 2. LOAD TASK IDs ---
-try:
-    df = pd.read_excel(EXCEL_FILE)
-    task_ids = df[ID_COLUMN].astype(str).str.strip().tolist()
-    print(f"Loaded {len(task_ids)} Task IDs from {EXCEL_FILE}")
-except Exception as e:
-    print(f"Error reading Excel file: {e}")
-    task_ids = []
-
-# --- 3. DOWNLOAD LOOP ---
-success_count = 0
-fail_count = 0
-
-for tid in task_ids:
-    # Construct the full path for the local HDF5 file
-    hdf5_path = os.path.join(DOWNLOAD_DIR, f"{tid}.hdf5")
-
-    if os.path.exists(hdf5_path):
-        print(f"Skipping {tid} (Already exists)")
-        success_count += 1
-        continue
 
+# Parallel / retry settings
+MAX_WORKERS = 8          # Number of simultaneous downloads
+MAX_RETRIES = 4          # Attempts per task before it is written to the failure journal
+BACKOFF_BASE = 2.0       # Seconds; delay doubles on every retry (plus a little jitter)
+BACKOFF_MAX = 60.0
+
+# The journal remembers what finished and what failed, so a rerun only retries failures
+JOURNAL_FILE = "download_journal.json"
+PART_SUFFIX = ".part"
+
+# Groups every finished Tidy3D result file must contain
+REQUIRED_KEYS = ("JSON_STRING", "data")
+
+
+# --- 2. INTEGRITY & JOURNAL HELPERS ---
+def is_valid_hdf5(path):
+    """
+    Returns True if the file is a readable Tidy3D result file.
+    A truncated or half-written download fails to open or misses the top-level groups.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return False
+    try:
+        with h5py.File(path, "r") as f:
+            return all(key in f for key in REQUIRED_KEYS)
+    except Exception:
+        return False
+
+
+def load_journal(download_dir):
+    journal_path = os.path.join(download_dir, JOURNAL_FILE)
+    if os.path.exists(journal_path):
+        try:
+            with open(journal_path, "r") as fh:
+                journal = json.load(fh)
+            journal.setdefault("completed", {})
+            journal.setdefault("failed", {})
+            return journal
+        except Exception as e:
+            print(f"  [!] Journal unreadable, starting fresh: {e}")
+    return {"completed": {}, "failed": {}}
+
+
+def save_journal(download_dir, journal):
+    # Same temp-then-rename trick as the data files so the journal is never half-written
+    journal_path = os.path.join(download_dir, JOURNAL_FILE)
+    tmp_path = journal_path + PART_SUFFIX
+    with open(tmp_path, "w") as fh:
+        json.dump(journal, fh, indent=2)
+    os.replace(tmp_path, journal_path)
+
+
+def journal_subset(journal, task_ids):
+    """ The 'completed' and 'failed' entries of these task IDs only; a journal can be shared by several campaigns. """
+    task_ids = set(task_ids)
+    return {key: {tid: value for tid, value in journal[key].items() if tid in task_ids}
+            for key in ("completed", "failed")}
+
+
+def is_complete(tid, hdf5_path, journal):
+    """
+    A task counts as done only if its file exists with the size recorded on completion.
+    Files without a journal entry (older downloads) get a full integrity check instead.
+    """
+    if not os.path.exists(hdf5_path):
+        return False
+    recorded_size = journal["completed"].get(tid)
+    if recorded_size is not None:
+        return os.path.getsize(hdf5_path) == recorded_size
+    return is_valid_hdf5(hdf5_path)
+
+
+# --- 3. SINGLE TASK DOWNLOAD ---
+def download_one(tid, download_dir, download_fn, max_retries=MAX_RETRIES,
+                 backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX):
+    """
+    Downloads one task into '<tid>.hdf5.part', checks it, then renames it into place.
+    :param download_fn: Callable(task_id=..., path=...) such as web.api.webapi.download
+    :return: (task_id, size in bytes or None, error message or None, attempts used)
+    """
+    hdf5_path = os.path.join(download_dir, f"{tid}.hdf5")
+    part_path = hdf5_path + PART_SUFFIX
+    last_error = None
+
+    for attempt in range(1, max_retries + 1):
+        try:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            download_fn(task_id=tid, path=part_path)
+            if not is_valid_hdf5(part_path):
+                raise IOError("downloaded file failed the HDF5 integrity check")
+            os.replace(part_path, hdf5_path)
+            return tid, os.path.getsize(hdf5_path), None, attempt
+        except Exception as e:
+            last_error = f"{type(e).__name__}: {e}"
+            if attempt < max_retries:
+                delay = min(backoff_max, backoff_base * 2 ** (attempt - 1))
+                time.sleep(delay + random.uniform(0, delay / 4))
+
+    if os.path.exists(part_path):
+        os.remove(part_path)
+    return tid, None, last_error, max_retries
+
+
+# --- 4. PARALLEL DOWNLOAD LOOP ---
+def download_tasks(task_ids, download_dir, download_fn, max_workers=MAX_WORKERS,
+                   max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX):
+    """
+    Downloads all task IDs with a worker pool. Already complete files are skipped.
+    :param download_fn: Callable(task_id=..., path=...). Pass a local stand-in for offline testing.
+    :return: The updated journal dict with 'completed' and 'failed' entries
+    """
+    if not os.path.exists(download_dir):
+        os.makedirs(download_dir)
+        print(f"Created new directory: {download_dir}")
+
+    journal = load_journal(download_dir)
+    journal_lock = threading.Lock()
+
+    unique_ids = list(dict.fromkeys(task_ids))
+    pending = []
+    for tid in unique_ids:
+        hdf5_path = os.path.join(download_dir, f"{tid}.hdf5")
+        if is_complete(tid, hdf5_path, journal):
+            journal["completed"][tid] = os.path.getsize(hdf5_path)
+            journal["failed"].pop(tid, None)
+            continue
+        if os.path.exists(hdf5_path):
+            print(f"  [!] {tid} is incomplete or corrupt, downloading again")
+            os.remove(hdf5_path)
+        journal["completed"].pop(tid, None)
+        pending.append(tid)
+
+    print(f"{len(unique_ids) - len(pending)} tasks already complete, {len(pending)} to download "
+          f"({len(journal_subset(journal, unique_ids)['failed'])} failed last time)")
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(download_one, tid, download_dir, download_fn,
+                                   max_retries, backoff_base, backoff_max) for tid in pending]
+            for future in as_completed(futures):
+                tid, size, error, attempts = future.result()
+                with journal_lock:
+                    if error is None:
+                        journal["completed"][tid] = size
+                        journal["failed"].pop(tid, None)
+                        print(f"Downloaded {tid} ({size / 1e6:.2f} MB, attempt {attempts})")
+                    else:
+                        journal["failed"][tid] = {"error": error, "attempts": attempts}
+                        print(f"Failed to download {tid} after {attempts} attempts: {error}")
+                    save_journal(download_dir, journal)
+
+    save_journal(download_dir, journal)
+    return journal
+
+
+if __name__ == "__main__":
+    import tidy3d.web as web
+
+    # --- 5. LOAD TASK IDs ---
     try:
-        print(f"Downloading {tid}...")
-        # Using the specific 'download' method that worked for you
-        web.api.webapi.download(task_id=tid, path=hdf5_path)
-        success_count += 1
+        task_ids = campaign_tasks(EXCEL_FILE).index.tolist()
+        print(f"Loaded {len(task_ids)} Task IDs for {campaign_name(EXCEL_FILE)}")
     except Exception as e:
-        print(f"Failed to download {tid}: {e}")
-        fail_count += 1
-
-# --- 4. SUMMARY ---
-print("\n" + "="*40)
-print(f"DOWNLOAD COMPLETE")
-print(f"Successfully available: {success_count}")
-print(f"Failed: {fail_count}")
-print(f"Files are located in: {DOWNLOAD_DIR}")
-print("="*40)
\ No newline at end of file
+        print(f"Error reading task list: {e}")
+        task_ids = []
+
+    # --- 6. DOWNLOAD ---
+    # Using the specific 'download' method that worked for you
+    journal = download_tasks(task_ids, DOWNLOAD_DIR, web.api.webapi.download)
+
+    # Remember where each task file is, so later lookups do not have to scan the folder
+    if task_ids:
+        with closing(connect()) as con:
+            register_files(con, campaign_name(EXCEL_FILE), DOWNLOAD_DIR)
+
+    # --- 7. SUMMARY ---
+    # Only the tasks of this campaign; the journal may also hold other campaigns' downloads
+    journal = journal_subset(journal, task_ids)
+    print("\n" + "="*40)
+    print(f"DOWNLOAD COMPLETE")
+    print(f"Successfully available: {len(journal['completed'])}")
+    print(f"Failed: {len(journal['failed'])}")
+    if journal["failed"]:
+        print(f"Rerun this script to retry only the failed tasks (see {JOURNAL_FILE})")
+    print(f"Files are located in: {DOWNLOAD_DIR}")
+    print("="*40)
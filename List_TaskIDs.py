@@ -1,45 +1,153 @@
-import tidy3d.web as web
 import pandas as pd
 import os
+import json
+from contextlib import closing
+from Task_Registry import campaign_name, connect, mark_source, registered, replace_tasks, reused_tasks
 
 # --- 1. CONFIGURATION ---
 FOLDER_NAME = "Circular_polar_v2"
 OUTPUT_FILE = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_Circular_polar.xlsx"
 
-print(f"Connecting to Tidy3D folder: {FOLDER_NAME}...")
-
-try:
-    # --- 2. FETCH ALL TASKS IN FOLDER ---
-    # This retrieves a list of dictionaries containing metadata for every run
-    tasks = web.get_tasks(folder=FOLDER_NAME)
-    
-    if not tasks:
-        print(f"No tasks found in folder '{FOLDER_NAME}'.")
-    else:
-        # --- 3. EXTRACT RELEVANT DATA ---
-        task_data = []
-        for t in tasks:
-            task_data.append({
-                "Task Name": t.get('taskName') or t.get('task_name'),
-                "Task ID": t.get('taskId') or t.get('task_id'),
-                "Status": t.get('status'),
-                "Created": t.get('created')
-            })
-        
-        # --- 4. CREATE DATAFRAME AND SAVE ---
-        df = pd.DataFrame(task_data)
-        
-        # Clean up the Task ID column to ensure no hidden spaces
-        df["Task ID"] = df["Task ID"].str.strip()
-        
-        # Save to Excel
-        df.to_excel(OUTPUT_FILE, index=False)
-        
-        print("\n" + "="*40)
-        print(f"SUCCESS! Created {OUTPUT_FILE}")
-        print(f"Total tasks found: {len(df)}")
-        print("="*40)
-
-except Exception as e:
-    print(f"\n[!] ERROR: {e}")
-    print("Ensure you are logged in by running 'tidy3d configure' in your terminal.")
\ No newline at end of file
+# Local index of every task seen in the folder; a rerun compares the listing against it and
+# leaves the outputs alone when nothing changed
+INDEX_FILE = os.path.splitext(OUTPUT_FILE)[0] + "_index.json"
+SYNC = True              # False rebuilds the index from scratch
+
+# Only write tasks with these statuses to OUTPUT_FILE, e.g. ["success"]; None writes all
+STATUS_FILTER = None
+
+# The task registry (Task_Registry.py) always gets the same tasks; the Excel file is an optional report
+WRITE_EXCEL = True
+
+COLUMNS = ["Task Name", "Task ID", "Status", "Created"]
+
+
+# --- 2. LOCAL TASK INDEX ---
+def task_created(t):
+    """
+    Creation time of a task dict from web.get_tasks as an ISO string: 'created_at' in
+    tidy3d 2.x (SimulationTask.model_dump), 'createdAt'/'created' in older listings.
+    """
+    created = t.get('created_at') or t.get('createdAt') or t.get('created')
+    return None if created is None else str(created)
+
+
+def task_row(t):
+    return {"Task Name": t.get('taskName') or t.get('task_name'),
+            "Task ID": str(t.get('taskId') or t.get('task_id')).strip(),
+            "Status": t.get('status'),
+            "Created": task_created(t)}
+
+
+def load_index(index_file, folder_name):
+    """ :return: {'folder': ..., 'tasks': {task_id: row}}; empty if missing or for another folder """
+    if os.path.exists(index_file):
+        try:
+            with open(index_file, "r") as fh:
+                index = json.load(fh)
+            if index.get("folder") == folder_name:
+                return index
+            print(f"  [!] {index_file} belongs to folder '{index.get('folder')}', listing from scratch")
+        except (OSError, ValueError) as e:
+            print(f"  [!] Could not read {index_file} ({e}), listing from scratch")
+    return {"folder": folder_name, "tasks": {}}
+
+
+def save_index(index, index_file):
+    tmp_path = index_file + ".part"
+    with open(tmp_path, "w") as fh:
+        json.dump(index, fh, indent=2, default=str)
+    os.replace(tmp_path, index_file)
+
+
+def _created(value):
+    return pd.to_datetime(value, utc=True, errors="coerce")
+
+
+# --- 3. LISTING ---
+def sync_tasks(web_api, folder_name, index_file=INDEX_FILE, full=not SYNC,
+               status_filter=STATUS_FILTER, registry=None, campaign=None):
+    """
+    Brings the local task index up to date with the cloud folder and saves it.
+    web.get_tasks always lists the whole folder (num_tasks only trims the result afterwards),
+    so the folder is listed once and compared with the index here: new, changed and removed
+    tasks are counted, and an unchanged listing is not written again.
+    :param full: Rebuild the index from scratch instead of comparing against it
+    :param status_filter: Statuses to return (case-insensitive), or None for all tasks
+    :param registry: Optional open task registry; the returned tasks (the same set that goes
+                     to the Excel file) replace the campaign's tasks in it when the listing changed.
+                     Designs a job reused from earlier campaigns instead of running them in this
+                     folder (Simulation_Cache.save_reused) are listed from it as well
+    :return: (DataFrame of the indexed tasks, newest first, dict with counts 'new', 'updated',
+             'removed', 'calls' and 'changed', False when the listing is the same as last time)
+    """
+    index = {"folder": folder_name, "tasks": {}} if full else load_index(index_file, folder_name)
+    old_tasks = index["tasks"]
+    rows = [task_row(t) for t in web_api.get_tasks(folder=folder_name) or []]
+    if registry is not None:
+        rows += reused_tasks(registry, folder_name).to_dict("records")
+
+    tasks = {}
+    counts = {"new": 0, "updated": 0, "calls": 1}
+    for row in rows:
+        old = old_tasks.get(row["Task ID"])
+        if old is None:
+            counts["new"] += 1
+        elif old["Status"] != row["Status"]:
+            counts["updated"] += 1
+        tasks[row["Task ID"]] = row
+    counts["removed"] = len(set(old_tasks) - set(tasks))
+    index["tasks"] = tasks
+
+    status_filter = sorted(s.lower() for s in status_filter) if status_filter else None
+    counts["changed"] = bool(counts["new"] or counts["updated"] or counts["removed"]
+                             or index.get("status_filter") != status_filter)
+    index["status_filter"] = status_filter
+    if counts["changed"] or not os.path.exists(index_file):
+        save_index(index, index_file)
+
+    df = pd.DataFrame(list(tasks.values()), columns=COLUMNS)
+    if status_filter:
+        df = df[df["Status"].astype(str).str.lower().isin(status_filter)]
+    if registry is not None and (counts["changed"] or not registered(registry, campaign)):
+        replace_tasks(registry, campaign, df, synced=True)
+    order = _created(df["Created"]).sort_values(ascending=False, na_position="last").index
+    return df.loc[order].reset_index(drop=True), counts
+
+
+if __name__ == "__main__":
+    import tidy3d.web as web
+
+    print(f"Connecting to Tidy3D folder: {FOLDER_NAME}...")
+
+    try:
+        # --- 4. FETCH NEW AND CHANGED TASKS IN FOLDER ---
+        campaign = campaign_name(OUTPUT_FILE)
+        with closing(connect()) as registry:
+            df, counts = sync_tasks(web, FOLDER_NAME, registry=registry, campaign=campaign)
+
+            # --- 5. SAVE ---
+            # Rewriting a large Excel file is slow, so an unchanged listing is left as it is
+            changed = WRITE_EXCEL and not df.empty and (counts["changed"] or not os.path.exists(OUTPUT_FILE))
+            if changed:
+                df.to_excel(OUTPUT_FILE, index=False)
+                # The registry already has these tasks; no need to read the Excel file back in
+                mark_source(registry, campaign, OUTPUT_FILE)
+
+        if df.empty:
+            print(f"No tasks found in folder '{FOLDER_NAME}'" + (f" with status {STATUS_FILTER}." if STATUS_FILTER else "."))
+        else:
+            print("\n" + "="*40)
+            if changed:
+                print(f"SUCCESS! Created {OUTPUT_FILE}")
+            elif WRITE_EXCEL:
+                print(f"No changes, {OUTPUT_FILE} is up to date")
+            print(f"New tasks: {counts['new']}, status changes: {counts['updated']}, "
+                  f"removed: {counts['removed']} ({counts['calls']} listing request(s))")
+            print(f"Total tasks found: {len(df)}" + (f" with status {STATUS_FILTER}" if STATUS_FILTER else ""))
+            print(f"Task index kept in: {INDEX_FILE}, registered as campaign '{campaign}'")
+            print("="*40)
+
+    except Exception as e:
+        print(f"\n[!] ERROR: {e}")
+        print("Ensure you are logged in by running 'tidy3d configure' in your terminal.")
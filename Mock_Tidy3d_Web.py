@@ -0,0 +1,405 @@
+import h5py
+import numpy as np
+import pandas as pd
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import hashlib
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+# --- 1. CONFIGURATION ---
+# Every delay is in real seconds; keep them small to load-test on a laptop
+API_LATENCY = 0.05           # Added to every call (get_info, upload, start, ...)
+QUEUE_DELAY = (0.5, 2.0)     # Uniform range a started task waits before it runs
+RUN_TIME = (2.0, 6.0)        # Uniform range of the solver time
+MAX_RUNNING = 50             # Tasks the mock cloud solves at once; the rest wait in the queue
+
+TASK_FAILURE_RATE = 0.02     # Fraction of tasks that end in 'error'
+DOWNLOAD_FAILURE_RATE = 0.05 # Fraction of download attempts that raise a ConnectionError
+BANDWIDTH_MBPS = 200.0       # Shared download link, MB/s across all parallel downloads
+PAYLOAD_MB = 2.0             # Extra bytes per result file, standing in for field monitors
+
+COST_PER_TASK = 0.25         # FlexCredits reported by estimate_cost
+SEED = 0
+
+lambdas_23 = np.linspace(0.79, 0.9, 23)
+C_LIGHT = 299792458
+
+
+# --- 2. DETERMINISTIC RANDOMNESS ---
+def _rng(*keys):
+    """ Independent generator per (seed, keys), so outcomes do not depend on thread timing. """
+    digest = hashlib.sha256(json.dumps([SEED, *keys], default=str).encode()).digest()
+    return np.random.default_rng(int.from_bytes(digest[:8], "little"))
+
+
+# --- 3. RESULT FILES ---
+def write_result_file(path, task_name, sim_json=None, payload_mb=PAYLOAD_MB):
+    """
+    Writes a Tidy3D-like result file: T at data/0, R at data/1, a 'field' payload at
+    data/2 and a JSON_STRING naming the monitors. Spectra come from the transfer-matrix
+    model when the task name carries the thicknesses ('..._T<top>_B<bottom>'),
+    otherwise from the seeded generator.
+    """
+    freqs = C_LIGHT / (lambdas_23 * 1e-6)
+    match = re.search(r'_T(\d+)_B(\d+)', str(task_name))
+    if match:
+        from Transfer_Matrix_Prescreen import stack_rt, TO_UM
+        T, R = stack_rt(float(match.group(1)) * TO_UM, float(match.group(2)) * TO_UM, lambdas_23)
+    else:
+        T = _rng("spectrum", task_name).uniform(0.6, 0.95, lambdas_23.size)
+        R = 1 - T
+
+    simulation = json.loads(sim_json) if sim_json else {}
+    json_string = {"simulation": simulation, "type": "SimulationData", "log": solver_log(task_name, simulation),
+                   "data": [{"monitor": {"name": name}} for name in ("T", "R", "field")]}
+    with h5py.File(path, "w") as f:
+        f["JSON_STRING"] = json.dumps(json_string).encode()
+        for i, values in enumerate((T, -R)):
+            f[f"data/{i}/flux/__xarray_dataarray_variable__"] = values
+            f[f"data/{i}/flux/f"] = freqs
+        f["data/2/Ex"] = np.zeros(int(payload_mb * 1e6 / 8))
+
+
+def solver_log(task_name, simulation, n_lines=50):
+    """
+    Solver progress lines in the format of a Tidy3D task log. The field decays exponentially
+    after the pulse at a seeded rate; the log ends early with the shutoff message once the
+    decay reaches the simulation's shutoff level.
+    """
+    run_time = simulation.get("run_time")
+    if not isinstance(run_time, (int, float)):
+        return None
+    shutoff = simulation.get("shutoff", 1e-5)
+    rng = _rng("decay", task_name)
+    peak, tau = run_time * rng.uniform(0.05, 0.15), run_time * rng.uniform(0.04, 0.12)
+    lines = []
+    for i in range(1, n_lines + 1):
+        t = run_time * i / n_lines
+        decay = min(1.0, np.exp(-(t - peak) / tau))
+        lines.append(f"- Time step {i * 200:>8} / time {t:.2e}s ({i * 100 // n_lines:>3} % done), "
+                     f"field decay: {decay:.2e}")
+        if shutoff > 0 and decay < shutoff:
+            lines.append("Field decay smaller than shutoff factor, exiting solver.")
+            break
+    return "\n".join(lines) + "\n"
+
+
+class MockSimulationData:
+    """ The part of td.SimulationData the scripts use: data["T"].flux and to_hdf5(). """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __getitem__(self, monitor):
+        with h5py.File(self.path, "r") as f:
+            names = [entry["monitor"]["name"] for entry in json.loads(f["JSON_STRING"][()])["data"]]
+            group = f"data/{names.index(monitor)}/flux"
+            flux = SimpleNamespace(values=f[f"{group}/__xarray_dataarray_variable__"][()],
+                                   f=SimpleNamespace(values=f[f"{group}/f"][()]))
+        return SimpleNamespace(flux=flux)
+
+    def to_hdf5(self, path):
+        shutil.copyfile(self.path, path)
+
+
+# --- 4. MOCK SERVICE ---
+class MockWeb:
+    """
+    Stand-in for `tidy3d.web` with the calls used in this repository:
+    get_tasks, get_info, upload, estimate_cost, start, monitor, delete, download,
+    real_cost, run, Job, Batch and api.webapi.download.
+    Task state lives in memory and is derived from the clock, so many threads or
+    coroutines can poll it at once.
+    """
+
+    def __init__(self, api_latency=API_LATENCY, queue_delay=QUEUE_DELAY, run_time=RUN_TIME,
+                 max_running=MAX_RUNNING, task_failure_rate=TASK_FAILURE_RATE,
+                 download_failure_rate=DOWNLOAD_FAILURE_RATE, bandwidth_mbps=BANDWIDTH_MBPS,
+                 payload_mb=PAYLOAD_MB, cost_per_task=COST_PER_TASK):
+        self.api_latency = api_latency
+        self.queue_delay = queue_delay
+        self.run_time = run_time
+        self.max_running = max_running
+        self.task_failure_rate = task_failure_rate
+        self.download_failure_rate = download_failure_rate
+        self.bandwidth = bandwidth_mbps * 1e6
+        self.payload_mb = payload_mb
+        self.cost_per_task = cost_per_task
+
+        self.tasks = {}
+        self.stats = {"calls": 0, "downloads": 0, "download_failures": 0, "bytes": 0}
+        self._lock = threading.Lock()
+        self._link_free = 0.0        # When the shared download link is next idle
+        self._slot_free = []         # Finish times of the tasks holding a solver slot
+        self._download_attempts = {}
+
+        self.api = SimpleNamespace(webapi=SimpleNamespace(download=self.download))
+        self.Job = self._job_class()
+        self.Batch = self._batch_class()
+
+    # -- bookkeeping --
+    def _call(self):
+        with self._lock:
+            self.stats["calls"] += 1
+        if self.api_latency:
+            time.sleep(self.api_latency)
+
+    def _task(self, task_id):
+        if task_id not in self.tasks:
+            raise ValueError(f"Task '{task_id}' not found")
+        return self.tasks[task_id]
+
+    def add_finished_tasks(self, task_names, folder_name="default"):
+        """ Pre-populates a folder with successful tasks, e.g. to load-test downloads. """
+        ids = []
+        for name in task_names:
+            task_id = self._new_task(None, name, folder_name)
+            task = self.tasks[task_id]
+            task.update({"start": 0.0, "finish": 0.0, "failed": False})
+            ids.append(task_id)
+        return ids
+
+    def _new_task(self, simulation, task_name, folder_name):
+        with self._lock:
+            task_id = f"fdve-mock-{len(self.tasks):06d}"
+            if hasattr(simulation, "model_dump_json"):
+                sim_json = simulation.model_dump_json()
+            else:
+                sim_json = simulation.json() if hasattr(simulation, "json") else None
+            self.tasks[task_id] = {"task_id": task_id, "task_name": task_name, "folder": folder_name,
+                                   "created": datetime.now(timezone.utc), "sim_json": sim_json,
+                                   "start": None, "finish": None, "failed": None, "deleted": False}
+        return task_id
+
+    # -- tidy3d.web functions --
+    def get_tasks(self, num_tasks=None, order="new", folder="default"):
+        self._call()
+        rows = [t for t in self.tasks.values() if t["folder"] == folder and not t["deleted"]]
+        rows.sort(key=lambda t: (t["created"], t["task_id"]), reverse=(order == "new"))
+        if num_tasks is not None:
+            rows = rows[:num_tasks]
+        # Same keys as SimulationTask.model_dump() in tidy3d 2.x; the task name is an extra field
+        return [{"task_id": t["task_id"], "folder_id": f"folder-{t['folder']}", "status": self._status(t),
+                 "real_flex_unit": None, "created_at": t["created"], "task_type": "FDTD",
+                 "folder_name": t["folder"], "callback_url": None, "taskName": t["task_name"]}
+                for t in rows]
+
+    def _status(self, task):
+        if task["deleted"]:
+            return "deleted"
+        if task["start"] is None:
+            return "draft"
+        now = time.time()
+        if now < task["start"]:
+            return "queued"
+        if now < task["finish"]:
+            return "running"
+        return "error" if task["failed"] else "success"
+
+    def get_info(self, task_id, verbose=True):
+        self._call()
+        task = self._task(task_id)
+        # Keys of TaskInfo, which get_info returns
+        return {"taskId": task_id, "taskName": task["task_name"], "status": self._status(task),
+                "createAt": task["created"], "taskType": "FDTD"}
+
+    def upload(self, simulation, task_name, folder_name="default", verbose=True, **kwargs):
+        self._call()
+        return self._new_task(simulation, task_name, folder_name)
+
+    def estimate_cost(self, task_id, verbose=True):
+        self._call()
+        self._task(task_id)
+        return self.cost_per_task
+
+    def real_cost(self, task_id, verbose=True):
+        self._call()
+        return self.cost_per_task if self._status(self._task(task_id)) == "success" else 0.0
+
+    def start(self, task_id, **kwargs):
+        self._call()
+        task = self._task(task_id)
+        rng = _rng("task", task["task_name"], task_id)
+        ready = time.time() + rng.uniform(*self.queue_delay)
+        run_time = rng.uniform(*self.run_time)
+        with self._lock:
+            # Wait for a free solver slot once MAX_RUNNING tasks are busy
+            self._slot_free = sorted(t for t in self._slot_free if t > time.time())
+            if len(self._slot_free) >= self.max_running:
+                ready = max(ready, self._slot_free[len(self._slot_free) - self.max_running])
+            task["start"] = ready
+            task["finish"] = ready + run_time
+            task["failed"] = bool(rng.random() < self.task_failure_rate)
+            self._slot_free.append(task["finish"])
+
+    def monitor(self, task_id, verbose=True):
+        while self._status(self._task(task_id)) not in ("success", "error", "deleted"):
+            time.sleep(min(0.2, max(self.api_latency, 0.01)))
+
+    def delete(self, task_id):
+        self._call()
+        self._task(task_id)["deleted"] = True
+
+    def download(self, task_id, path="simulation_data.hdf5", verbose=True, **kwargs):
+        """ Writes the result file to path, sharing BANDWIDTH_MBPS with other downloads. """
+        self._call()
+        task = self._task(task_id)
+        if self._status(task) != "success":
+            raise RuntimeError(f"Task '{task_id}' is not finished successfully")
+
+        with self._lock:
+            attempt = self._download_attempts.get(task_id, 0) + 1
+            self._download_attempts[task_id] = attempt
+        if _rng("download", task_id, attempt).random() < self.download_failure_rate:
+            with self._lock:
+                self.stats["download_failures"] += 1
+            raise ConnectionError(f"simulated transfer failure for {task_id} (attempt {attempt})")
+
+        write_result_file(path, task["task_name"], task["sim_json"], self.payload_mb)
+        size = os.path.getsize(path)
+        with self._lock:
+            start = max(time.time(), self._link_free)
+            self._link_free = start + size / self.bandwidth
+            done = self._link_free
+            self.stats["downloads"] += 1
+            self.stats["bytes"] += size
+        time.sleep(max(0.0, done - time.time()))
+        return path
+
+    def load(self, task_id, path="simulation_data.hdf5", verbose=True, **kwargs):
+        self.download(task_id, path)
+        return MockSimulationData(path)
+
+    def run(self, simulation, task_name, folder_name="default", path="simulation_data.hdf5", verbose=True, **kwargs):
+        task_id = self.upload(simulation, task_name, folder_name)
+        self.start(task_id)
+        self.monitor(task_id)
+        return self.load(task_id, path)
+
+    # -- web.Job / web.Batch --
+    def _job_class(self):
+        web = self
+
+        class Job:
+            def __init__(self, simulation, task_name, folder_name="default", verbose=True, **kwargs):
+                self.simulation = simulation
+                self.task_name = task_name
+                self.folder_name = folder_name
+                self.task_id = web.upload(simulation, task_name, folder_name)
+
+            @property
+            def status(self):
+                return web.get_info(self.task_id)["status"]
+
+            def start(self):
+                web.start(self.task_id)
+
+            def monitor(self):
+                web.monitor(self.task_id)
+
+            def load(self, path="simulation_data.hdf5"):
+                return web.load(self.task_id, path)
+
+            def run(self, path="simulation_data.hdf5"):
+                self.start()
+                self.monitor()
+                return self.load(path)
+
+        return Job
+
+    def _batch_class(self):
+        web = self
+
+        class BatchData(dict):
+            pass
+
+        class Batch:
+            def __init__(self, simulations, folder_name="default", verbose=True, **kwargs):
+                self.simulations = simulations
+                self.folder_name = folder_name
+                self.jobs = {name: web.Job(sim, name, folder_name) for name, sim in simulations.items()}
+
+            def start(self):
+                for job in self.jobs.values():
+                    job.start()
+
+            def monitor(self):
+                for job in self.jobs.values():
+                    job.monitor()
+
+            def load(self, path_dir="."):
+                os.makedirs(path_dir, exist_ok=True)
+                data = BatchData()
+                for name, job in self.jobs.items():
+                    if web._status(web.tasks[job.task_id]) == "success":
+                        data[name] = job.load(os.path.join(path_dir, f"{job.task_id}.hdf5"))
+                return data
+
+            def run(self, path_dir="."):
+                self.start()
+                self.monitor()
+                return self.load(path_dir)
+
+        return Batch
+
+
+# --- 5. PLUGGING IT IN ---
+def install(mock):
+    """
+    Makes `import tidy3d.web as web` return the mock in this process.
+    The real tidy3d package is still used for td.Simulation when it is installed.
+    """
+    sys.modules["tidy3d.web"] = mock
+    parent = sys.modules.get("tidy3d")
+    if parent is None:
+        try:
+            import tidy3d as parent
+        except ImportError:
+            parent = SimpleNamespace(web=mock)
+            sys.modules["tidy3d"] = parent
+    setattr(parent, "web", mock)
+    return mock
+
+
+def run_script(script_path, mock):
+    """ Runs one of the repository scripts as __main__ against the mock. """
+    import runpy
+    install(mock)
+    return runpy.run_path(script_path, run_name="__main__")
+
+
+if __name__ == "__main__":
+    from Download_Tasks_from_Tidy3d import download_tasks
+
+    # --- 6. DOWNLOAD LOAD TEST ---
+    N_TASKS = 200
+    WORKER_COUNTS = [1, 4, 8, 16]
+    OUT_DIR = "mock_downloads"
+
+    web = MockWeb(api_latency=0.02, payload_mb=1.0, bandwidth_mbps=100.0)
+    names = [f"Run_{i}_T{750 + 5 * (i % 91)}_B{750 + 5 * (i // 91)}" for i in range(N_TASKS)]
+    task_ids = web.add_finished_tasks(names, folder_name="load_test")
+
+    rows = []
+    for workers in WORKER_COUNTS:
+        if os.path.exists(OUT_DIR):
+            shutil.rmtree(OUT_DIR)
+        start = time.perf_counter()
+        journal = download_tasks(task_ids, OUT_DIR, web.api.webapi.download, max_workers=workers,
+                                 backoff_base=0.05, backoff_max=0.5)
+        elapsed = time.perf_counter() - start
+        rows.append({"Workers": workers, "Seconds": round(elapsed, 2),
+                     "Tasks/s": round(N_TASKS / elapsed, 1), "Failed": len(journal["failed"])})
+
+    shutil.rmtree(OUT_DIR, ignore_errors=True)
+    print("\n" + "="*40)
+    print(f"MOCK DOWNLOAD LOAD TEST ({N_TASKS} tasks, {web.bandwidth / 1e6:.0f} MB/s link)")
+    print(pd.DataFrame(rows).to_string(index=False))
+    print(f"Simulated transfer failures (retried): {web.stats['download_failures']}")
+    print("="*40)
@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+import os
+import time
+from Surface_Interpolation import surface_interpolator
+from Task_Registry import parse_thickness
+
+# --- 1. CONFIGURATION ---
+SUMMARY_FILE = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_Circular_polar_plots\DOE_Target_Summary.csv"
+OUTPUT_FILE = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_Circular_polar_plots\Monte_Carlo_Yield.xlsx"
+
+# Nominal deposition targets in Angstrom
+NOMINAL = {"SiN_T": 1000.0, "SiN_B": 950.0}
+
+# Deposition variation per layer: ("normal", sigma), ("uniform", half width) or
+# ("triangular", half width), all in Angstrom
+TOLERANCES = {"SiN_T": ("normal", 15.0), "SiN_B": ("normal", 15.0)}
+CORRELATION = 0.0        # Between top and bottom thickness errors (normal tolerances only)
+
+LSL = 90.0               # Lower spec limit on transmission (%), as in Process_capability.py
+SURFACE_METHOD = "cubic" # "cubic" or "linear" interpolation of the DOE results
+
+N_SAMPLES = 2_000_000
+CHUNK_SIZE = 250_000     # Samples evaluated per NumPy block; bounds memory
+BLOCK_SIZE = 1_000       # Samples per bootstrap block (see summarize)
+N_BOOTSTRAP = 2_000
+CONFIDENCE = 0.95
+SEED = 0
+
+
+# --- 2. RESPONSE SURFACE FROM THE DOE ---
+def load_doe_surface(summary_file, method=SURFACE_METHOD):
+    """
+    Reads DOE_Target_Summary.csv (one row per run and target wavelength) and returns
+    (wavelengths, surface) where surface(points) gives T (%) at every wavelength.
+    Thicknesses are parsed from run names like 'Run_3_T750_B1200'.
+    """
+    df = pd.read_csv(summary_file)
+    table = df.pivot_table(index="Run Name", columns="Target Wavelength", values="Transmission (%)")
+    points = parse_thickness(table.index.to_series()).to_numpy(dtype=float)
+    print(f"Response surface from {int(np.isfinite(points).all(axis=1).sum())} DOE runs "
+          f"at {len(table.columns)} wavelengths ({method})")
+    return table.columns.to_numpy(dtype=float), surface_interpolator(points, table.to_numpy(dtype=float), method)
+
+
+# --- 3. SAMPLING ---
+def sample_thickness(rng, n, nominal=NOMINAL, tolerances=TOLERANCES, correlation=CORRELATION):
+    """ Draws n (SiN_T, SiN_B) pairs in Angstrom around the nominal. :return: (n x 2) array """
+    layers = ("SiN_T", "SiN_B")
+    kinds = [tolerances[layer][0] for layer in layers]
+    out = np.empty((n, 2))
+
+    if correlation and all(kind == "normal" for kind in kinds):
+        sigma = np.array([tolerances[layer][1] for layer in layers])
+        cov = np.outer(sigma, sigma) * np.array([[1.0, correlation], [correlation, 1.0]])
+        return rng.multivariate_normal([nominal[layer] for layer in layers], cov, size=n)
+
+    for j, layer in enumerate(layers):
+        kind, width = tolerances[layer]
+        if kind == "normal":
+            out[:, j] = rng.normal(nominal[layer], width, n)
+        elif kind == "uniform":
+            out[:, j] = rng.uniform(nominal[layer] - width, nominal[layer] + width, n)
+        elif kind == "triangular":
+            out[:, j] = rng.triangular(nominal[layer] - width, nominal[layer], nominal[layer] + width, n)
+        else:
+            raise ValueError(f"Unknown tolerance distribution '{kind}' for {layer}")
+    return out
+
+
+def run_monte_carlo(surface, n_wavelengths, n_samples=N_SAMPLES, chunk_size=CHUNK_SIZE,
+                    block_size=BLOCK_SIZE, lsl=LSL, seed=SEED, **sample_kwargs):
+    """
+    Samples thickness variations in chunks and accumulates per-block sums, so memory stays
+    at one chunk no matter how many samples are drawn.
+    :param n_samples: A multiple of block_size, so every sample lands in a full bootstrap block
+    :return: dict of (blocks x wavelengths) arrays 'count', 'sum', 'sumsq', 'passing',
+             (blocks,) arrays 'inside' and 'all_pass', and 'outside', the number of
+             samples outside the DOE range
+    """
+    if n_samples % block_size:
+        raise ValueError(f"n_samples ({n_samples}) must be a multiple of block_size ({block_size})")
+    rng = np.random.default_rng(seed)
+    chunk_size = max(block_size, chunk_size - chunk_size % block_size)
+    stats = {key: [] for key in ("count", "sum", "sumsq", "passing", "inside", "all_pass")}
+    outside = 0
+
+    for start in range(0, n_samples, chunk_size):
+        n = min(chunk_size, n_samples - start)
+        T = surface(sample_thickness(rng, n, **sample_kwargs))
+        inside = np.all(np.isfinite(T), axis=1)
+        outside += int((~inside).sum())
+
+        blocks = T.reshape(-1, block_size, n_wavelengths)
+        valid = np.isfinite(blocks)
+        filled = np.where(valid, blocks, 0.0)
+        stats["count"].append(valid.sum(axis=1))
+        stats["sum"].append(filled.sum(axis=1))
+        stats["sumsq"].append((filled ** 2).sum(axis=1))
+        stats["passing"].append((valid & (blocks >= lsl)).sum(axis=1))
+        stats["inside"].append(inside.reshape(-1, block_size).sum(axis=1))
+        stats["all_pass"].append((inside & np.all(T >= lsl, axis=1)).reshape(-1, block_size).sum(axis=1))
+
+    result = {key: np.concatenate(value) for key, value in stats.items()}
+    result["outside"] = outside
+    return result
+
+
+# --- 4. CAPABILITY WITH BOOTSTRAP CONFIDENCE INTERVALS ---
+def _capability(count, total, total_sq, passing, lsl):
+    mean = total / count
+    std = np.sqrt(np.maximum(total_sq / count - mean ** 2, 0.0) * count / np.maximum(count - 1, 1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cpk = (mean - lsl) / (3 * std)
+    return mean, std, passing / count, cpk
+
+
+def summarize(stats, wavelengths, lsl=LSL, n_bootstrap=N_BOOTSTRAP, confidence=CONFIDENCE, seed=SEED):
+    """
+    Yield and Cpk per wavelength plus the joint yield over all wavelengths.
+    Confidence intervals come from a block bootstrap: the equal-sized sample blocks are
+    independent, so resampling their sums is equivalent to resampling the samples and
+    costs (bootstrap x blocks) instead of (bootstrap x samples).
+    """
+    rng = np.random.default_rng(seed + 1)
+    n_blocks = len(stats["count"])
+    picks = rng.integers(0, n_blocks, size=(n_bootstrap, n_blocks))
+    weights = np.stack([np.bincount(row, minlength=n_blocks) for row in picks]).astype(float)
+
+    alpha = (1 - confidence) / 2
+    rows = []
+    totals = {key: stats[key].sum(axis=0) for key in ("count", "sum", "sumsq", "passing")}
+    boot = {key: weights @ stats[key] for key in ("count", "sum", "sumsq", "passing")}
+    mean, std, yld, cpk = _capability(totals["count"], totals["sum"], totals["sumsq"], totals["passing"], lsl)
+    _, _, b_yld, b_cpk = _capability(boot["count"], boot["sum"], boot["sumsq"], boot["passing"], lsl)
+
+    for i, wl in enumerate(wavelengths):
+        rows.append({"Target Wavelength": wl, "Samples": int(totals["count"][i]),
+                     "Mean T (%)": mean[i], "Std T (%)": std[i],
+                     "Yield (%)": 100 * yld[i],
+                     "Yield CI Low (%)": 100 * np.quantile(b_yld[:, i], alpha),
+                     "Yield CI High (%)": 100 * np.quantile(b_yld[:, i], 1 - alpha),
+                     "Cpk": cpk[i],
+                     "Cpk CI Low": np.quantile(b_cpk[:, i], alpha),
+                     "Cpk CI High": np.quantile(b_cpk[:, i], 1 - alpha)})
+
+    n_inside = stats["inside"].sum()
+    joint = stats["all_pass"].sum() / max(n_inside, 1)
+    b_joint = (weights @ stats["all_pass"]) / np.maximum(weights @ stats["inside"], 1)
+    rows.append({"Target Wavelength": "all", "Samples": int(n_inside),
+                 "Yield (%)": 100 * joint,
+                 "Yield CI Low (%)": 100 * np.quantile(b_joint, alpha),
+                 "Yield CI High (%)": 100 * np.quantile(b_joint, 1 - alpha)})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    # --- 5. RUN ---
+    wavelengths, surface = load_doe_surface(SUMMARY_FILE)
+
+    start = time.perf_counter()
+    stats = run_monte_carlo(surface, len(wavelengths))
+    report = summarize(stats, wavelengths)
+    elapsed = time.perf_counter() - start
+
+    out_dir = os.path.dirname(OUTPUT_FILE)
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    report.to_excel(OUTPUT_FILE, index=False)
+
+    print("\n" + "="*40)
+    print(f"MONTE CARLO YIELD ({N_SAMPLES:,} samples in {elapsed:.1f} s, LSL = {LSL}%)")
+    print(f"Nominal: SiN_T = {NOMINAL['SiN_T']} A, SiN_B = {NOMINAL['SiN_B']} A, tolerances: {TOLERANCES}")
+    if stats["outside"]:
+        print(f"  [!] {stats['outside']:,} samples fell outside the simulated DOE range and were left out")
+    print(report.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print(f"Results saved to: {OUTPUT_FILE}")
+    print("="*40)
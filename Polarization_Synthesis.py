@@ -0,0 +1,101 @@
+import tidy3d as td
+import numpy as np
+
+# --- 1. CONFIGURATION ---
+# Jones vectors (E_x, E_y) of the incident beam; any elliptical polarization is
+# (a_x, a_y * exp(1j * phase))
+JONES = {"x": (1, 0), "y": (0, 1), "circular": (1, 1j), "diagonal": (1, 1)}
+
+# Task name suffix of the y-polarized run of a design, e.g. 'Run_3_T750_B1200_Ey'
+Y_RUN_SUFFIX = "_Ey"
+
+# How a circular campaign was run (the job script's POLARIZATION_MODE): incident beams per
+# task (1 W each) and the cloud folder, so results of the two modes are never mixed
+MODE_BEAMS = {"synthesize": 1, "dual_source": 2}
+MODE_FOLDERS = {"synthesize": "Circular_polar_synth_v1", "dual_source": "Circular_polar_v2"}
+
+
+# --- 2. WHICH RUNS ARE NEEDED ---
+def needs_y_run(template):
+    """
+    False when the y-polarized run is just the x-polarized run turned by 90 degrees, so
+    T_y = T_x and R_y = R_x: a square domain, square isotropic layers and everything
+    centered on x = y = 0 (the template has mirror symmetry, see Stack_Template.auto_symmetry).
+    :param template: x-polarized template from Stack_Template.stack_template
+    """
+    sim = template["base"]
+    if tuple(template["symmetry"][:2]) == (0, 0) or sim.size[0] != sim.size[1]:
+        return True
+    for structure in sim.structures:
+        size = structure.geometry.size
+        if size[0] != size[1] or type(structure.medium) is not td.Medium:
+            return True
+    return False
+
+
+# --- 3. LINEARITY ---
+def power_weights(jones):
+    """ (w_x, w_y): fractions of the incident power carried by E_x and E_y. """
+    a_x, a_y = JONES[jones] if isinstance(jones, str) else jones
+    p_x, p_y = abs(a_x) ** 2, abs(a_y) ** 2
+    return p_x / (p_x + p_y), p_y / (p_x + p_y)
+
+
+def synthesize(flux_x, flux_y=None, jones="circular"):
+    """
+    T or R of any polarization from the x- and y-polarized runs of one design, each
+    normalized to its own 1 W source. With mirror planes at x = 0 and y = 0 the fields of
+    the two runs have opposite parity, so their cross terms integrate to zero over the flux
+    monitor; the phase between E_x and E_y drops out and T = w_x T_x + w_y T_y.
+    :param flux_y: y-polarized result, or None when needs_y_run is False (T_y = T_x)
+    :param jones: Key of JONES or an (E_x, E_y) tuple
+    """
+    flux_x = np.asarray(flux_x, dtype=float)
+    flux_y = flux_x if flux_y is None else np.asarray(flux_y, dtype=float)
+    w_x, w_y = power_weights(jones)
+    return w_x * flux_x + w_y * flux_y
+
+
+def combine_runs(task_names, values, jones="circular"):
+    """
+    Synthesizes every design of a campaign that was run in both polarizations.
+    :param task_names: Task name per row of values
+    :param values: (tasks x ...) array, e.g. T or R spectra
+    :return: (names of the x-polarized runs, synthesized values in the same order); designs
+             without a y-polarized run are taken to have T_y = T_x
+    """
+    names = [str(name) for name in task_names]
+    row = {name: i for i, name in enumerate(names)}
+    x_rows = [i for i, name in enumerate(names) if not name.endswith(Y_RUN_SUFFIX)]
+    values = np.asarray(values, dtype=float)
+    out = np.empty((len(x_rows),) + values.shape[1:])
+    for k, i in enumerate(x_rows):
+        j = row.get(names[i] + Y_RUN_SUFFIX)
+        out[k] = synthesize(values[i], None if j is None else values[j], jones)
+    return [names[i] for i in x_rows], out
+
+
+def circular_spectra(spectra, name_mapping, mode, jones="circular"):
+    """
+    T and R per design as fractions of the total incident power, from the spectra store
+    (Build_Spectra_Store.update_spectra_store) of a campaign run in the given POLARIZATION_MODE.
+    dual_source: |flux| divided by the MODE_BEAMS sources. synthesize: the x- and y-polarized
+    runs of each design merged by combine_runs, on the frequency axis of the x-polarized run.
+    :param name_mapping: {Task ID: Task Name}, e.g. from Task_Registry.campaign_tasks
+    :return: Dict like spectra, one row per design (the y-polarized runs are dropped)
+    """
+    if mode not in MODE_BEAMS:
+        raise ValueError(f"unknown polarization mode '{mode}', expected one of {list(MODE_BEAMS)}")
+    T, R = np.abs(spectra["T"]) / MODE_BEAMS[mode], np.abs(spectra["R"]) / MODE_BEAMS[mode]
+    out = dict(spectra, T=T, R=R)
+    if mode == "synthesize" and len(spectra["task_id"]):
+        names = [str(name_mapping.get(tid, tid)) for tid in spectra["task_id"]]
+        x_rows = [i for i, name in enumerate(names) if not name.endswith(Y_RUN_SUFFIX)]
+        _, out["T"] = combine_runs(names, T, jones)
+        _, out["R"] = combine_runs(names, R, jones)
+        # Every per-task array (names, frequencies, manifest columns, ...) keeps the x rows
+        n_tasks = len(spectra["task_id"])
+        for key, value in spectra.items():
+            if key not in ("T", "R") and isinstance(value, np.ndarray) and value.shape[:1] == (n_tasks,):
+                out[key] = value[x_rows]
+    return out
@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# --- 1. CONFIGURATION ---
+MAX_WORKERS = 4          # Processes validating designs in parallel
+CHUNK_SIZE = 16          # Designs per worker task
+
+# A design is flagged when its cell count x time steps (or output size) is this many times
+# above or below the campaign median; in a thickness DOE they should all be close
+OUTLIER_FACTOR = 2.0
+
+# FlexCredits are estimated from the cell count x time steps, which the solver cost scales
+# with; calibrate_cost uploads the median design once to get the cloud's own estimate
+CALIBRATION_TASK_PREFIX = "preflight_calibration"
+
+# The last calibrated rate is kept here and used for every later pre-flight; until the first
+# calibration the cost is reported as unknown, with the cell x time steps it scales with
+COST_RATE_FILE = r"C:\Users\ssatter\Documents\Midnight\preflight_cost_rate.json"
+
+
+# --- 2. PER-DESIGN CHECKS ---
+def check_simulation(name, sim):
+    """
+    Runs tidy3d's full validation and the pre-upload checks (grid and monitor data size
+    limits) on one design and reads its grid and time stepping.
+    :return: dict with 'Task Name', 'Valid', 'Error', 'Cells', 'Time Steps', 'Cell Steps', 'Data MB'
+    """
+    row = {"Task Name": name, "Valid": False, "Error": None, "Cells": np.nan,
+           "Time Steps": np.nan, "Cell Steps": np.nan, "Data MB": np.nan}
+    try:
+        # Designs derived from a template skip validation when they are built
+        sim = sim.copy()
+        sim.validate_pre_upload()
+        # Grid points actually stepped, i.e. after symmetry planes; older tidy3d has only num_cells
+        row["Cells"] = int(getattr(sim, "num_computational_grid_points", sim.num_cells))
+        row["Time Steps"] = int(sim.num_time_steps)
+        row["Cell Steps"] = float(row["Cells"]) * row["Time Steps"]
+        row["Data MB"] = sum(sim.monitors_data_size.values()) / 1e6
+        row["Valid"] = True
+    except Exception as e:
+        row["Error"] = f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"
+    return row
+
+
+def _check_chunk(items):
+    return [check_simulation(name, sim) for name, sim in items]
+
+
+# --- 3. CAMPAIGN PRE-FLIGHT ---
+def load_cost_rate(rate_file=COST_RATE_FILE):
+    """
+    FlexCredits per cell step from the last calibration.
+    :return: (rate, basis), basis describing where the rate comes from; rate is None before
+             the first calibration
+    """
+    if os.path.exists(rate_file):
+        try:
+            with open(rate_file, "r") as fh:
+                stored = json.load(fh)
+            return float(stored["credits_per_cell_step"]), f"rate calibrated {stored.get('calibrated', '')}".strip()
+        except (ValueError, KeyError, TypeError):
+            print(f"  [!] {rate_file} is unreadable, cost not estimated")
+    return None, "not calibrated"
+
+
+def save_cost_rate(credits_per_cell_step, rate_file=COST_RATE_FILE):
+    folder = os.path.dirname(rate_file)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    with open(rate_file, "w") as fh:
+        json.dump({"credits_per_cell_step": credits_per_cell_step,
+                   "calibrated": time.strftime("%Y-%m-%d %H:%M:%S")}, fh, indent=2)
+
+
+def calibrate_cost(web_api, sims, folder_name, report, rate_file=COST_RATE_FILE):
+    """
+    Uploads the design with the median cell count x time steps, asks the cloud for its
+    cost estimate and deletes it again. The rate is stored in rate_file for later pre-flights.
+    :param report: DataFrame from preflight
+    :return: FlexCredits per cell step, or None if there is no valid design or the estimate failed
+    """
+    valid = report[report["Valid"]]
+    if valid.empty:
+        return None
+    pick = (valid["Cell Steps"] - valid["Cell Steps"].median()).abs().idxmin()
+    name, cell_steps = valid.at[pick, "Task Name"], valid.at[pick, "Cell Steps"]
+
+    task_id = None
+    try:
+        task_id = web_api.upload(sims[name], task_name=f"{CALIBRATION_TASK_PREFIX}_{name}",
+                                 folder_name=folder_name, verbose=False)
+        credits = float(web_api.estimate_cost(task_id, verbose=False) or 0.0)
+        print(f"Cost calibration: {name} is estimated at {credits:.4f} FlexCredits")
+        rate = credits / cell_steps
+        save_cost_rate(rate, rate_file)
+        return rate
+    except Exception as e:
+        print(f"  [!] Cost calibration failed: {type(e).__name__}: {e}")
+        return None
+    finally:
+        if task_id is not None:
+            try:
+                web_api.delete(task_id)
+            except Exception as e:
+                print(f"  [!] Could not delete calibration task {task_id}: {e}")
+
+
+def estimate_credits(report, credits_per_cell_step, basis="rate calibrated now"):
+    """
+    Fills 'Est. Credits' in a preflight report from a FlexCredits per cell step rate (e.g.
+    calibrate_cost's). Without a rate the report is left as it is.
+    """
+    if credits_per_cell_step:
+        report["Est. Credits"] = report["Cell Steps"] * credits_per_cell_step
+        report["Cost Basis"] = basis
+    return report
+
+
+def preflight(sims, max_workers=MAX_WORKERS, chunk_size=CHUNK_SIZE, outlier_factor=OUTLIER_FACTOR,
+              rate_file=COST_RATE_FILE):
+    """
+    Checks every design of a batch before anything is uploaded. Call under __main__ when
+    max_workers > 1 (worker processes).
+    :param sims: dict task name -> td.Simulation, as passed to web.Batch
+    :return: DataFrame with one row per design; 'Est. Credits' comes from the stored rate
+             (load_cost_rate) and is empty before the first calibration, 'Cost Basis' says which
+    """
+    items = list(sims.items())
+    if max_workers <= 1 or len(items) <= chunk_size:
+        rows = _check_chunk(items)
+    else:
+        chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            rows = [row for chunk in pool.map(_check_chunk, chunks) for row in chunk]
+
+    df = pd.DataFrame(rows, columns=["Task Name", "Valid", "Error", "Cells", "Time Steps",
+                                     "Cell Steps", "Data MB"])
+    rate, basis = load_cost_rate(rate_file)
+    df["Est. Credits"], df["Cost Basis"] = np.nan, basis
+    estimate_credits(df, rate, basis)
+
+    df["Outlier"] = ""
+    for column in ("Cell Steps", "Data MB"):
+        median = df.loc[df["Valid"], column].median()
+        if not median > 0:
+            continue
+        ratio = df[column] / median
+        far = df["Valid"] & ((ratio > outlier_factor) | (ratio < 1 / outlier_factor))
+        df.loc[far, "Outlier"] += f"{column} x" + ratio[far].round(2).astype(str) + " "
+    df["Outlier"] = df["Outlier"].str.strip()
+    return df
+
+
+def print_preflight(df):
+    """ Campaign totals, invalid designs and outliers. """
+    valid = df[df["Valid"]]
+    print("\n" + "="*40)
+    print(f"PRE-FLIGHT: {len(valid)} of {len(df)} designs valid")
+    if len(valid):
+        print(f"Cells per design:      {valid['Cells'].min():,.0f} to {valid['Cells'].max():,.0f}")
+        print(f"Time steps per design: {valid['Time Steps'].min():,.0f} to {valid['Time Steps'].max():,.0f}")
+        print(f"Monitor data:          {valid['Data MB'].sum():,.2f} MB in total")
+        print(f"Cell x time steps:     {valid['Cell Steps'].sum():.3e} in total")
+        if valid["Est. Credits"].notna().any():
+            basis = valid["Cost Basis"].iloc[0]
+            print(f"Estimated cost:        {valid['Est. Credits'].sum():,.2f} FlexCredits in total "
+                  f"({valid['Est. Credits'].median():.4f} per design, {basis})")
+        else:
+            print("Estimated cost:        unknown, not calibrated; it scales with the cell x time steps above")
+            print("                       (set CALIBRATE_COST = True once for the cloud's own estimate)")
+    for _, row in df[~df["Valid"]].iterrows():
+        print(f"  [!] {row['Task Name']}: {row['Error']}")
+    outliers = df[df["Outlier"] != ""]
+    for _, row in outliers.head(20).iterrows():
+        print(f"  [?] {row['Task Name']}: {row['Outlier']} the median")
+    if len(outliers) > 20:
+        print(f"  ... and {len(outliers) - 20} more outliers")
+    print("="*40)
@@ -1,6 +1,6 @@
 import pandas as pd
 import numpy as np
-import re
+from Task_Registry import parse_thickness
 
 def run_sigma_analysis(file_path, wavelength=0.895, lsl=90.0):
     """
@@ -15,12 +15,8 @@ def run_sigma_analysis(file_path, wavelength=0.895, lsl=90.0):
     else:
         df = pd.read_excel(file_path)
 
-    # 2. Extract Top and Bottom SiN from 'Run Name'
-    def parse_run(name):
-        match = re.search(r'_T(\d+)_B(\d+)', str(name))
-        return (int(match.group(1)), int(match.group(2))) if match else (None, None)
-
-    df[['Top_SiN', 'Bottom_SiN']] = df['Run Name'].apply(lambda x: pd.Series(parse_run(x)))
+    # 2. Extract Top and Bottom SiN from 'Run Name' (one vectorized parse of the column)
+    df[['Top_SiN', 'Bottom_SiN']] = parse_thickness(df['Run Name']).to_numpy()
 
     # 3. Filter for the target wavelength
     data_subset = df[df['Target Wavelength'] == wavelength].copy()
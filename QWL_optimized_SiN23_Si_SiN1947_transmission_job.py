@@ -4,16 +4,34 @@ import numpy as np
 import pandas as pd
 import os
 import matplotlib.pyplot as plt
+from Batch_Scheduler import run_doe_scheduled, nominal_first_priority
+from Simulation_Cache import (load_index, save_index, partition_simulations, save_reused,
+                              record_batch, record_task, simulation_hash)
+from Stack_Template import stack_template, build_stack, build_stacks, face_template
+from Preflight import preflight, calibrate_cost, estimate_credits, print_preflight
+from Substrate_Recombination import face_simulations
 
 # --- CONFIGURATION ---
 RUN_ALL = True 
 DATA_DIR = "data"
 
+# Scheduled submission: at most MAX_IN_FLIGHT tasks in the cloud, nominal designs first,
+# and no new submissions once CREDIT_BUDGET (FlexCredits) would be exceeded
+USE_SCHEDULER = False
+MAX_IN_FLIGHT = 20
+CREDIT_BUDGET = 50.0
+
+# Pre-flight: validate all designs in parallel and report grid size, time steps, data
+# size and outliers before submitting; CALIBRATE_COST uploads one design for a cost estimate
+PREFLIGHT = True
+PREFLIGHT_ONLY = False
+CALIBRATE_COST = False
+
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
 # --- 1. LOAD DOE FROM EXCEL ---
-doe_df = pd.read_excel(r"C:\Users\ssatter\Documents\Midnight\QWL_optimized_SiN_thickness_DOE.xlsx")
+DOE_FILE = r"C:\Users\ssatter\Documents\Midnight\QWL_optimized_SiN_thickness_DOE.xlsx"
 TO_UM = 1e-4 
 
 # --- 2. PARAMETERS & PHYSICS SETUP ---
@@ -26,106 +44,109 @@ STRUCTURE_WIDTH = 5.0
 DOMAIN_WIDTH = 8.0      
 
 lambdas_23 = np.linspace(0.79, 0.9, 23)
-freqs_23 = td.C_0 / lambdas_23
 lambdas_20 = np.linspace(0.79, 0.9, 20)
-freqs_20 = td.C_0 / lambdas_20
-
-freq0 = np.mean(freqs_23)
-fwidth = (np.max(freqs_23) - np.min(freqs_23)) / 2.0
 
 # --- 3. SIMULATION CONSTRUCTOR ---
+# Media, sources, monitors, boundary and grid specs are built and validated once; each DOE
+# row only moves the layers, source, reflection monitor and domain (see Stack_Template.py)
+BUILD_WORKERS = 1          # Processes for building variants; only worth it with VALIDATE_VARIANTS
+VALIDATE_VARIANTS = False  # Full tidy3d validation of every variant (the extremes always are)
+RUN_TIME_POLICY = "decay"  # Pulse + transit + Si slab ring-down to SHUTOFF; "transit" is the old 5x rule
+SHUTOFF = 1e-5             # Stop time stepping once the field energy is this far below its peak
+
+TEMPLATE = stack_template(N_SIN_TOP, N_SIN_BOT, polarization="linear", wavelengths=lambdas_23,
+                          norm_wavelengths=lambdas_20, n_si=N_SI, si_thickness=SI_THICKNESS,
+                          waist_radius=WAIST_RADIUS, structure_width=STRUCTURE_WIDTH,
+                          domain_width=DOMAIN_WIDTH, run_time_policy=RUN_TIME_POLICY, shutoff=SHUTOFF)
+
+# "slab": the whole SiN/Si/SiN stack per design. "semi_infinite": each SiN face on its own on
+# semi-infinite Si, far smaller and shorter runs, and only N + M of them for an N x M grid;
+# Substrate_Recombination.py adds the Si slab back by intensity afterwards (the Si thickness
+# fringes averaged out, as for a real wafer). A test run (RUN_ALL = False) runs the first face.
+SUBSTRATE = "slab"
+if SUBSTRATE == "semi_infinite":
+    FACE_KWARGS = dict(polarization="linear", wavelengths=lambdas_23, norm_wavelengths=lambdas_20, n_si=N_SI,
+                       waist_radius=WAIST_RADIUS, structure_width=STRUCTURE_WIDTH, domain_width=DOMAIN_WIDTH,
+                       run_time_policy=RUN_TIME_POLICY, shutoff=SHUTOFF)
+    FACE_TOP, FACE_BOT = face_template(N_SIN_TOP, **FACE_KWARGS), face_template(N_SIN_BOT, **FACE_KWARGS)
+
+
 def make_doe_sim(t_top_um, t_bot_um):
-    mat_si = td.Medium(permittivity=N_SI**2)
-    mat_sin_top = td.Medium(permittivity=N_SIN_TOP**2)
-    mat_sin_bot = td.Medium(permittivity=N_SIN_BOT**2)
-    
-    stack_bottom_z = 0.0
-    
-    sin_bot = td.Structure(
-        geometry=td.Box(size=(STRUCTURE_WIDTH, STRUCTURE_WIDTH, t_bot_um), 
-                        center=(0, 0, t_bot_um / 2)),
-        medium=mat_sin_bot, name="SiN Bottom"
-    )
-
-    si_base = td.Structure(
-        geometry=td.Box(size=(STRUCTURE_WIDTH, STRUCTURE_WIDTH, SI_THICKNESS), 
-                        center=(0, 0, t_bot_um + SI_THICKNESS / 2)),
-        medium=mat_si, name="Si Substrate"
-    )
-    
-    z_top_layer_bot = t_bot_um + SI_THICKNESS
-    sin_top = td.Structure(
-        geometry=td.Box(size=(STRUCTURE_WIDTH, STRUCTURE_WIDTH, t_top_um), 
-                        center=(0, 0, z_top_layer_bot + t_top_um / 2)),
-        medium=mat_sin_top, name="SiN Top"
-    )
-
-    top_of_stack = z_top_layer_bot + t_top_um
-    source_z = top_of_stack + 1.5
-    refl_monitor_z = source_z + 0.5 
-
-    pulse = td.GaussianPulse(freq0=freq0, fwidth=fwidth)
-    gaussian_beam = td.GaussianBeam(
-        center=(0, 0, source_z), size=(STRUCTURE_WIDTH, STRUCTURE_WIDTH, 0),
-        source_time=pulse, direction="-", waist_radius=WAIST_RADIUS,
-        waist_distance=0, pol_angle=0
-    )
-
-    total_z_span = refl_monitor_z + 1.0
-    run_time = (total_z_span * N_SI / td.C_0) * 5 
-    bspec = td.BoundarySpec(x=td.Boundary.periodic(), y=td.Boundary.periodic(), z=td.Boundary.pml())
-
-    t_monitor = td.FluxMonitor(center=(0, 0, stack_bottom_z), size=(STRUCTURE_WIDTH, STRUCTURE_WIDTH, 0), freqs=freqs_23, name="T")
-    r_monitor = td.FluxMonitor(center=(0, 0, refl_monitor_z), size=(STRUCTURE_WIDTH, STRUCTURE_WIDTH, 0), freqs=freqs_23, name="R")
-    source_monitor = td.FieldMonitor(center=(0, 0, source_z), size=(0, 0, 0), freqs=freqs_20, name="Source_Normalization")
-
-    z_min, z_max = -1.0, refl_monitor_z + 1.0
-    
-    return td.Simulation(
-        size=(DOMAIN_WIDTH, DOMAIN_WIDTH, z_max - z_min),
-        center=(0, 0, (z_max + z_min) / 2),
-        boundary_spec=bspec,
-        grid_spec=td.GridSpec.auto(wavelength=np.max(lambdas_23)),
-        structures=[sin_bot, si_base, sin_top],
-        sources=[gaussian_beam],
-        monitors=[t_monitor, r_monitor, source_monitor],
-        run_time=run_time
-    )
-
-# --- 4. PREPARE TASKS ---
-folder_name = "ARC_SiN_Multi_Index_DOE"
-sims = {}
-process_df = doe_df if RUN_ALL else doe_df.head(1)
-
-for idx, row in process_df.iterrows():
-    t_top = row['SiN_T'] * TO_UM
-    t_bot = row['SiN_B'] * TO_UM
-    sim = make_doe_sim(t_top, t_bot)
-    task_name = f"Run_{idx}_T{int(row['SiN_T'])}_B{int(row['SiN_B'])}"
-    sims[task_name] = sim
-
-# --- 5. SUBMISSION ---
-if RUN_ALL:
-    batch = web.Batch(simulations=sims, folder_name=folder_name)
-    # Batch still uses path_dir to download all results at once
-    batch_results = batch.run(path_dir=DATA_DIR) 
-    print("\nBatch processing complete.")
-else:
-    test_name = list(sims.keys())[0]
-    test_sim = sims[test_name]
+    return build_stack(TEMPLATE, t_top_um, t_bot_um, validate=VALIDATE_VARIANTS)
+
+
+if __name__ == "__main__":
+    # --- 4. PREPARE TASKS ---
+    folder_name = "ARC_SiN_Multi_Index_DOE"
+    doe_df = pd.read_excel(DOE_FILE)
+    process_df = doe_df if RUN_ALL else doe_df.head(1)
+
+    task_names = [f"Run_{idx}_T{int(row['SiN_T'])}_B{int(row['SiN_B'])}" for idx, row in process_df.iterrows()]
+    thickness_um = zip(process_df['SiN_T'] * TO_UM, process_df['SiN_B'] * TO_UM)
+    if SUBSTRATE == "semi_infinite":
+        folder_name += "_faces"
+        sims = face_simulations(FACE_TOP, FACE_BOT, zip(process_df['SiN_T'], process_df['SiN_B']),
+                                to_um=TO_UM, validate=VALIDATE_VARIANTS)
+    else:
+        sims = dict(zip(task_names, build_stacks(TEMPLATE, thickness_um, max_workers=BUILD_WORKERS,
+                                                 validate=VALIDATE_VARIANTS)))
+
+    # --- 5. SUBMISSION ---
+    # Skip designs already solved in an earlier campaign (see Simulation_Cache.py)
+    sim_index = load_index()
+    if RUN_ALL:
+        sims, reused_df = partition_simulations(sims, sim_index)
+        if not reused_df.empty:
+            reused_path = save_reused(reused_df, folder_name, DATA_DIR)
+            print(f"Reusing {len(reused_df)} existing results (listed in {reused_path})")
+
+    # Validate every new design and estimate the campaign before anything is uploaded
+    if RUN_ALL and sims and PREFLIGHT:
+        preflight_df = preflight(sims)
+        if CALIBRATE_COST:
+            estimate_credits(preflight_df, calibrate_cost(web, sims, folder_name, preflight_df))
+        preflight_path = os.path.join(DATA_DIR, f"{folder_name}_preflight.xlsx")
+        preflight_df.to_excel(preflight_path, index=False)
+        print_preflight(preflight_df)
+        print(f"Pre-flight report saved to: {preflight_path}")
+        if not preflight_df["Valid"].all():
+            print("Nothing submitted: fix or remove the invalid designs first.")
+            sims = {}
+        elif PREFLIGHT_ONLY:
+            print("PREFLIGHT_ONLY is set, nothing submitted.")
+            sims = {}
+
+    if RUN_ALL and sims and USE_SCHEDULER:
+        run_doe_scheduled(sims, folder_name, DATA_DIR, web, sim_index,
+                          priority=nominal_first_priority(sims),
+                          max_in_flight=MAX_IN_FLIGHT, budget=CREDIT_BUDGET)
+        save_index(sim_index)
+        print("\nScheduled processing complete.")
+    elif RUN_ALL and sims:
+        batch = web.Batch(simulations=sims, folder_name=folder_name)
+        # Batch still uses path_dir to download all results at once
+        batch_results = batch.run(path_dir=DATA_DIR) 
+        record_batch(sim_index, sims, batch, folder_name, path_dir=DATA_DIR)
+        save_index(sim_index)
+        print("\nBatch processing complete.")
+    elif not RUN_ALL:
+        test_name = list(sims.keys())[0]
+        test_sim = sims[test_name]
     
-    print(f"Plotting geometry for: {test_name}...")
-    fig, ax = plt.subplots(1, 1, figsize=(6, 8))
-    test_sim.plot(y=0, ax=ax)
-    plt.show() # Inspect the layers here!
+        print(f"Plotting geometry for: {test_name}...")
+        fig, ax = plt.subplots(1, 1, figsize=(6, 8))
+        test_sim.plot(y=0, ax=ax)
+        plt.show() # Inspect the layers here!
 
-    print(f"Running single test simulation: {test_name}...")
-    job = web.Job(simulation=test_sim, task_name=test_name, folder_name=folder_name)
+        print(f"Running single test simulation: {test_name}...")
+        job = web.Job(simulation=test_sim, task_name=test_name, folder_name=folder_name)
     
-    # job.run() for a single Job takes no arguments in many Tidy3D versions
-    sim_data = job.run() 
+        # job.run() for a single Job takes no arguments in many Tidy3D versions
+        sim_data = job.run() 
     
-    # Explicitly save the data to your local folder
-    output_path = os.path.join(DATA_DIR, f"{test_name}.hdf5")
-    sim_data.to_hdf5(output_path)
-    print(f"\nTest task '{test_name}' completed and saved to {output_path}.")
\ No newline at end of file
+        # Explicitly save the data to your local folder
+        output_path = os.path.join(DATA_DIR, f"{test_name}.hdf5")
+        sim_data.to_hdf5(output_path)
+        record_task(sim_index, simulation_hash(test_sim), job.task_id, test_name, folder_name, output_path)
+        save_index(sim_index)
+        print(f"\nTest task '{test_name}' completed and saved to {output_path}.")
\ No newline at end of file
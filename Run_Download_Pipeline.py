@@ -0,0 +1,208 @@
+import pandas as pd
+import os
+import time
+import asyncio
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from Batch_Scheduler import task_status, TERMINAL_STATUSES
+from Download_Tasks_from_Tidy3d import download_one, load_journal, save_journal, is_complete
+from Build_Spectra_Store import update_spectra_store, task_metadata_from_frame
+from List_TaskIDs import task_row, COLUMNS
+from Task_Registry import REGISTRY_FILE, connect, reused_tasks
+
+# --- 1. CONFIGURATION ---
+# Watch a folder that is still running and pull every task in as soon as it finishes
+FOLDER_NAME = "Circular_polar_v2"
+DOWNLOAD_DIR = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_Circular_polar_tasks"
+OUTPUT_FILE = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_Circular_polar.xlsx"
+
+# Status polling, one folder listing per poll: every POLL_MIN seconds after a task finished,
+# growing by POLL_GROWTH up to POLL_MAX while none does
+POLL_MIN = 5.0
+POLL_MAX = 120.0
+POLL_GROWTH = 1.5
+
+MAX_DOWNLOADS = 8        # Simultaneous downloads
+INGEST_DELAY = 30.0      # Seconds to collect finished downloads before updating the spectra store
+
+
+# --- 2. PIPELINE STAGES ---
+def folder_statuses(web_api, folder_name, task_ids):
+    """
+    Lower-case status of each of task_ids from a single listing of the folder; tasks that
+    are not in it (reused from an earlier campaign) are asked for one by one.
+    :return: dict of task ID -> status for the tasks whose status could be read
+    """
+    statuses = {row["Task ID"]: str(row["Status"]).lower()
+                for row in map(task_row, web_api.get_tasks(folder=folder_name) or [])}
+    for task_id in set(task_ids) - set(statuses):
+        try:
+            statuses[task_id] = task_status(web_api, task_id)
+        except Exception as e:
+            print(f"  [!] Status of {task_id} unavailable: {e}")
+    return {task_id: statuses[task_id] for task_id in task_ids if task_id in statuses}
+
+
+async def watch_folder(folder_name, task_ids, web_api, finished, poll_min=POLL_MIN, poll_max=POLL_MAX,
+                       poll_growth=POLL_GROWTH):
+    """
+    Polls the whole folder with one status listing per interval and puts (task_id, status)
+    on the finished queue as each watched task reaches a terminal status. The delay grows
+    while nothing finishes and drops back to poll_min when something does. A failed
+    listing counts as a poll. The listing runs in the loop's default executor, so it never
+    waits for a download thread.
+    """
+    loop = asyncio.get_running_loop()
+    waiting, delay = set(task_ids), poll_min
+    while waiting:
+        try:
+            statuses = await loop.run_in_executor(None, folder_statuses, web_api, folder_name, waiting)
+        except Exception as e:
+            print(f"  [!] Status of folder '{folder_name}' unavailable: {e}")
+            statuses = {}
+        done = {task_id: status for task_id, status in statuses.items()
+                if status in TERMINAL_STATUSES or "error" in status}
+        for task_id, status in done.items():
+            waiting.discard(task_id)
+            await finished.put((task_id, status))
+        if waiting:
+            await asyncio.sleep(delay)
+            delay = poll_min if done else min(poll_max, delay * poll_growth)
+
+
+async def download_worker(web_api, download_dir, pool, finished, journal, downloaded, report):
+    """ Downloads every successful task from the finished queue as soon as it arrives. """
+    loop = asyncio.get_running_loop()
+    while True:
+        task_id, status = await finished.get()
+        try:
+            if status != "success":
+                report[task_id] = status
+                continue
+            _, size, error, attempts = await loop.run_in_executor(
+                pool, download_one, task_id, download_dir, web_api.download)
+            if error is None:
+                journal["completed"][task_id] = size
+                journal["failed"].pop(task_id, None)
+                report[task_id] = "downloaded"
+                print(f"Downloaded {task_id} ({size / 1e6:.2f} MB, attempt {attempts})")
+                downloaded.set()
+            else:
+                journal["failed"][task_id] = {"error": error, "attempts": attempts}
+                report[task_id] = "download_failed"
+                print(f"Failed to download {task_id} after {attempts} attempts: {error}")
+            save_journal(download_dir, journal)
+        finally:
+            finished.task_done()
+
+
+async def ingest_worker(download_dir, metadata, pool, downloaded, stop, ingest_delay=INGEST_DELAY):
+    """
+    Updates the spectra store whenever new files arrived, at most once per ingest_delay.
+    The store update is incremental (see Build_Spectra_Store.py), so each run only
+    reads the files downloaded since the last one. Returns after the update that
+    follows the stop event.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        await downloaded.wait()
+        try:
+            await asyncio.wait_for(stop.wait(), ingest_delay)
+        except asyncio.TimeoutError:
+            pass
+        downloaded.clear()
+        # The store update starts its own process pool, so it runs in a plain thread here
+        store = await loop.run_in_executor(pool, update_spectra_store, download_dir, None, metadata)
+        print(f"Spectra store now holds {len(store['task_id'])} tasks")
+        if stop.is_set() and not downloaded.is_set():
+            return
+
+
+async def run_pipeline(tasks, download_dir, web_api, folder_name, max_downloads=MAX_DOWNLOADS,
+                       ingest_delay=INGEST_DELAY, **poll_kwargs):
+    """
+    Watches every task, downloads each one the moment it succeeds and keeps the spectra
+    store up to date while the rest of the campaign is still computing.
+    :param tasks: DataFrame with 'Task ID' and 'Task Name' (as written by List_TaskIDs.py)
+    :param web_api: tidy3d.web, or a local stand-in with get_tasks/get_info/download
+    :param folder_name: Cloud folder of the tasks, polled with one listing per interval
+    :return: dict of task ID -> outcome ('downloaded', 'already_downloaded', 'download_failed'
+             or the terminal cloud status)
+    """
+    if not os.path.exists(download_dir):
+        os.makedirs(download_dir)
+
+    journal = load_journal(download_dir)
+    metadata = task_metadata_from_frame(tasks)
+    report, pending = {}, []
+    for task_id in metadata.index:
+        if is_complete(task_id, os.path.join(download_dir, f"{task_id}.hdf5"), journal):
+            report[task_id] = "already_downloaded"
+        else:
+            pending.append(task_id)
+    print(f"Watching {len(pending)} tasks ({len(report)} already downloaded)")
+
+    finished = asyncio.Queue()
+    downloaded = asyncio.Event()
+    stop = asyncio.Event()
+
+    # Downloads and the store update have this pool to themselves; the event loop only coordinates
+    with ThreadPoolExecutor(max_workers=max_downloads + 1) as pool:
+        workers = [asyncio.create_task(download_worker(web_api, download_dir, pool, finished,
+                                                       journal, downloaded, report))
+                   for _ in range(max_downloads)]
+        ingest = asyncio.create_task(ingest_worker(download_dir, metadata, pool, downloaded, stop, ingest_delay))
+
+        await watch_folder(folder_name, pending, web_api, finished, **poll_kwargs)
+        await finished.join()
+        for worker in workers:
+            worker.cancel()
+
+        # One last ingest so the store matches the folder when the pipeline returns
+        stop.set()
+        if any(outcome in ("downloaded", "already_downloaded") for outcome in report.values()):
+            downloaded.set()
+            await ingest
+        else:
+            ingest.cancel()
+            await asyncio.gather(ingest, return_exceptions=True)
+
+    save_journal(download_dir, journal)
+    return report
+
+
+def list_folder_tasks(web_api, folder_name, registry_file=REGISTRY_FILE):
+    """
+    Task listing of a cloud folder in the same format as List_TaskIDs.py, including the
+    designs the job reused from earlier campaigns (Task_Registry.reused_tasks).
+    """
+    tasks = web_api.get_tasks(folder=folder_name) or []
+    df = pd.DataFrame([task_row(t) for t in tasks], columns=COLUMNS)
+    with closing(connect(registry_file)) as con:
+        reused = reused_tasks(con, folder_name)
+    reused = reused[~reused["Task ID"].isin(df["Task ID"])]
+    return pd.concat([df, reused], ignore_index=True) if len(reused) else df
+
+
+if __name__ == "__main__":
+    import tidy3d.web as web
+
+    # --- 3. LIST, WATCH, DOWNLOAD AND INGEST ---
+    print(f"Connecting to Tidy3D folder: {FOLDER_NAME}...")
+    tasks = list_folder_tasks(web, FOLDER_NAME)
+    tasks.to_excel(OUTPUT_FILE, index=False)
+    print(f"Task list saved to {OUTPUT_FILE}")
+
+    start = time.perf_counter()
+    report = asyncio.run(run_pipeline(tasks, DOWNLOAD_DIR, web, FOLDER_NAME))
+    elapsed = time.perf_counter() - start
+
+    outcomes = pd.Series(report).value_counts()
+    print("\n" + "="*40)
+    print(f"PIPELINE COMPLETE in {elapsed / 60:.1f} min")
+    for outcome, count in outcomes.items():
+        print(f"{outcome}: {count}")
+    if outcomes.get("download_failed", 0):
+        print("Rerun this script to retry the failed downloads")
+    print(f"Files and spectra store are located in: {DOWNLOAD_DIR}")
+    print("="*40)
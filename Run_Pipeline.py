@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import hashlib
+import runpy
+import importlib
+from contextlib import closing
+from Build_Spectra_Store import update_spectra_store, load_task_metadata, STORE_NAME
+from Task_Registry import campaign_name, campaign_tasks, connect, register_files
+
+# --- 1. CONFIGURATION ---
+FOLDER_NAME = "ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200"
+TASK_LIST_FILE = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200.xlsx"
+CACHE_DIR = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_tasks"
+
+# Opt-in: rewrite every downloaded task file as a compressed flux-only archive
+# (Compact_Task_Files.py); the originals go to COLD_DIR, or are deleted when it is None
+COMPACT = False
+COLD_DIR = CACHE_DIR + "_originals"
+
+# Analysis scripts run as the last stages; each one uses its own CACHE_DIR/EXCEL_FILE/PLOT_DIR
+PLOT_SCRIPTS = [
+    "Wavelength_comparison.py",
+    "3D_surface_plot_Transmission_vs_thickness.py",
+]
+
+# Remembers the input fingerprint of every stage that finished
+STATE_FILE = "pipeline_state.json"
+
+# The cloud listing has no local inputs, so it only reruns when asked to
+REFRESH_TASK_LIST = False
+FORCE_STAGES = []        # e.g. ["extract"] to rerun a stage regardless of its fingerprint
+
+
+# --- 2. FINGERPRINTS ---
+def describe_path(path, pattern=None):
+    """
+    Cheap identity of a file or folder: size and mtime of the file, or of every file in
+    the folder whose name ends with pattern. Missing paths are described as missing.
+    """
+    if os.path.isfile(path):
+        st = os.stat(path)
+        return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if os.path.isdir(path):
+        entries = {}
+        for name in sorted(os.listdir(path)):
+            if pattern is None or name.endswith(pattern):
+                st = os.stat(os.path.join(path, name))
+                entries[name] = [st.st_size, st.st_mtime_ns]
+        return entries
+    return None
+
+
+def fingerprint(inputs):
+    text = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def load_state(state_file=STATE_FILE):
+    if os.path.exists(state_file):
+        with open(state_file, "r") as fh:
+            return json.load(fh)
+    return {}
+
+
+def save_state(state, state_file=STATE_FILE):
+    tmp_path = state_file + ".part"
+    with open(tmp_path, "w") as fh:
+        json.dump(state, fh, indent=2, sort_keys=True)
+    os.replace(tmp_path, state_file)
+
+
+# --- 3. STAGES ---
+def stage(name, inputs, outputs, run):
+    """
+    One pipeline step.
+    :param inputs: Callable returning a JSON-able description of everything the step reads;
+                   evaluated only when the stage is reached, after earlier stages ran
+    :param outputs: Paths the step writes; the stage reruns if any of them is missing
+    :param run: Callable doing the work
+    """
+    return {"name": name, "inputs": inputs, "outputs": outputs, "run": run}
+
+
+def list_stage(web_api):
+    def run():
+        from Run_Download_Pipeline import list_folder_tasks
+        tasks = list_folder_tasks(web_api, FOLDER_NAME)
+        tasks.to_excel(TASK_LIST_FILE, index=False)
+        print(f"Listed {len(tasks)} tasks in {FOLDER_NAME}")
+
+    refresh = time.time() if REFRESH_TASK_LIST else None
+    return stage("list", lambda: {"folder": FOLDER_NAME, "refresh": refresh}, [TASK_LIST_FILE], run)
+
+
+def download_stage(web_api):
+    def run():
+        from Download_Tasks_from_Tidy3d import download_tasks, journal_subset
+        task_ids = campaign_tasks(TASK_LIST_FILE).index.tolist()
+        journal = journal_subset(download_tasks(task_ids, CACHE_DIR, web_api.api.webapi.download), task_ids)
+        with closing(connect()) as con:
+            register_files(con, campaign_name(TASK_LIST_FILE), CACHE_DIR)
+        if journal["failed"]:
+            # Leave the stage unfinished so the next run retries the failures
+            raise RuntimeError(f"{len(journal['failed'])} downloads failed")
+
+    # The downloaded files are inputs too, so a deleted file is fetched again
+    return stage("download", lambda: {"task_list": describe_path(TASK_LIST_FILE),
+                                      "task_files": describe_path(CACHE_DIR, ".hdf5")},
+                 [CACHE_DIR], run)
+
+
+def compact_stage():
+    def run():
+        from Compact_Task_Files import compact_cache, print_compaction
+        report = compact_cache(CACHE_DIR, COLD_DIR)
+        print_compaction(report)
+        if (report["Status"] == "error").any():
+            raise RuntimeError(f"{int((report['Status'] == 'error').sum())} files could not be compacted")
+
+    return stage("compact", lambda: {"task_files": describe_path(CACHE_DIR, ".hdf5")}, [CACHE_DIR], run)
+
+
+def extract_stage():
+    def run():
+        from Spectra_Extraction import print_error_summary
+        store = update_spectra_store(CACHE_DIR, os.path.join(CACHE_DIR, STORE_NAME),
+                                     load_task_metadata(TASK_LIST_FILE))
+        print_error_summary(store["errors"], len(store["task_id"]) + len(store["errors"]))
+
+    return stage("extract", lambda: {"task_list": describe_path(TASK_LIST_FILE),
+                                     "task_files": describe_path(CACHE_DIR, ".hdf5")},
+                 [os.path.join(CACHE_DIR, STORE_NAME)], run)
+
+
+def plot_stage(script):
+    # Importing only reads the script's configuration; its work runs under __main__
+    module = importlib.import_module(os.path.splitext(script)[0])
+    cache_dir, excel_file = module.CACHE_DIR, module.EXCEL_FILE
+    plot_dir = getattr(module, "PLOT_DIR", None)
+
+    # The scripts read the spectra store, which the extract stage keeps up to date
+    def inputs():
+        return {"script": describe_path(module.__file__), "excel": describe_path(excel_file),
+                "task_files": describe_path(cache_dir, ".hdf5"),
+                "store": describe_path(os.path.join(cache_dir, STORE_NAME))}
+
+    return stage(f"plot:{script}", inputs, [plot_dir] if plot_dir else [],
+                 lambda: runpy.run_path(module.__file__, run_name="__main__"))
+
+
+# --- 4. RUNNER ---
+def run_pipeline(stages, state_file=STATE_FILE, force=FORCE_STAGES):
+    """
+    Runs the stages in order and skips each one whose inputs are unchanged since it
+    last finished and whose outputs still exist. A failing stage stops the pipeline.
+    :return: dict of stage name -> 'ran', 'skipped' or 'failed'
+    """
+    state = load_state(state_file)
+    report = {}
+    for st in stages:
+        name = st["name"]
+        inputs = st["inputs"]()
+        current = fingerprint(inputs)
+        previous = state.get(name, {})
+        outputs_exist = all(os.path.exists(path) for path in st["outputs"])
+        if previous.get("fingerprint") == current and outputs_exist and name not in force:
+            print(f"[skip] {name} (inputs unchanged since {previous.get('finished')})")
+            report[name] = "skipped"
+            continue
+
+        print(f"[run]  {name}")
+        start = time.perf_counter()
+        try:
+            st["run"]()
+        except Exception as e:
+            print(f"  [!] Stage {name} failed: {type(e).__name__}: {e}")
+            state.pop(name, None)
+            save_state(state, state_file)
+            report[name] = "failed"
+            break
+
+        # Fingerprint again: a stage may update its own inputs (e.g. the task list)
+        state[name] = {"fingerprint": fingerprint(st["inputs"]()),
+                       "finished": time.strftime("%Y-%m-%d %H:%M:%S"),
+                       "seconds": round(time.perf_counter() - start, 2)}
+        save_state(state, state_file)
+        report[name] = "ran"
+    return report
+
+
+if __name__ == "__main__":
+    import tidy3d.web as web
+
+    stages = [list_stage(web), download_stage(web)]
+    stages += [compact_stage()] if COMPACT else []
+    stages += [extract_stage()]
+    stages += [plot_stage(script) for script in PLOT_SCRIPTS]
+    report = run_pipeline(stages)
+
+    print("\n" + "="*40)
+    print("PIPELINE SUMMARY")
+    for name, outcome in report.items():
+        print(f"{outcome:>8}: {name}")
+    print(f"Stage state kept in: {STATE_FILE}")
+    print("="*40)
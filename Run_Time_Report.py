@@ -0,0 +1,145 @@
+import h5py
+import numpy as np
+import pandas as pd
+import os
+import re
+import json
+from concurrent.futures import ProcessPoolExecutor
+from Spectra_Extraction import list_task_files, print_error_summary, MIN_FILES_FOR_POOL, CHUNKSIZE
+from Task_Registry import campaign_tasks
+
+# --- 1. CONFIGURATION ---
+CACHE_DIR = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_tasks"
+EXCEL_FILE = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200.xlsx"
+OUTPUT_FILE = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_run_time.xlsx"
+
+# Suggested run_time = longest time any design needed to reach its shutoff level x MARGIN
+MARGIN = 1.5
+MAX_WORKERS = None
+
+COL_TASK_ID = "Task ID"
+
+# Solver progress lines in the task log, e.g.
+# "- Time step    827 / time 4.13e-14s (  4 % done), field decay: 1.10e-01"
+LOG_LINE = re.compile(r"- Time step\s+(\d+)\s+/\s+time\s+([0-9.eE+-]+)\s*s.*?field decay:\s*([0-9.eE+-]+)")
+SHUTOFF_MESSAGE = "Field decay smaller than shutoff factor"
+
+
+# --- 2. PER-TASK LOG ---
+def needed_time(times, decays, shutoff):
+    """
+    Simulated time at which the field decay first reached the shutoff level.
+    If it never did, the decay over the second half of the log is extrapolated as an
+    exponential; NaN when it is not decaying at all.
+    """
+    times, decays = np.asarray(times, dtype=float), np.asarray(decays, dtype=float)
+    below = np.nonzero(decays <= shutoff)[0]
+    if below.size:
+        return float(times[below[0]])
+
+    tail = slice(len(times) // 2, None)
+    t, d = times[tail], decays[tail]
+    keep = d > 0
+    if keep.sum() < 2:
+        return np.nan
+    slope = np.polyfit(t[keep], np.log(d[keep]), 1)[0]
+    if not slope < 0:
+        return np.nan
+    return float(times[-1] + np.log(shutoff / decays[-1]) / slope)
+
+
+def read_run_log(filepath):
+    """
+    Reads the run time, shutoff level and solver log of one task file (only its JSON_STRING).
+    :return: dict with 'Task ID', 'Run Time', 'Shutoff', 'Steps', 'Time Used', 'Final Decay',
+             'Shut Off' (stopped on decay before run_time), 'Needed Time', 'Used %' and 'Needed %'
+             (both of run_time)
+    """
+    with h5py.File(filepath, "r") as f:
+        info = json.loads(f["JSON_STRING"][()])
+    simulation = info.get("simulation") or {}
+    log = info.get("log") or ""
+    run_time = float(simulation.get("run_time", np.nan))
+    shutoff = float(simulation.get("shutoff", 1e-5))
+
+    matches = LOG_LINE.findall(log)
+    steps = [int(m[0]) for m in matches]
+    times = [float(m[1]) for m in matches]
+    decays = [float(m[2]) for m in matches]
+
+    row = {COL_TASK_ID: os.path.basename(filepath).replace(".hdf5", ""), "Run Time": run_time,
+           "Shutoff": shutoff, "Steps": steps[-1] if steps else np.nan,
+           "Time Used": times[-1] if times else np.nan, "Final Decay": decays[-1] if decays else np.nan,
+           "Shut Off": SHUTOFF_MESSAGE in log,
+           "Needed Time": needed_time(times, decays, shutoff) if times else np.nan}
+    row["Used %"] = row["Time Used"] / run_time * 100
+    row["Needed %"] = row["Needed Time"] / run_time * 100
+    return row
+
+
+def _log_worker(filepath):
+    try:
+        return read_run_log(filepath), None
+    except Exception as e:
+        return None, (os.path.basename(filepath), f"{type(e).__name__}: {e}")
+
+
+def run_time_report(filepaths, max_workers=MAX_WORKERS):
+    """
+    One row per task file (see read_run_log). Call under __main__ (worker processes).
+    :return: (DataFrame, list of (filename, message) for files that could not be read)
+    """
+    if len(filepaths) < MIN_FILES_FOR_POOL or max_workers == 1:
+        results = [_log_worker(path) for path in filepaths]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_log_worker, filepaths, chunksize=CHUNKSIZE))
+    rows = [row for row, _ in results if row is not None]
+    errors = [error for _, error in results if error is not None]
+    return pd.DataFrame(rows), errors
+
+
+def print_run_time_report(df, margin=MARGIN):
+    """ How much of the reserved simulation time was used, which tasks were cut short and a suggested run_time. """
+    logged = df.dropna(subset=["Time Used"])
+    truncated = logged[~logged["Shut Off"] & (logged["Final Decay"] > logged["Shutoff"])]
+    print("\n" + "="*40)
+    print(f"RUN TIME REPORT: {len(logged)} of {len(df)} tasks have a solver log")
+    if logged.empty:
+        print("="*40)
+        return
+    print(f"Stopped on field decay:  {int(logged['Shut Off'].sum())}")
+    print(f"Cut off by run_time:     {len(truncated)} (field decay still above shutoff, results may be inaccurate)")
+    print(f"run_time used:           median {logged['Used %'].median():.0f}%, "
+          f"{logged['Used %'].min():.0f}% to {logged['Used %'].max():.0f}%")
+    print(f"Simulated time used:     {logged['Time Used'].sum() / logged['Run Time'].sum() * 100:.0f}% "
+          f"of the run_time reserved over all tasks")
+    needed = logged["Needed Time"].max()
+    if np.isfinite(needed):
+        print(f"Longest time needed:     {needed:.3e} s (run_time set: {logged['Run Time'].min():.3e} "
+              f"to {logged['Run Time'].max():.3e} s)")
+        print(f"Suggested run_time:      {needed * margin:.3e} s ({margin}x the longest)")
+    for _, row in truncated.sort_values("Final Decay", ascending=False).head(10).iterrows():
+        label = row.get("Task Name", row[COL_TASK_ID])
+        print(f"  [!] {label}: decay {row['Final Decay']:.1e} at run_time, needs about {row['Needed Time']:.3e} s")
+    print("="*40)
+
+
+if __name__ == "__main__":
+    # --- 3. READ SOLVER LOGS ---
+    df, errors = run_time_report(list_task_files(CACHE_DIR))
+    print_error_summary(errors, len(df) + len(errors))
+    if df.empty:
+        print(f"No readable task files in {CACHE_DIR}")
+    else:
+        # Task names and thicknesses from the task registry, when the campaign is registered
+        try:
+            tasks = campaign_tasks(EXCEL_FILE)
+            df = df.join(tasks[["Task Name", "SiN_T", "SiN_B"]], on=COL_TASK_ID)
+        except FileNotFoundError as e:
+            print(f"  [!] {e}")
+
+        # --- 4. SAVE ---
+        df.sort_values("Needed %", ascending=False).to_excel(OUTPUT_FILE, index=False)
+        print_run_time_report(df)
+        print(f"Per-task report saved to: {OUTPUT_FILE}")
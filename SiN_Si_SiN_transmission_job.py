@@ -2,10 +2,34 @@ import tidy3d as td
 import tidy3d.web as web
 import numpy as np
 import pandas as pd
+import os
+from Batch_Scheduler import run_doe_scheduled, nominal_first_priority
+from Simulation_Cache import load_index, save_index, partition_simulations, save_reused, record_batch
+from Stack_Template import stack_template, build_stack, build_stacks, face_template
+from Preflight import preflight, calibrate_cost, estimate_credits, print_preflight
+from Substrate_Recombination import face_simulations
+
+# --- CONFIGURATION ---
+DATA_DIR = "data"
+
+# Scheduled submission: at most MAX_IN_FLIGHT tasks in the cloud, nominal designs first,
+# and no new submissions once CREDIT_BUDGET (FlexCredits) would be exceeded
+USE_SCHEDULER = False
+MAX_IN_FLIGHT = 20
+CREDIT_BUDGET = 50.0
+
+# Pre-flight: validate all designs in parallel and report grid size, time steps, data
+# size and outliers before submitting; CALIBRATE_COST uploads one design for a cost estimate
+PREFLIGHT = True
+PREFLIGHT_ONLY = False
+CALIBRATE_COST = False
+
+if not os.path.exists(DATA_DIR):
+    os.makedirs(DATA_DIR)
 
 # --- 1. LOAD DOE FROM EXCEL ---
 # Ensure the path is correct for your local machine
-doe_df = pd.read_excel(r"C:\Users\ssatter\Documents\Midnight\DOE_ARC_SiN_Si_SiN.xlsx")
+DOE_FILE = r"C:\Users\ssatter\Documents\Midnight\DOE_ARC_SiN_Si_SiN.xlsx"
 TO_UM = 1e-4 
 
 # --- 2. PARAMETERS & PHYSICS SETUP ---
@@ -17,107 +41,91 @@ STRUCTURE_WIDTH = 5.0
 DOMAIN_WIDTH = 8.0      
 
 lambdas_23 = np.linspace(0.79, 0.9, 23)
-freqs_23 = td.C_0 / lambdas_23
 
 lambdas_20 = np.linspace(0.79, 0.9, 20)
-freqs_20 = td.C_0 / lambdas_20
-
-freq0 = np.mean(freqs_23)
-fwidth = (np.max(freqs_23) - np.min(freqs_23)) / 2.0
 
 # --- 3. SIMULATION CONSTRUCTOR ---
+# Media, sources, monitors, boundary and grid specs are built and validated once; each DOE
+# row only moves the layers, source, reflection monitor and domain (see Stack_Template.py)
+BUILD_WORKERS = 1          # Processes for building variants; only worth it with VALIDATE_VARIANTS
+VALIDATE_VARIANTS = False  # Full tidy3d validation of every variant (the extremes always are)
+RUN_TIME_POLICY = "decay"  # Pulse + transit + Si slab ring-down to SHUTOFF; "transit" is the old 5x rule
+SHUTOFF = 1e-5             # Stop time stepping once the field energy is this far below its peak
+
+TEMPLATE = stack_template(N_SIN, N_SIN, polarization="linear", wavelengths=lambdas_23,
+                          norm_wavelengths=lambdas_20, n_si=N_SI, si_thickness=SI_THICKNESS,
+                          waist_radius=WAIST_RADIUS, structure_width=STRUCTURE_WIDTH,
+                          domain_width=DOMAIN_WIDTH, run_time_policy=RUN_TIME_POLICY, shutoff=SHUTOFF)
+
+# "slab": the whole SiN/Si/SiN stack per design. "semi_infinite": each SiN face on its own on
+# semi-infinite Si, far smaller and shorter runs, and only N + M of them for an N x M grid;
+# Substrate_Recombination.py adds the Si slab back by intensity afterwards (the Si thickness
+# fringes averaged out, as for a real wafer). Both sides are the same film, so they share
+# one set of faces (SHARED_FACES = True in Substrate_Recombination.py).
+SUBSTRATE = "slab"
+if SUBSTRATE == "semi_infinite":
+    FACE = face_template(N_SIN, polarization="linear", wavelengths=lambdas_23, norm_wavelengths=lambdas_20,
+                         n_si=N_SI, waist_radius=WAIST_RADIUS, structure_width=STRUCTURE_WIDTH,
+                         domain_width=DOMAIN_WIDTH, run_time_policy=RUN_TIME_POLICY, shutoff=SHUTOFF)
+
+
 def make_doe_sim(t_top_um, t_bot_um):
-    mat_si = td.Medium(permittivity=N_SI**2)
-    mat_sin = td.Medium(permittivity=N_SIN**2)
-    
-    stack_bottom_z = 0.0
-    
-    sin_bot = td.Structure(
-        geometry=td.Box(size=(STRUCTURE_WIDTH, STRUCTURE_WIDTH, t_bot_um), 
-                        center=(0, 0, t_bot_um / 2)),
-        medium=mat_sin, name="SiN Bottom"
-    )
-
-    si_base = td.Structure(
-        geometry=td.Box(size=(STRUCTURE_WIDTH, STRUCTURE_WIDTH, SI_THICKNESS), 
-                        center=(0, 0, t_bot_um + SI_THICKNESS / 2)),
-        medium=mat_si, name="Si Substrate"
-    )
-    
-    z_top_layer_bot = t_bot_um + SI_THICKNESS
-    sin_top = td.Structure(
-        geometry=td.Box(size=(STRUCTURE_WIDTH, STRUCTURE_WIDTH, t_top_um), 
-                        center=(0, 0, z_top_layer_bot + t_top_um / 2)),
-        medium=mat_sin, name="SiN Top"
-    )
-
-    top_of_stack = z_top_layer_bot + t_top_um
-    source_z = top_of_stack + 1.5
-    refl_monitor_z = source_z + 0.5 
-
-    pulse = td.GaussianPulse(freq0=freq0, fwidth=fwidth)
-
-    gaussian_beam = td.GaussianBeam(
-        center=(0, 0, source_z),
-        size=(STRUCTURE_WIDTH, STRUCTURE_WIDTH, 0),
-        source_time=pulse,
-        direction="-",
-        waist_radius=WAIST_RADIUS,
-        waist_distance=0, 
-        pol_angle=0
-    )
-
-    total_z_span = refl_monitor_z + 1.0
-    run_time = (total_z_span * N_SI / td.C_0) * 5 
-
-    bspec = td.BoundarySpec(x=td.Boundary.periodic(), y=td.Boundary.periodic(), z=td.Boundary.pml())
-
-    t_monitor = td.FluxMonitor(
-        center=(0, 0, stack_bottom_z), size=(STRUCTURE_WIDTH, STRUCTURE_WIDTH, 0), 
-        freqs=freqs_23, name="T"
-    )
-    r_monitor = td.FluxMonitor(
-        center=(0, 0, refl_monitor_z), size=(STRUCTURE_WIDTH, STRUCTURE_WIDTH, 0), 
-        freqs=freqs_23, name="R"
-    )
-
-    source_monitor = td.FieldMonitor(
-        center=(0, 0, source_z), size=(0, 0, 0), 
-        freqs=freqs_20, name="Source_Normalization"
-    )
-
-    z_min, z_max = -1.0, refl_monitor_z + 1.0
-    
-    return td.Simulation(
-        size=(DOMAIN_WIDTH, DOMAIN_WIDTH, z_max - z_min),
-        center=(0, 0, (z_max + z_min) / 2),
-        boundary_spec=bspec,
-        grid_spec=td.GridSpec.auto(wavelength=np.max(lambdas_23)),
-        structures=[sin_bot, si_base, sin_top],
-        sources=[gaussian_beam],
-        monitors=[t_monitor, r_monitor, source_monitor],
-        run_time=run_time
-    )
-
-# --- 4. BATCH EXECUTION ---
-folder_name = "ARC_SiN_1_947_DOE_v1"
-sims = {}
-
-print(f"Preparing batch for {len(doe_df)} tasks...")
-
-for idx, row in doe_df.iterrows():
-    t_top = row['SiN_T'] * TO_UM
-    t_bot = row['SiN_B'] * TO_UM
-    
-    sim = make_doe_sim(t_top, t_bot)
-    task_name = f"Run_{idx}_T{int(row['SiN_T'])}_B{int(row['SiN_B'])}"
-    sims[task_name] = sim
-
-# Create the Batch object
-batch = web.Batch(simulations=sims, folder_name=folder_name)
-
-# Submit and run all simulations in the cloud
-print("Submitting batch to Tidy3D Cloud...")
-batch_results = batch.run(path_dir="data") 
-
-print("\nAll tasks completed!")
\ No newline at end of file
+    return build_stack(TEMPLATE, t_top_um, t_bot_um, validate=VALIDATE_VARIANTS)
+
+
+if __name__ == "__main__":
+    # --- 4. BATCH EXECUTION ---
+    folder_name = "ARC_SiN_1_947_DOE_v1"
+    doe_df = pd.read_excel(DOE_FILE)
+
+    print(f"Preparing batch for {len(doe_df)} tasks...")
+
+    task_names = [f"Run_{idx}_T{int(row['SiN_T'])}_B{int(row['SiN_B'])}" for idx, row in doe_df.iterrows()]
+    thickness_um = zip(doe_df['SiN_T'] * TO_UM, doe_df['SiN_B'] * TO_UM)
+    if SUBSTRATE == "semi_infinite":
+        folder_name += "_faces"
+        sims = face_simulations(FACE, FACE, zip(doe_df['SiN_T'], doe_df['SiN_B']),
+                                to_um=TO_UM, validate=VALIDATE_VARIANTS)
+    else:
+        sims = dict(zip(task_names, build_stacks(TEMPLATE, thickness_um, max_workers=BUILD_WORKERS,
+                                                 validate=VALIDATE_VARIANTS)))
+
+    # Skip designs already solved in an earlier campaign (see Simulation_Cache.py)
+    sim_index = load_index()
+    sims, reused_df = partition_simulations(sims, sim_index)
+    if not reused_df.empty:
+        reused_path = save_reused(reused_df, folder_name, DATA_DIR)
+        print(f"Reusing {len(reused_df)} existing results (listed in {reused_path})")
+
+    # Validate every new design and estimate the campaign before anything is uploaded
+    if sims and PREFLIGHT:
+        preflight_df = preflight(sims)
+        if CALIBRATE_COST:
+            estimate_credits(preflight_df, calibrate_cost(web, sims, folder_name, preflight_df))
+        preflight_path = os.path.join(DATA_DIR, f"{folder_name}_preflight.xlsx")
+        preflight_df.to_excel(preflight_path, index=False)
+        print_preflight(preflight_df)
+        print(f"Pre-flight report saved to: {preflight_path}")
+        if not preflight_df["Valid"].all():
+            print("Nothing submitted: fix or remove the invalid designs first.")
+            sims = {}
+        elif PREFLIGHT_ONLY:
+            print("PREFLIGHT_ONLY is set, nothing submitted.")
+            sims = {}
+
+    if sims and USE_SCHEDULER:
+        run_doe_scheduled(sims, folder_name, DATA_DIR, web, sim_index,
+                          priority=nominal_first_priority(sims),
+                          max_in_flight=MAX_IN_FLIGHT, budget=CREDIT_BUDGET)
+        save_index(sim_index)
+    elif sims:
+        # Create the Batch object
+        batch = web.Batch(simulations=sims, folder_name=folder_name)
+
+        # Submit and run all simulations in the cloud
+        print(f"Submitting batch of {len(sims)} new tasks to Tidy3D Cloud...")
+        batch_results = batch.run(path_dir=DATA_DIR) 
+        record_batch(sim_index, sims, batch, folder_name, path_dir=DATA_DIR)
+        save_index(sim_index)
+
+    print("\nAll tasks completed!")
\ No newline at end of file
@@ -0,0 +1,169 @@
+import h5py
+import pandas as pd
+import os
+import json
+import hashlib
+import time
+from contextlib import closing
+from Task_Registry import REGISTRY_FILE, connect, record_reused
+
+# --- 1. CONFIGURATION ---
+# One index shared by all campaigns, so a design solved in any earlier folder is reused
+INDEX_FILE = r"C:\Users\ssatter\Documents\Midnight\simulation_index.json"
+
+# Download folders of earlier campaigns to seed the index from (run this file directly)
+CACHE_DIRS = [
+    r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_tasks",
+    r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_Circular_polar_tasks",
+]
+
+# Fields that do not change the physics and must not change the hash
+IGNORED_KEYS = ("attrs", "version")
+
+# Floats are rounded to this many significant digits, e.g. 750 * 1e-4 -> 0.075
+FLOAT_DIGITS = 12
+
+
+# --- 2. CANONICAL HASH ---
+def _canonical(value):
+    if isinstance(value, dict):
+        return {k: _canonical(v) for k, v in value.items() if k not in IGNORED_KEYS}
+    if isinstance(value, list):
+        return [_canonical(v) for v in value]
+    if isinstance(value, float):
+        return float(f"{value:.{FLOAT_DIGITS}g}")
+    return value
+
+
+def hash_simulation_dict(sim_dict):
+    """ SHA-256 of the simulation JSON with sorted keys, rounded floats and no metadata. """
+    text = json.dumps(_canonical(sim_dict), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def simulation_hash(sim):
+    """ Canonical hash of a td.Simulation; identical designs give identical hashes. """
+    # model_dump_json gives the same JSON as the deprecated .json() of older tidy3d versions
+    text = sim.model_dump_json() if hasattr(sim, "model_dump_json") else sim.json()
+    return hash_simulation_dict(json.loads(text))
+
+
+# --- 3. INDEX ---
+def load_index(index_file=INDEX_FILE):
+    if os.path.exists(index_file):
+        with open(index_file, "r") as fh:
+            return json.load(fh)
+    return {}
+
+
+def save_index(index, index_file=INDEX_FILE):
+    tmp_path = index_file + ".part"
+    with open(tmp_path, "w") as fh:
+        json.dump(index, fh, indent=2, sort_keys=True)
+    os.replace(tmp_path, index_file)
+
+
+def record_task(index, sim_hash, task_id=None, task_name=None, folder=None, hdf5_path=None):
+    entry = index.setdefault(sim_hash, {})
+    for key, value in (("task_id", task_id), ("task_name", task_name),
+                       ("folder", folder), ("hdf5", hdf5_path)):
+        if value is not None:
+            entry[key] = value
+    entry["recorded"] = time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def record_batch(index, sims, batch, folder_name, path_dir=None):
+    """
+    Adds every job of a finished web.Batch to the index.
+    :param sims: The dict of task name -> td.Simulation that was given to the batch
+    :param path_dir: The batch download folder, if results were saved there
+    """
+    for task_name, job in batch.jobs.items():
+        hdf5_path = None
+        if path_dir is not None:
+            candidate = os.path.join(path_dir, f"{job.task_id}.hdf5")
+            hdf5_path = candidate if os.path.exists(candidate) else None
+        record_task(index, simulation_hash(sims[task_name]), job.task_id, task_name, folder_name, hdf5_path)
+
+
+def index_cache_dir(index, cache_dir, folder=None):
+    """
+    Seeds the index from an existing download folder. Each Tidy3D result file carries its
+    simulation JSON, so earlier campaigns become reusable without re-listing the cloud.
+    Files without one (e.g. Substrate_Recombination output) are skipped.
+    :return: Number of files added
+    """
+    added = 0
+    for filename in sorted(os.listdir(cache_dir)):
+        if not filename.endswith(".hdf5"):
+            continue
+        filepath = os.path.join(cache_dir, filename)
+        try:
+            with h5py.File(filepath, "r") as f:
+                sim_dict = json.loads(f["JSON_STRING"][()])["simulation"]
+        except Exception as e:
+            print(f"  [!] Skipping {filename}: {e}")
+            continue
+        if not sim_dict:
+            continue
+        sim_hash = hash_simulation_dict(sim_dict)
+        if sim_hash not in index:
+            added += 1
+        record_task(index, sim_hash, task_id=filename.replace(".hdf5", ""), folder=folder, hdf5_path=filepath)
+    return added
+
+
+# --- 4. BATCH PREPARATION ---
+def partition_simulations(sims, index):
+    """
+    Splits a dict of task name -> td.Simulation into designs that still need to run
+    and designs that were already solved.
+    Identical designs within the same DOE are only submitted once as well.
+    :return: (new_sims dict, reused DataFrame with Task Name, Task ID, Folder, HDF5, Hash)
+    """
+    new_sims, reused_rows, seen = {}, [], {}
+    for task_name, sim in sims.items():
+        sim_hash = simulation_hash(sim)
+        entry = index.get(sim_hash)
+        if entry is not None and (entry.get("task_id") or entry.get("hdf5")):
+            reused_rows.append({"Task Name": task_name, "Task ID": entry.get("task_id"),
+                                "Folder": entry.get("folder"), "HDF5": entry.get("hdf5"), "Hash": sim_hash})
+        elif sim_hash in seen:
+            reused_rows.append({"Task Name": task_name, "Task ID": None,
+                                "Folder": None, "HDF5": None, "Hash": sim_hash,
+                                "Duplicate Of": seen[sim_hash]})
+        else:
+            seen[sim_hash] = task_name
+            new_sims[task_name] = sim
+    return new_sims, pd.DataFrame(reused_rows)
+
+
+def save_reused(reused_df, folder_name, data_dir, registry_file=REGISTRY_FILE):
+    """
+    Writes '<folder_name>_reused_tasks.xlsx' to data_dir and records the reused designs in
+    the task registry under folder_name, so List_TaskIDs.py lists them with the folder's
+    own tasks and the campaign's downloads and analysis scripts include them.
+    :param reused_df: As returned by partition_simulations
+    :return: Path of the Excel file
+    """
+    reused_path = os.path.join(data_dir, f"{folder_name}_reused_tasks.xlsx")
+    reused_df.to_excel(reused_path, index=False)
+    with closing(connect(registry_file)) as con:
+        record_reused(con, folder_name, reused_df)
+    return reused_path
+
+
+if __name__ == "__main__":
+    index = load_index()
+    print(f"Index has {len(index)} designs.")
+    for cache_dir in CACHE_DIRS:
+        if not os.path.isdir(cache_dir):
+            print(f"  [!] Not found: {cache_dir}")
+            continue
+        added = index_cache_dir(index, cache_dir)
+        print(f"Indexed {cache_dir}: {added} new designs")
+    save_index(index)
+
+    print("\n" + "="*40)
+    print(f"INDEX COMPLETE: {len(index)} designs in {INDEX_FILE}")
+    print("="*40)
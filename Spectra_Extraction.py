@@ -0,0 +1,366 @@
+import h5py
+import numpy as np
+import pandas as pd
+import os
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+# --- 1. CONFIGURATION ---
+# Path indices for HDF5. Monitors are looked up by name first (see flux_paths);
+# these are the fallback for files whose monitor list cannot be read
+T_PATH = "data/0/flux/__xarray_dataarray_variable__"
+R_PATH = "data/1/flux/__xarray_dataarray_variable__"
+FREQ_PATH = "data/0/flux/f"
+
+T_MONITOR = "T"
+R_MONITOR = "R"
+FLUX_DATASET = "flux/__xarray_dataarray_variable__"
+FREQ_DATASET = "flux/f"
+
+C_LIGHT = 299792458  # m/s, converts frequency (Hz) to wavelength
+
+# Below this many files a process pool costs more to start than it saves
+MIN_FILES_FOR_POOL = 32
+CHUNKSIZE = 16
+
+
+# --- 2. PER-FILE READ ---
+def monitor_groups(f):
+    """
+    Maps monitor name -> data group ('data/<i>') for an open Tidy3D result file.
+    A 'monitor_name' attribute on the group wins; otherwise the names come from the
+    monitor list in the file's JSON_STRING.
+    """
+    groups = {}
+    if "data" not in f:
+        return groups
+    for key in f["data"]:
+        name = f["data"][key].attrs.get("monitor_name")
+        if name is not None:
+            groups[name.decode() if isinstance(name, bytes) else str(name)] = f"data/{key}"
+    if groups or "JSON_STRING" not in f:
+        return groups
+
+    try:
+        entries = json.loads(f["JSON_STRING"][()]).get("data", [])
+    except Exception:
+        return groups
+    for i, entry in enumerate(entries):
+        name = (entry.get("monitor") or {}).get("name") if isinstance(entry, dict) else None
+        if name is not None and str(i) in f["data"]:
+            groups[name] = f"data/{i}"
+    return groups
+
+
+def flux_paths(f, monitor, groups=None):
+    """
+    (flux path, frequency path) of a flux monitor, or the fixed data/0 or data/1 paths.
+    :param groups: monitor_groups(f), when the caller looks up several monitors of one file
+    """
+    group = (monitor_groups(f) if groups is None else groups).get(monitor)
+    if group is not None:
+        return f"{group}/{FLUX_DATASET}", f"{group}/{FREQ_DATASET}"
+    if monitor == T_MONITOR:
+        return T_PATH, FREQ_PATH
+    if monitor == R_MONITOR:
+        return R_PATH, FREQ_PATH
+    raise KeyError(f"monitor '{monitor}' not found")
+
+
+def read_task_file(filepath):
+    """
+    Returns (freqs, t_flux, r_flux) as raw float arrays from one Tidy3D result file.
+    Only the two flux datasets and the frequency axis are read.
+    R is filled with NaN when the reflection monitor is missing.
+    """
+    with h5py.File(filepath, "r") as f:
+        groups = monitor_groups(f)
+        t_path, freq_path = flux_paths(f, T_MONITOR, groups)
+        r_path, _ = flux_paths(f, R_MONITOR, groups)
+        freqs = f[freq_path][()]
+        t_flux = f[t_path][()]
+        r_flux = f[r_path][()] if r_path in f else np.full(freqs.shape, np.nan)
+    return freqs, t_flux, r_flux
+
+
+def read_task_targets(filepath, targets, monitors=(T_MONITOR, R_MONITOR), method="linear"):
+    """
+    Reads |flux| of each monitor at the target wavelengths without loading whole spectra.
+    Only the frequency axis and the samples next to each target are read from disk
+    (an HDF5 point selection), so the cost does not grow with the spectrum length.
+    :return: monitors x targets array, NaN for missing monitors or out-of-range targets
+    """
+    targets = np.asarray(targets, dtype=float).ravel()
+    out = np.full((len(monitors), targets.size), np.nan)
+    with h5py.File(filepath, "r") as f:
+        groups = monitor_groups(f)
+        for m, monitor in enumerate(monitors):
+            try:
+                flux_path, freq_path = flux_paths(f, monitor, groups)
+            except KeyError:
+                continue
+            if flux_path not in f:
+                continue
+            grid = to_wavelength_um(f[freq_path][()])
+            lo, hi, weight = _grid_weights(grid, targets, method)
+            needed = np.isfinite(weight)
+            if not needed.any():
+                continue
+            columns = np.unique(np.concatenate([lo[needed], hi[needed]]))
+            samples = np.abs(f[flux_path][columns])
+            lo_vals = samples[np.searchsorted(columns, lo[needed])]
+            hi_vals = samples[np.searchsorted(columns, hi[needed])]
+            w = weight[needed]
+            out[m, needed] = np.where(w == 0, lo_vals, np.where(w == 1, hi_vals, lo_vals * (1 - w) + hi_vals * w))
+    return out
+
+
+def file_sha256(filepath, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as fh:
+        for block in iter(lambda: fh.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_worker(job):
+    # Runs inside the pool; errors are returned rather than raised so one bad file never stops the run
+    filepath, known_hash = job
+    try:
+        digest = None
+        if known_hash is not False:
+            digest = file_sha256(filepath)
+            if digest == known_hash:
+                return filepath, digest, None, None, None, None
+        freqs, t_flux, r_flux = read_task_file(filepath)
+        return filepath, digest, freqs, t_flux, r_flux, None
+    except Exception as e:
+        return filepath, None, None, None, None, f"{type(e).__name__}: {e}"
+
+
+def pack_rows(rows, n_freq):
+    """ Stacks ragged 1D arrays into a (tasks x n_freq) matrix, padding with NaN. """
+    out = np.full((len(rows), n_freq), np.nan)
+    for i, row in enumerate(rows):
+        out[i, :len(row)] = row
+    return out
+
+
+# --- 3. PARALLEL EXTRACTION ---
+def list_task_files(cache_dir):
+    return sorted(os.path.join(cache_dir, f) for f in os.listdir(cache_dir) if f.endswith(".hdf5"))
+
+
+def extract_files(filepaths, max_workers=None, known_hashes=None):
+    """
+    Reads every file with a process pool and returns vectorized arrays.
+    Scripts that call this must keep their main code under `if __name__ == "__main__":`
+    so the worker processes can import them safely on Windows.
+    :param known_hashes: Optional dict of task ID -> SHA-256. When given, every file is hashed
+                         and files whose hash matches are listed in 'unchanged' instead of parsed.
+    :return: dict with 'task_id' (1D), 'freq', 'T', 'R' (tasks x freq, NaN-padded, raw flux),
+             'sha256' (1D, None unless hashing), 'unchanged' (task IDs skipped by hash)
+             and 'errors', a list of (filename, message) for files that could not be read
+    """
+    jobs = []
+    for path in filepaths:
+        task_id = os.path.basename(path).replace(".hdf5", "")
+        jobs.append((path, False if known_hashes is None else known_hashes.get(task_id)))
+
+    if len(jobs) < MIN_FILES_FOR_POOL or max_workers == 1:
+        results = [_read_worker(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_read_worker, jobs, chunksize=CHUNKSIZE))
+
+    task_ids, hashes, freq_rows, t_rows, r_rows, unchanged, errors = [], [], [], [], [], [], []
+    for path, digest, freqs, t_flux, r_flux, error in results:
+        filename = os.path.basename(path)
+        task_id = filename.replace(".hdf5", "")
+        if error is not None:
+            errors.append((filename, error))
+            continue
+        if freqs is None:
+            unchanged.append(task_id)
+            continue
+        task_ids.append(task_id)
+        hashes.append(digest)
+        freq_rows.append(freqs)
+        t_rows.append(t_flux)
+        r_rows.append(r_flux)
+
+    n_freq = max((len(row) for row in freq_rows), default=0)
+    return {
+        "task_id": np.asarray(task_ids, dtype=object),
+        "freq": pack_rows(freq_rows, n_freq),
+        "T": pack_rows(t_rows, n_freq),
+        "R": pack_rows(r_rows, n_freq),
+        "sha256": np.asarray(hashes, dtype=object),
+        "unchanged": unchanged,
+        "errors": errors,
+    }
+
+
+def extract_spectra(cache_dir, max_workers=None):
+    """ Extracts every '<task_id>.hdf5' in cache_dir. See extract_files for the return value. """
+    return extract_files(list_task_files(cache_dir), max_workers=max_workers)
+
+
+def _targets_worker(job):
+    filepath, targets, monitors = job
+    try:
+        return filepath, read_task_targets(filepath, targets, monitors), None
+    except Exception as e:
+        return filepath, None, f"{type(e).__name__}: {e}"
+
+
+def extract_targets(filepaths, targets, monitors=(T_MONITOR, R_MONITOR), max_workers=None):
+    """
+    Lazy counterpart of extract_files for scripts that only need a few wavelengths.
+    :return: dict with 'task_id' (1D), 'values' (tasks x monitors x targets, |flux|)
+             and 'errors', a list of (filename, message)
+    """
+    targets = tuple(float(t) for t in targets)
+    jobs = [(path, targets, tuple(monitors)) for path in filepaths]
+    if len(jobs) < MIN_FILES_FOR_POOL or max_workers == 1:
+        results = [_targets_worker(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_targets_worker, jobs, chunksize=CHUNKSIZE))
+
+    task_ids, values, errors = [], [], []
+    for path, vals, error in results:
+        filename = os.path.basename(path)
+        if error is not None:
+            errors.append((filename, error))
+            continue
+        task_ids.append(filename.replace(".hdf5", ""))
+        values.append(vals)
+    return {
+        "task_id": np.asarray(task_ids, dtype=object),
+        "values": np.asarray(values, dtype=float).reshape(len(task_ids), len(monitors), len(targets)),
+        "errors": errors,
+    }
+
+
+# --- 4. HELPERS FOR THE ANALYSIS SCRIPTS ---
+def to_wavelength_um(freqs):
+    return C_LIGHT / freqs * 1e6
+
+
+def distinct_grids(wavelengths):
+    """
+    Groups tasks by their sampling grid. Padding (NaN) is part of the grid, so a task
+    with fewer frequency points never shares a grid with a longer one.
+    :param wavelengths: tasks x freq matrix
+    :return: (grids x freq matrix of the distinct grids, index of each task's grid)
+    """
+    wavelengths = np.atleast_2d(np.asarray(wavelengths, dtype=float))
+    filled = np.where(np.isnan(wavelengths), -1.0, wavelengths)
+    grids, inverse = np.unique(filled, axis=0, return_inverse=True)
+    return np.where(grids == -1.0, np.nan, grids), inverse.ravel()
+
+
+# Interpolation index maps, keyed on (grid bytes, targets bytes, method)
+_WEIGHT_CACHE = {}
+
+
+def _grid_weights(grid, targets, method):
+    """
+    Column indices and weights that evaluate the targets on one sampling grid.
+    Targets outside the grid get NaN weights, so they come out as NaN instead of
+    being clamped to the nearest edge sample.
+    """
+    key = (grid.tobytes(), targets.tobytes(), method)
+    cached = _WEIGHT_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    columns = np.flatnonzero(~np.isnan(grid))
+    order = columns[np.argsort(grid[columns])]
+    sorted_grid = grid[order]
+    lo = np.zeros(targets.size, dtype=int)
+    hi = np.zeros(targets.size, dtype=int)
+    weight = np.full(targets.size, np.nan)
+    if sorted_grid.size:
+        # Small tolerance so a target on the grid edge survives the frequency round trip
+        tol = 1e-9 * np.abs(sorted_grid).max()
+        inside = (targets >= sorted_grid[0] - tol) & (targets <= sorted_grid[-1] + tol)
+        if sorted_grid.size == 1:
+            lo[:], hi[:] = order[0], order[0]
+            weight[inside] = 0.0
+        else:
+            pos = np.clip(np.searchsorted(sorted_grid, targets), 1, sorted_grid.size - 1)
+            step = sorted_grid[pos] - sorted_grid[pos - 1]
+            frac = np.clip((targets - sorted_grid[pos - 1]) / step, 0.0, 1.0)
+            if method == "nearest":
+                frac = np.round(frac)
+            lo, hi = order[pos - 1], order[pos]
+            weight = np.where(inside, frac, np.nan)
+
+    cached = (lo, hi, weight)
+    _WEIGHT_CACHE[key] = cached
+    return cached
+
+
+def values_at_wavelengths(wavelengths, values, targets, method="linear"):
+    """
+    Evaluates every task at every target wavelength at once.
+    Each distinct sampling grid is handled separately (its index map is cached), so tasks
+    with different frequency axes are all read correctly. Targets outside a task's
+    wavelength range are NaN.
+    :param wavelengths: tasks x freq matrix in um
+    :param values: tasks x freq matrix
+    :param targets: list of target wavelengths in um
+    :param method: "linear" interpolates between the two neighbouring samples,
+                   "nearest" picks the closest sample (the old behaviour)
+    :return: tasks x targets matrix
+    """
+    wavelengths = np.atleast_2d(np.asarray(wavelengths, dtype=float))
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    targets = np.asarray(targets, dtype=float).ravel()
+    out = np.full((values.shape[0], targets.size), np.nan)
+    if not values.shape[0] or not targets.size:
+        return out
+
+    grids, inverse = distinct_grids(wavelengths)
+    for g, grid in enumerate(grids):
+        rows = np.flatnonzero(inverse == g)
+        lo, hi, weight = _grid_weights(grid, targets, method)
+        lo_vals, hi_vals = values[rows][:, lo], values[rows][:, hi]
+        # Exact hits use the sample itself, so a NaN neighbour does not spoil them
+        blended = lo_vals * (1 - weight) + hi_vals * weight
+        out[rows] = np.where(weight == 0, lo_vals, np.where(weight == 1, hi_vals, blended))
+    return out
+
+
+def build_target_summary(spectra, name_mapping, targets, scale=100):
+    """
+    Builds the long-format 'DOE_Target_Summary.csv' table (one row per run and target)
+    in a single vectorized step. Tasks without both T and R data are left out.
+    :param scale: Multiplier applied to |flux|, e.g. 100 for %, 50 for % normalized by 2
+    """
+    has_both = ~(np.all(np.isnan(spectra["T"]), axis=1) | np.all(np.isnan(spectra["R"]), axis=1))
+    wavelengths = to_wavelength_um(spectra["freq"][has_both])
+    t_vals = values_at_wavelengths(wavelengths, np.abs(spectra["T"][has_both]) * scale, targets)
+    r_vals = values_at_wavelengths(wavelengths, np.abs(spectra["R"][has_both]) * scale, targets)
+
+    run_names = [name_mapping.get(tid, tid) for tid in spectra["task_id"][has_both]]
+    return pd.DataFrame({
+        "Run Name": np.repeat(run_names, len(targets)),
+        "Target Wavelength": np.tile(np.asarray(targets, dtype=float), len(run_names)),
+        "Transmission (%)": t_vals.ravel(),
+        "Reflection (%)": r_vals.ravel(),
+    })
+
+
+def print_error_summary(errors, n_files=None):
+    """ Prints one line per unreadable file instead of silently skipping it. """
+    if n_files is not None:
+        print(f"Extracted {n_files - len(errors)} of {n_files} files.")
+    if not errors:
+        return
+    print(f"  [!] {len(errors)} file(s) could not be read:")
+    for filename, message in errors:
+        print(f"      {filename}: {message}")
@@ -0,0 +1,404 @@
+import tidy3d as td
+import numpy as np
+import inspect
+from concurrent.futures import ProcessPoolExecutor
+from Transfer_Matrix_Prescreen import coating_rt
+
+# --- 1. CONFIGURATION ---
+# Defaults shared by the job scripts (um)
+N_SI = 3.7
+SI_THICKNESS = 5.0
+WAIST_RADIUS = 1.0
+STRUCTURE_WIDTH = 5.0
+DOMAIN_WIDTH = 8.0
+SOURCE_GAP = 1.5         # Source above the top of the stack
+MONITOR_GAP = 0.5        # Reflection monitor above the source
+PML_GAP = 1.0            # Free space between the outermost monitor and the PML
+
+# Run time policy:
+#   "decay":   the source pulse, one pass down to the T monitor and back up to the R monitor,
+#              then the round trips inside the Si slab until the light bouncing between its
+#              two SiN-coated faces has decayed to SHUTOFF (worst reflectance in the band),
+#              times RUN_TIME_MARGIN
+#   "transit": RUN_TIME_FACTOR x the light transit time through the whole domain in Si
+#              (the original heuristic; keeps Simulation_Cache hashes of earlier campaigns)
+RUN_TIME_POLICY = "decay"
+RUN_TIME_MARGIN = 1.5
+RUN_TIME_FACTOR = 5
+
+# Time stepping stops once the field energy has fallen to this fraction of its peak
+# (tidy3d's own default); run_time is only the upper limit
+SHUTOFF = 1e-5
+
+# Mirror symmetry of the fields about the x = 0 and y = 0 planes for a single beam
+# (-1: odd / PEC-like, 1: even / PMC-like). An x-polarized beam leaves only a quarter of the
+# domain to compute; the dual-beam circular source has no mirror symmetry.
+SYMMETRY = "auto"        # "auto" or an explicit (x, y, z) tuple
+POLARIZATION_SYMMETRY = {"linear": (-1, 1, 0), "linear_y": (1, -1, 0)}
+
+# Semi-infinite substrate (face_template): one SiN-coated face on Si that runs out through
+# the bottom PML, so no light comes back from the far side of the wafer. The T monitor sits
+# SI_DEPTH into the Si; the Si box ends SI_OVERHANG below the domain, inside the PML.
+SI_DEPTH = 1.0
+SI_OVERHANG = 5.0
+
+WAVELENGTHS = np.linspace(0.79, 0.9, 23)
+NORM_WAVELENGTHS = np.linspace(0.79, 0.9, 20)
+
+# Variants per worker task when building in parallel
+CHUNK_SIZE = 64
+
+# Newer tidy3d versions can copy a component without validating it again
+_FAST_COPY = "validate" in inspect.signature(td.Simulation.copy).parameters
+
+
+# --- 2. FULL CONSTRUCTION ---
+def pulse_width(wavelengths):
+    """ (freq0, fwidth) of the GaussianPulse covering the wavelengths in um. """
+    freqs = td.C_0 / np.asarray(wavelengths)
+    return np.mean(freqs), (np.max(freqs) - np.min(freqs)) / 2.0
+
+
+def run_time_budget(template, t_top_um, t_bot_um):
+    """
+    Run time of one design under the "decay" policy and what it is made of.
+    The GaussianPulse is on for 2 x offset (5) pulse widths. Every round trip through the
+    Si slab keeps R_top x R_bot of the energy inside it, so reaching the shutoff level takes
+    ln(shutoff) / ln(R_top x R_bot) round trips (at least one).
+    :return: dict with 'pulse', 'transit', 'round_trip' and 'ring_down' times (s), 'round_trips',
+             'r_top' and 'r_bot' (worst reflectance of each face in the band) and 'run_time' (s)
+    """
+    n_si, si = template["n_si"], template["si_thickness"]
+    wavelengths = template["wavelengths"]
+    _, fwidth = pulse_width(wavelengths)
+    pulse = float(2 * 5 / (2 * np.pi * fwidth))
+
+    # Down from the source to the T monitor below the stack, back up to the R monitor
+    stack_path = template["n_sin_top"] * t_top_um + n_si * si + template["n_sin_bot"] * t_bot_um
+    transit = (2 * (template["source_gap"] + stack_path) + template["monitor_gap"]) / td.C_0
+
+    _, r_top = coating_rt(t_top_um, wavelengths, template["n_sin_top"], n_si)
+    _, r_bot = coating_rt(t_bot_um, wavelengths, template["n_sin_bot"], n_si)
+    r_top, r_bot = float(np.max(r_top)), float(np.max(r_bot))
+    loss = np.log(max(r_top * r_bot, 1e-300))
+    round_trips = max(float(np.log(template["shutoff"]) / loss), 1.0) if template["shutoff"] > 0 else 1.0
+    round_trip = 2 * n_si * si / td.C_0
+
+    budget = {"pulse": pulse, "transit": transit, "round_trip": round_trip,
+              "round_trips": round_trips, "ring_down": round_trips * round_trip,
+              "r_top": r_top, "r_bot": r_bot}
+    budget["run_time"] = template["run_time_margin"] * (pulse + transit + budget["ring_down"])
+    return budget
+
+
+def _layout(template, t_top_um, t_bot_um):
+    """ z positions of every thickness-dependent part of the stack (bottom SiN starts at z = 0). """
+    si = template["si_thickness"]
+    z_top_layer_bot = t_bot_um + si
+    source_z = z_top_layer_bot + t_top_um + template["source_gap"]
+    refl_monitor_z = source_z + template["monitor_gap"]
+    z_min, z_max = -template["pml_gap"], refl_monitor_z + template["pml_gap"]
+    if template["run_time_policy"] == "decay":
+        run_time = run_time_budget(template, t_top_um, t_bot_um)["run_time"]
+    elif template["run_time_policy"] == "transit":
+        run_time = ((refl_monitor_z + template["pml_gap"]) * template["n_si"] / td.C_0) * template["run_time_factor"]
+    else:
+        raise ValueError(f"Unknown run time policy '{template['run_time_policy']}'")
+    return {
+        "boxes": [((t_bot_um / 2), t_bot_um),
+                  (t_bot_um + si / 2, si),
+                  (z_top_layer_bot + t_top_um / 2, t_top_um)],
+        "source_z": source_z,
+        "refl_monitor_z": refl_monitor_z,
+        "size_z": z_max - z_min,
+        "center_z": (z_max + z_min) / 2,
+        "run_time": run_time,
+    }
+
+
+def _sources(template, source_z):
+    """ The downward GaussianBeam(s) of the template's polarization, centered at source_z. """
+    width = template["structure_width"]
+    freq0, fwidth = pulse_width(template["wavelengths"])
+    if template["polarization"] == "circular":
+        # Two orthogonal beams with a 90-deg phase shift
+        beams = [(0, 0, "beam_x"), (np.pi/2, np.pi/2, "beam_y")]
+    elif template["polarization"] == "linear":
+        beams = [(0, 0, None)]
+    elif template["polarization"] == "linear_y":
+        beams = [(0, np.pi/2, None)]
+    else:
+        raise ValueError(f"Unknown polarization '{template['polarization']}'")
+    return [td.GaussianBeam(center=(0.0, 0.0, source_z), size=(width, width, 0),
+                           source_time=td.GaussianPulse(freq0=freq0, fwidth=fwidth, phase=phase),
+                           direction="-", waist_radius=template["waist_radius"],
+                           waist_distance=0, pol_angle=pol_angle, name=name)
+            for phase, pol_angle, name in beams]
+
+
+def _full_simulation(template, t_top_um, t_bot_um):
+    """ The SiN/Si/SiN stack built from scratch, exactly as the job scripts used to do it. """
+    width = template["structure_width"]
+    layout = _layout(template, t_top_um, t_bot_um)
+    media = [td.Medium(permittivity=template["n_sin_bot"]**2),
+             td.Medium(permittivity=template["n_si"]**2),
+             td.Medium(permittivity=template["n_sin_top"]**2)]
+    names = ["SiN Bottom", "Si Substrate", "SiN Top"]
+    structures = [td.Structure(geometry=td.Box(size=(width, width, thickness), center=(0.0, 0.0, z)),
+                               medium=medium, name=name)
+                  for (z, thickness), medium, name in zip(layout["boxes"], media, names)]
+
+    freqs = td.C_0 / np.asarray(template["wavelengths"])
+    sources = _sources(template, layout["source_z"])
+
+    monitors = [
+        td.FluxMonitor(center=(0.0, 0.0, 0.0), size=(width, width, 0), freqs=freqs, name="T"),
+        td.FluxMonitor(center=(0.0, 0.0, layout["refl_monitor_z"]), size=(width, width, 0), freqs=freqs, name="R"),
+        td.FieldMonitor(center=(0.0, 0.0, layout["source_z"]), size=(0, 0, 0),
+                        freqs=td.C_0 / np.asarray(template["norm_wavelengths"]), name="Source_Normalization"),
+    ]
+
+    domain = template["domain_width"]
+    return td.Simulation(
+        size=(domain, domain, layout["size_z"]),
+        center=(0.0, 0.0, layout["center_z"]),
+        boundary_spec=td.BoundarySpec(x=td.Boundary.periodic(), y=td.Boundary.periodic(), z=td.Boundary.pml()),
+        grid_spec=td.GridSpec.auto(wavelength=np.max(template["wavelengths"])),
+        structures=structures,
+        sources=sources,
+        monitors=monitors,
+        run_time=layout["run_time"],
+        shutoff=template["shutoff"],
+        symmetry=template["symmetry"]
+    )
+
+
+# --- 3. TEMPLATE ---
+def auto_symmetry(sim, polarization):
+    """
+    Symmetry planes the simulation allows: the domain, every layer and every source must be
+    centered on x = y = 0 (and the layers laterally uniform boxes), otherwise none.
+    :return: (x, y, z) symmetry tuple for Simulation.symmetry
+    """
+    symmetry = POLARIZATION_SYMMETRY.get(polarization, (0, 0, 0))
+    centered = [sim.center] + [structure.geometry.center for structure in sim.structures] + \
+               [source.center for source in sim.sources]
+    boxes = all(isinstance(structure.geometry, td.Box) for structure in sim.structures)
+    if not boxes or any(abs(c[0]) > 1e-9 or abs(c[1]) > 1e-9 for c in centered):
+        return (0, 0, 0)
+    return symmetry
+
+
+def stack_template(n_sin_top, n_sin_bot, polarization="linear", nominal=(0.1, 0.1),
+                   wavelengths=WAVELENGTHS, norm_wavelengths=NORM_WAVELENGTHS, n_si=N_SI,
+                   si_thickness=SI_THICKNESS, waist_radius=WAIST_RADIUS, structure_width=STRUCTURE_WIDTH,
+                   domain_width=DOMAIN_WIDTH, source_gap=SOURCE_GAP, monitor_gap=MONITOR_GAP,
+                   pml_gap=PML_GAP, run_time_policy=RUN_TIME_POLICY, run_time_margin=RUN_TIME_MARGIN,
+                   run_time_factor=RUN_TIME_FACTOR, shutoff=SHUTOFF, symmetry=SYMMETRY):
+    """
+    Builds and validates the stack once at the nominal (top, bottom) SiN thickness in um.
+    Media, pulses, boundary and grid specs and every other invariant part are reused by
+    all variants derived with build_stack.
+    :param polarization: 'linear' (one x-polarized beam), 'linear_y' (one y-polarized beam) or
+                         'circular' (x and y beams, 90 deg apart)
+    :param run_time_policy: 'decay' (run_time_budget) or 'transit' (run_time_factor x domain transit time)
+    :param symmetry: 'auto' (auto_symmetry) or an explicit (x, y, z) tuple; (0, 0, 0) for none
+    :return: dict that build_stack / build_stacks take; plain data, so it can be sent to workers
+    """
+    template = {"n_sin_top": n_sin_top, "n_sin_bot": n_sin_bot, "polarization": polarization,
+                "wavelengths": np.asarray(wavelengths), "norm_wavelengths": np.asarray(norm_wavelengths),
+                "n_si": n_si, "si_thickness": si_thickness, "waist_radius": waist_radius,
+                "structure_width": structure_width, "domain_width": domain_width,
+                "source_gap": source_gap, "monitor_gap": monitor_gap, "pml_gap": pml_gap,
+                "run_time_policy": run_time_policy, "run_time_margin": run_time_margin,
+                "run_time_factor": run_time_factor, "shutoff": shutoff}
+    template["symmetry"] = (0, 0, 0) if isinstance(symmetry, str) else tuple(symmetry)
+    base = _full_simulation(template, *nominal)
+    if isinstance(symmetry, str):
+        template["symmetry"] = auto_symmetry(base, polarization)
+        base = base.copy(update={"symmetry": template["symmetry"]})
+    template["base"] = base
+    return template
+
+
+def _derive(component, validate=False, **fields):
+    if _FAST_COPY:
+        return component.copy(deep=False, validate=validate, update=fields)
+    # Older tidy3d versions validate every copy
+    return component.copy(update=fields)
+
+
+def build_stack(template, t_top_um, t_bot_um, validate=False):
+    """
+    The stack at the given thicknesses, derived from the template by moving only the
+    layers, source, reflection monitor and domain. Gives the same simulation (and the
+    same Simulation_Cache hash) as building it from scratch.
+    :param validate: Run the full tidy3d validation on the result; without it a variant
+                     takes well under a millisecond instead of tens of milliseconds
+    """
+    base = template["base"]
+    width = template["structure_width"]
+    layout = _layout(template, t_top_um, t_bot_um)
+    structures = [_derive(structure, geometry=td.Box(size=(width, width, thickness), center=(0.0, 0.0, z)))
+                  for structure, (z, thickness) in zip(base.structures, layout["boxes"])]
+    sources = [_derive(source, center=(0.0, 0.0, layout["source_z"])) for source in base.sources]
+    t_monitor, r_monitor, source_monitor = base.monitors
+    monitors = [t_monitor,
+                _derive(r_monitor, center=(0.0, 0.0, layout["refl_monitor_z"])),
+                _derive(source_monitor, center=(0.0, 0.0, layout["source_z"]))]
+    return _derive(base, validate=validate,
+                   size=(base.size[0], base.size[1], layout["size_z"]),
+                   center=(0.0, 0.0, layout["center_z"]),
+                   structures=tuple(structures), sources=tuple(sources), monitors=tuple(monitors),
+                   run_time=layout["run_time"])
+
+
+def _build_chunk(template, pairs, validate):
+    return [build_stack(template, t_top, t_bot, validate) for t_top, t_bot in pairs]
+
+
+def build_stacks(template, thickness_pairs, max_workers=1, validate=False, chunk_size=CHUNK_SIZE):
+    """
+    Variants for a list of (top, bottom) thicknesses in um, in the same order.
+    The thinnest and thickest stacks are always validated in full, so a DOE that runs
+    outside the domain or grid limits still fails before anything is submitted.
+    Worker processes only pay off with validate=True; call this under __main__.
+    """
+    pairs = [(float(t_top), float(t_bot)) for t_top, t_bot in thickness_pairs]
+    if not pairs:
+        return []
+    totals = [t_top + t_bot for t_top, t_bot in pairs]
+    for i in {int(np.argmin(totals)), int(np.argmax(totals))}:
+        build_stack(template, *pairs[i], validate=True)
+
+    if max_workers <= 1 or len(pairs) <= chunk_size:
+        return _build_chunk(template, pairs, validate)
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        results = pool.map(_build_chunk, [template] * len(chunks), chunks, [validate] * len(chunks))
+        return [sim for chunk in results for sim in chunk]
+
+
+# --- 4. SEMI-INFINITE SUBSTRATE ---
+# The 5 um slab is most of the domain and, with its ring-down, most of the run time, but it
+# does not change across the DOE. Each coated face is simulated on its own against
+# semi-infinite Si, and the slab is added back by intensity (Substrate_Recombination.py).
+# A lossless face has the same T and R from either side, so the bottom face is also lit from air.
+def face_run_time(template, t_um):
+    """
+    Run time of one face: the source pulse plus one pass down to the T monitor in the Si
+    and back up to the R monitor, times run_time_margin. Nothing rings down in a
+    semi-infinite substrate. The "transit" policy keeps run_time_factor x the domain transit time.
+    """
+    if template["run_time_policy"] == "transit":
+        size_z = t_um + template["source_gap"] + template["monitor_gap"] + template["si_depth"] + \
+                 2 * template["pml_gap"]
+        return (size_z * template["n_si"] / td.C_0) * template["run_time_factor"]
+    if template["run_time_policy"] != "decay":
+        raise ValueError(f"Unknown run time policy '{template['run_time_policy']}'")
+    _, fwidth = pulse_width(template["wavelengths"])
+    pulse = float(2 * 5 / (2 * np.pi * fwidth))
+    transit = (2 * (template["source_gap"] + template["n_sin"] * t_um) + template["monitor_gap"]
+               + template["n_si"] * template["si_depth"]) / td.C_0
+    return template["run_time_margin"] * (pulse + transit)
+
+
+def _face_layout(template, t_um):
+    """ z positions of the thickness-dependent parts of one face (the Si surface is at z = 0). """
+    source_z = t_um + template["source_gap"]
+    refl_monitor_z = source_z + template["monitor_gap"]
+    z_min, z_max = -template["si_depth"] - template["pml_gap"], refl_monitor_z + template["pml_gap"]
+    return {"box": (t_um / 2, t_um), "source_z": source_z, "refl_monitor_z": refl_monitor_z,
+            "size_z": z_max - z_min, "center_z": (z_max + z_min) / 2,
+            "run_time": face_run_time(template, t_um)}
+
+
+def _face_simulation(template, t_um):
+    """ Air / SiN / semi-infinite Si, with T measured si_depth into the Si. """
+    width = template["structure_width"]
+    layout = _face_layout(template, t_um)
+    si_bottom = -template["si_depth"] - template["pml_gap"] - SI_OVERHANG
+    z, thickness = layout["box"]
+    structures = [td.Structure(geometry=td.Box(size=(width, width, -si_bottom), center=(0.0, 0.0, si_bottom / 2)),
+                               medium=td.Medium(permittivity=template["n_si"]**2), name="Si Substrate"),
+                  td.Structure(geometry=td.Box(size=(width, width, thickness), center=(0.0, 0.0, z)),
+                               medium=td.Medium(permittivity=template["n_sin"]**2), name="SiN")]
+
+    freqs = td.C_0 / np.asarray(template["wavelengths"])
+    monitors = [
+        td.FluxMonitor(center=(0.0, 0.0, -template["si_depth"]), size=(width, width, 0), freqs=freqs, name="T"),
+        td.FluxMonitor(center=(0.0, 0.0, layout["refl_monitor_z"]), size=(width, width, 0), freqs=freqs, name="R"),
+        td.FieldMonitor(center=(0.0, 0.0, layout["source_z"]), size=(0, 0, 0),
+                        freqs=td.C_0 / np.asarray(template["norm_wavelengths"]), name="Source_Normalization"),
+    ]
+
+    domain = template["domain_width"]
+    return td.Simulation(
+        size=(domain, domain, layout["size_z"]),
+        center=(0.0, 0.0, layout["center_z"]),
+        boundary_spec=td.BoundarySpec(x=td.Boundary.periodic(), y=td.Boundary.periodic(), z=td.Boundary.pml()),
+        grid_spec=td.GridSpec.auto(wavelength=np.max(template["wavelengths"])),
+        structures=structures,
+        sources=_sources(template, layout["source_z"]),
+        monitors=monitors,
+        run_time=layout["run_time"],
+        shutoff=template["shutoff"],
+        symmetry=template["symmetry"]
+    )
+
+
+def face_template(n_sin, polarization="linear", nominal=0.1, wavelengths=WAVELENGTHS,
+                  norm_wavelengths=NORM_WAVELENGTHS, n_si=N_SI, si_depth=SI_DEPTH, waist_radius=WAIST_RADIUS,
+                  structure_width=STRUCTURE_WIDTH, domain_width=DOMAIN_WIDTH, source_gap=SOURCE_GAP,
+                  monitor_gap=MONITOR_GAP, pml_gap=PML_GAP, run_time_policy=RUN_TIME_POLICY,
+                  run_time_margin=RUN_TIME_MARGIN, run_time_factor=RUN_TIME_FACTOR, shutoff=SHUTOFF,
+                  symmetry=SYMMETRY):
+    """
+    Like stack_template, for one SiN face on semi-infinite Si at the nominal SiN thickness in um.
+    :param si_depth: Depth of the T monitor below the Si surface (um)
+    :return: dict that build_face / build_faces take
+    """
+    template = {"n_sin": n_sin, "substrate": "semi_infinite", "polarization": polarization,
+                "wavelengths": np.asarray(wavelengths), "norm_wavelengths": np.asarray(norm_wavelengths),
+                "n_si": n_si, "si_depth": si_depth, "waist_radius": waist_radius,
+                "structure_width": structure_width, "domain_width": domain_width,
+                "source_gap": source_gap, "monitor_gap": monitor_gap, "pml_gap": pml_gap,
+                "run_time_policy": run_time_policy, "run_time_margin": run_time_margin,
+                "run_time_factor": run_time_factor, "shutoff": shutoff}
+    template["symmetry"] = (0, 0, 0) if isinstance(symmetry, str) else tuple(symmetry)
+    base = _face_simulation(template, nominal)
+    if isinstance(symmetry, str):
+        template["symmetry"] = auto_symmetry(base, polarization)
+        base = base.copy(update={"symmetry": template["symmetry"]})
+    template["base"] = base
+    return template
+
+
+def build_face(template, t_um, validate=False):
+    """ The face at the given SiN thickness in um; same result as building it from scratch. """
+    base = template["base"]
+    width = template["structure_width"]
+    layout = _face_layout(template, t_um)
+    z, thickness = layout["box"]
+    si, sin = base.structures
+    structures = (si, _derive(sin, geometry=td.Box(size=(width, width, thickness), center=(0.0, 0.0, z))))
+    sources = [_derive(source, center=(0.0, 0.0, layout["source_z"])) for source in base.sources]
+    t_monitor, r_monitor, source_monitor = base.monitors
+    monitors = [t_monitor,
+                _derive(r_monitor, center=(0.0, 0.0, layout["refl_monitor_z"])),
+                _derive(source_monitor, center=(0.0, 0.0, layout["source_z"]))]
+    return _derive(base, validate=validate,
+                   size=(base.size[0], base.size[1], layout["size_z"]),
+                   center=(0.0, 0.0, layout["center_z"]),
+                   structures=structures, sources=tuple(sources), monitors=tuple(monitors),
+                   run_time=layout["run_time"])
+
+
+def build_faces(template, thicknesses, validate=False):
+    """ Faces for a list of SiN thicknesses in um, in the same order; the thinnest and thickest are validated in full. """
+    thicknesses = [float(t) for t in thicknesses]
+    if not thicknesses:
+        return []
+    for t in {min(thicknesses), max(thicknesses)}:
+        build_face(template, t, validate=True)
+    return [build_face(template, t, validate) for t in thicknesses]
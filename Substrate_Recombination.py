@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+import os
+import time
+from Stack_Template import build_faces
+from Spectra_Extraction import read_task_file, T_MONITOR, R_MONITOR
+from Task_Registry import campaign_tasks, COL_TASK_ID, COL_TASK_NAME
+from Transfer_Matrix_Prescreen import incoherent_rt
+from Compact_Task_Files import write_flux_archive
+
+# --- 1. CONFIGURATION ---
+# Task listing and download folder of the face runs (a job script with SUBSTRATE = "semi_infinite")
+FACE_LISTING = r"C:\Users\ssatter\Documents\Midnight\ARC_SiN_Multi_Index_DOE_faces.xlsx"
+FACE_DIR = r"C:\Users\ssatter\Documents\Midnight\ARC_SiN_Multi_Index_DOE_faces_tasks"
+DOE_FILE = r"C:\Users\ssatter\Documents\Midnight\QWL_optimized_SiN_thickness_DOE.xlsx"
+
+# One flux-only task file per design (Compact_Task_Files.py format) and a task listing, so the
+# analysis scripts read the recombined campaign like any other
+OUTPUT_DIR = r"C:\Users\ssatter\Documents\Midnight\ARC_SiN_Multi_Index_DOE_incoherent_tasks"
+OUTPUT_LISTING = r"C:\Users\ssatter\Documents\Midnight\ARC_SiN_Multi_Index_DOE_incoherent.xlsx"
+
+# True when the top and bottom SiN are the same film, so one set of faces serves both sides
+# (the job script then passes the same template twice)
+SHARED_FACES = False
+
+# Face task names, e.g. 'Face_T750' (top) and 'Face_B1200' (bottom); 'Face_750' when shared
+FACE_PREFIX = {"top": "Face_T", "bot": "Face_B", "shared": "Face_"}
+
+
+# --- 2. FACE RUNS ---
+def face_names(sin_t_A, sin_b_A, shared=SHARED_FACES):
+    """ (top, bottom) face task names of one design, thicknesses in Angstrom. """
+    if shared:
+        return f"{FACE_PREFIX['shared']}{int(sin_t_A)}", f"{FACE_PREFIX['shared']}{int(sin_b_A)}"
+    return f"{FACE_PREFIX['top']}{int(sin_t_A)}", f"{FACE_PREFIX['bot']}{int(sin_b_A)}"
+
+
+def face_simulations(top_template, bot_template, pairs_A, to_um=1e-4, validate=False):
+    """
+    One simulation per distinct thickness of each face instead of one per design: an N x M
+    DOE grid needs N + M runs. Passing the same template twice shares the faces between sides.
+    :param pairs_A: (SiN_T, SiN_B) thicknesses in Angstrom
+    :return: {face task name: td.Simulation}
+    """
+    shared = top_template is bot_template
+    pairs_A = [(int(t), int(b)) for t, b in pairs_A]
+    if shared:
+        sides = [(top_template, sorted({t for pair in pairs_A for t in pair}), FACE_PREFIX["shared"])]
+    else:
+        sides = [(top_template, sorted({t for t, _ in pairs_A}), FACE_PREFIX["top"]),
+                 (bot_template, sorted({b for _, b in pairs_A}), FACE_PREFIX["bot"])]
+    sims = {}
+    for template, thicknesses, prefix in sides:
+        sims.update(zip([f"{prefix}{t}" for t in thicknesses],
+                        build_faces(template, [t * to_um for t in thicknesses], validate=validate)))
+    return sims
+
+
+# --- 3. RECOMBINATION ---
+def recombine(top_file, bot_file):
+    """
+    T and R of the full wafer from the task files of its two faces: the light inside the Si
+    bounces between them and is added up by intensity (Transfer_Matrix_Prescreen.incoherent_rt),
+    i.e. the Si thickness fringes are averaged out as in a real wafer.
+    :return: (freqs, T, R) as float arrays, T and R as fractions of the 1 W source
+    """
+    freqs, t_top, r_top = read_task_file(top_file)
+    bot_freqs, t_bot, r_bot = read_task_file(bot_file)
+    if not np.allclose(freqs, bot_freqs):
+        raise ValueError("the two faces were run at different frequencies")
+    T, R = incoherent_rt(t_top, r_top, t_bot, r_bot)
+    return np.asarray(freqs, dtype=float), T, R
+
+
+def write_recombined(path, freqs, T, R, provenance):
+    """
+    Writes T and R to path as a flux-only task file (Compact_Task_Files.write_flux_archive),
+    with the face task IDs in the root attributes.
+    """
+    fluxes = {T_MONITOR: ("data/0", T, freqs), R_MONITOR: ("data/1", R, freqs)}
+    write_flux_archive(path, fluxes, attrs={"substrate": "incoherent", **provenance})
+
+
+def recombine_campaign(doe_df, face_tasks, face_dir, output_dir, shared=SHARED_FACES):
+    """
+    Recombines every design of the DOE whose two faces are in face_dir.
+    :param face_tasks: Face task listing indexed by Task ID with 'Task Name', 'Status' and 'Created'
+                       (Task_Registry.campaign_tasks)
+    :return: (listing DataFrame with 'Task Name', 'Task ID', 'Status', 'Created',
+              list of (design name, message) for designs that could not be recombined)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    # The most recent successful run of a face wins
+    done = face_tasks[face_tasks["Status"] == "success"].sort_values("Created", kind="stable")
+    face_ids = {name: task_id for task_id, name in done[COL_TASK_NAME].astype(str).items()}
+    rows, errors = [], []
+    for idx, row in doe_df.iterrows():
+        design = f"Run_{idx}_T{int(row['SiN_T'])}_B{int(row['SiN_B'])}"
+        names = face_names(row['SiN_T'], row['SiN_B'], shared)
+        missing = [name for name in names if name not in face_ids]
+        if missing:
+            errors.append((design, f"no successful run of {', '.join(missing)}"))
+            continue
+        top_id, bot_id = (face_ids[name] for name in names)
+        try:
+            freqs, T, R = recombine(os.path.join(face_dir, f"{top_id}.hdf5"),
+                                    os.path.join(face_dir, f"{bot_id}.hdf5"))
+            task_id = f"incoherent-{top_id}-{bot_id}"
+            write_recombined(os.path.join(output_dir, f"{task_id}.hdf5"), freqs, T, R,
+                             {"source_name": design, "top_face_task_id": top_id, "bot_face_task_id": bot_id})
+            rows.append({COL_TASK_NAME: design, COL_TASK_ID: task_id, "Status": "success",
+                         "Created": time.strftime("%Y-%m-%d %H:%M:%S")})
+        except Exception as e:
+            errors.append((design, f"{type(e).__name__}: {e}"))
+    return pd.DataFrame(rows, columns=[COL_TASK_NAME, COL_TASK_ID, "Status", "Created"]), errors
+
+
+if __name__ == "__main__":
+    # --- 4. RECOMBINE THE DOE ---
+    doe_df = pd.read_excel(DOE_FILE)
+    face_tasks = campaign_tasks(FACE_LISTING)
+    listing, errors = recombine_campaign(doe_df, face_tasks, FACE_DIR, OUTPUT_DIR)
+    listing.to_excel(OUTPUT_LISTING, index=False)
+
+    print("\n" + "="*40)
+    print(f"INCOHERENT SUBSTRATE: {len(listing)} of {len(doe_df)} designs recombined "
+          f"from {len(face_tasks)} face runs")
+    for design, message in errors[:10]:
+        print(f"  [!] {design}: {message}")
+    if len(errors) > 10:
+        print(f"  ... and {len(errors) - 10} more")
+    print(f"Task files saved to: {OUTPUT_DIR}")
+    print(f"Task listing saved to: {OUTPUT_LISTING}")
+    print("="*40)
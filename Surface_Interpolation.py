@@ -0,0 +1,99 @@
+import numpy as np
+from scipy.spatial import Delaunay, QhullError
+from scipy.interpolate import CloughTocher2DInterpolator, LinearNDInterpolator, NearestNDInterpolator
+
+# --- 1. CONFIGURATION ---
+# (method, points per axis) of every surface the 3D scripts draw:
+# cubic for the static matplotlib figure, linear for the interactive plotly figure
+SURFACE_RESOLUTIONS = (("cubic", 100), ("linear", 50))
+
+
+# --- 2. SHARED TRIANGULATION ---
+def _mask_groups(valid):
+    """ Columns of a (points x columns) validity mask grouped by identical masks. """
+    groups = {}
+    for col in range(valid.shape[1]):
+        groups.setdefault(valid[:, col].tobytes(), []).append(col)
+    return [(valid[:, cols[0]], cols) for cols in groups.values()]
+
+
+def surface_axes(points, n):
+    """ Regular n x n grid spanning the thickness points, like the np.linspace in the old scripts. """
+    xi = np.linspace(np.nanmin(points[:, 0]), np.nanmax(points[:, 0]), n)
+    yi = np.linspace(np.nanmin(points[:, 1]), np.nanmax(points[:, 1]), n)
+    return xi, yi
+
+
+def interpolate_surfaces(points, values, resolutions=SURFACE_RESOLUTIONS):
+    """
+    Same surfaces as calling griddata once per wavelength and resolution, but the DOE points
+    are triangulated only once and every wavelength is evaluated in the same call.
+    Wavelengths with missing values at different points get one triangulation per
+    distinct set of valid points (normally there is just one).
+    :param points: (designs x 2) array of (SiN_T, SiN_B)
+    :param values: (designs x wavelengths) array, NaN where a design has no value
+    :param resolutions: Iterable of (method, points per axis); method is 'cubic', 'linear' or 'nearest'
+    :return: dict (method, n) -> (xi, yi, Z) with Z of shape (n, n, wavelengths)
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+
+    valid = np.isfinite(values) & np.all(np.isfinite(points), axis=1)[:, None]
+    used = valid.any(axis=1)
+    surfaces = {}
+    for method, n in resolutions:
+        xi, yi = surface_axes(points[used], n) if used.any() else (np.full(n, np.nan), np.full(n, np.nan))
+        surfaces[(method, n)] = (xi, yi, np.full((n, n, values.shape[1]), np.nan))
+
+    for mask, cols in _mask_groups(valid):
+        if mask.sum() < 3:
+            continue
+        group_points = points[mask]
+        group_values = values[mask][:, cols]
+        try:
+            tri = Delaunay(group_points)
+        except QhullError as e:
+            print(f"  [!] Cannot triangulate {int(mask.sum())} points: {str(e).splitlines()[0]}")
+            continue
+
+        for method, n in resolutions:
+            xi, yi, Z = surfaces[(method, n)]
+            X, Y = np.meshgrid(xi, yi)
+            if method == "cubic":
+                interpolator = CloughTocher2DInterpolator(tri, group_values)
+            elif method == "linear":
+                interpolator = LinearNDInterpolator(tri, group_values)
+            elif method == "nearest":
+                interpolator = NearestNDInterpolator(group_points, group_values)
+            else:
+                raise ValueError(f"Unknown interpolation method '{method}'")
+            Z[:, :, cols] = interpolator(X, Y).reshape(n, n, len(cols))
+    return surfaces
+
+
+def surface_interpolator(points, values, method="cubic"):
+    """
+    Callable that evaluates all columns of values at arbitrary (SiN_T, SiN_B) points,
+    e.g. millions of Monte Carlo samples, on one triangulation of the DOE points.
+    Designs with a missing value in any column are left out of the triangulation.
+    :return: f(query) taking an (m x 2) array and returning (m x columns); NaN outside the DOE hull
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+    ok = np.all(np.isfinite(values), axis=1) & np.all(np.isfinite(points), axis=1)
+    if ok.sum() < 3:
+        raise ValueError(f"Need at least 3 complete designs to build a surface, got {int(ok.sum())}")
+
+    tri = Delaunay(points[ok])
+    if method == "cubic":
+        interpolator = CloughTocher2DInterpolator(tri, values[ok])
+    elif method == "linear":
+        interpolator = LinearNDInterpolator(tri, values[ok])
+    else:
+        raise ValueError(f"Unknown interpolation method '{method}'")
+    return lambda query: interpolator(np.asarray(query, dtype=float)).reshape(len(query), values.shape[1])
+
@@ -0,0 +1,350 @@
+import pandas as pd
+import os
+import time
+import sqlite3
+from contextlib import closing
+
+# --- 1. CONFIGURATION ---
+# One registry shared by all campaigns, next to the simulation index
+REGISTRY_FILE = r"C:\Users\ssatter\Documents\Midnight\task_registry.sqlite"
+
+# Task listings and download folders to load into the registry (run this file directly)
+CAMPAIGNS = [
+    (r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200.xlsx",
+     r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_tasks"),
+    (r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_Circular_polar.xlsx",
+     r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_Circular_polar_tasks"),
+]
+
+# Optional Excel report of every campaign, written next to its task listing
+EXPORT_REPORTS = False
+
+COL_TASK_ID = "Task ID"
+COL_TASK_NAME = "Task Name"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    name TEXT PRIMARY KEY,
+    source_file TEXT,
+    source_size INTEGER,
+    source_mtime_ns INTEGER,
+    updated TEXT,
+    synced_ns INTEGER
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT NOT NULL,
+    campaign TEXT NOT NULL REFERENCES campaigns(name),
+    task_name TEXT,
+    status TEXT,
+    created TEXT,
+    sin_t REAL,
+    sin_b REAL,
+    file_path TEXT,
+    PRIMARY KEY (campaign, task_id)
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_campaign ON tasks (campaign, status);
+CREATE INDEX IF NOT EXISTS idx_tasks_thickness ON tasks (sin_t, sin_b);
+CREATE INDEX IF NOT EXISTS idx_tasks_task_id ON tasks (task_id);
+CREATE TABLE IF NOT EXISTS reused (
+    folder TEXT NOT NULL,
+    task_name TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    source_folder TEXT,
+    file_path TEXT,
+    PRIMARY KEY (folder, task_name)
+);
+"""
+
+# Registries from before a task could belong to several campaigns (task_id was the key)
+MIGRATE_TASKS = """
+ALTER TABLE tasks RENAME TO tasks_v1;
+DROP INDEX IF EXISTS idx_tasks_campaign;
+DROP INDEX IF EXISTS idx_tasks_thickness;
+DROP INDEX IF EXISTS idx_tasks_task_id;
+"""
+
+# Registry columns and the names the scripts use for them
+COLUMNS = {"task_id": COL_TASK_ID, "task_name": COL_TASK_NAME, "status": "Status",
+           "created": "Created", "sin_t": "SiN_T", "sin_b": "SiN_B", "file_path": "File"}
+
+
+# --- 2. CONNECTION ---
+def connect(registry_file=REGISTRY_FILE):
+    """ Opens (and if needed creates) the registry. """
+    folder = os.path.dirname(registry_file)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    con = sqlite3.connect(registry_file, timeout=30)
+    con.executescript(SCHEMA)
+    if [row[1] for row in con.execute("PRAGMA table_info(tasks)") if row[5]] == ["task_id"]:
+        columns = ", ".join(COLUMNS) + ", campaign"
+        con.executescript(MIGRATE_TASKS + SCHEMA + f"INSERT INTO tasks ({columns}) "
+                          f"SELECT {columns} FROM tasks_v1; DROP TABLE tasks_v1;")
+    # Registries written before the sync time was recorded
+    if "synced_ns" not in {row[1] for row in con.execute("PRAGMA table_info(campaigns)")}:
+        con.execute("ALTER TABLE campaigns ADD COLUMN synced_ns INTEGER")
+    return con
+
+
+def campaign_name(listing_file):
+    """ Campaigns are named after their task listing, e.g. 'ARC_..._750to1200'. """
+    return os.path.splitext(os.path.basename(listing_file))[0]
+
+
+def parse_thickness(names):
+    """
+    Vectorized SiN_T/SiN_B parse of task or run names like 'Run_3_T750_B1200'.
+    Only the '_T<top>_B<bottom>' part the job scripts write is matched, so a 'T' or 'B'
+    followed by digits elsewhere in the name is not taken for a thickness.
+    :return: DataFrame with float columns 'SiN_T' and 'SiN_B' (NaN where a name has no match)
+    """
+    names = pd.Series(names).astype(str)
+    parsed = names.str.extract(r'_T(\d+)_B(\d+)')
+    return pd.DataFrame({"SiN_T": pd.to_numeric(parsed[0], errors='coerce'),
+                         "SiN_B": pd.to_numeric(parsed[1], errors='coerce')},
+                        index=names.index)
+
+
+# --- 3. WRITING ---
+def _touch_campaign(con, campaign):
+    con.execute("INSERT INTO campaigns (name, updated) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET updated = excluded.updated",
+                (campaign, time.strftime("%Y-%m-%d %H:%M:%S")))
+
+
+def upsert_tasks(con, campaign, df):
+    """
+    Adds or updates tasks from a listing with 'Task ID' and 'Task Name' and optionally
+    'Status', 'Created', 'SiN_T', 'SiN_B' and 'File'. Missing thicknesses are parsed from
+    the task names once here, so readers never have to. Columns the listing does not
+    have keep their registry value. A task may be in several campaigns (reused results).
+    """
+    df = df.copy()
+    df[COL_TASK_ID] = df[COL_TASK_ID].astype(str).str.strip()
+    df = df.drop_duplicates(subset=COL_TASK_ID, keep='last')
+    if 'SiN_T' not in df.columns or 'SiN_B' not in df.columns:
+        df[['SiN_T', 'SiN_B']] = parse_thickness(df[COL_TASK_NAME]).to_numpy()
+
+    rows = []
+    for rec in df.to_dict("records"):
+        row = [campaign]
+        for column in COLUMNS.values():
+            value = rec.get(column)
+            if value is None or (not isinstance(value, str) and pd.isna(value)):
+                row.append(None)
+            else:
+                row.append(float(value) if column in ("SiN_T", "SiN_B") else str(value).strip())
+        rows.append(row)
+
+    _touch_campaign(con, campaign)
+    con.executemany(
+        "INSERT INTO tasks (campaign, task_id, task_name, status, created, sin_t, sin_b, file_path) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(campaign, task_id) DO UPDATE SET "
+        "task_name = COALESCE(excluded.task_name, task_name), "
+        "status = COALESCE(excluded.status, status), created = COALESCE(excluded.created, created), "
+        "sin_t = COALESCE(excluded.sin_t, sin_t), sin_b = COALESCE(excluded.sin_b, sin_b), "
+        "file_path = COALESCE(excluded.file_path, file_path)", rows)
+    con.commit()
+    return len(rows)
+
+
+def replace_tasks(con, campaign, df, synced=False):
+    """
+    Makes df the campaign's task set: its tasks are upserted (see upsert_tasks) and the
+    campaign's tasks that are not in it are dropped.
+    :param synced: df is a live listing of the cloud folder (List_TaskIDs.py); its time is
+                   recorded so an older Excel listing never replaces it (see import_listing)
+    :return: Number of tasks in df
+    """
+    n = upsert_tasks(con, campaign, df)
+    keep = set(df[COL_TASK_ID].astype(str).str.strip())
+    stale = [tid for (tid,) in con.execute("SELECT task_id FROM tasks WHERE campaign = ?", (campaign,))
+             if tid not in keep]
+    con.executemany("DELETE FROM tasks WHERE campaign = ? AND task_id = ?", [(campaign, tid) for tid in stale])
+    if synced:
+        con.execute("UPDATE campaigns SET synced_ns = ? WHERE name = ?", (time.time_ns(), campaign))
+    con.commit()
+    return n
+
+
+def registered(con, campaign):
+    return con.execute("SELECT 1 FROM campaigns WHERE name = ?", (campaign,)).fetchone() is not None
+
+
+def mark_source(con, campaign, listing_file):
+    """ Records the size and mtime of the Excel listing the campaign is in sync with. """
+    st = os.stat(listing_file)
+    _touch_campaign(con, campaign)
+    con.execute("UPDATE campaigns SET source_file = ?, source_size = ?, source_mtime_ns = ? WHERE name = ?",
+                (listing_file, st.st_size, st.st_mtime_ns, campaign))
+    con.commit()
+
+
+def record_reused(con, folder, reused_df):
+    """
+    Remembers the designs a job took from earlier campaigns instead of submitting them to
+    its cloud folder (Simulation_Cache.partition_simulations), so the folder's listing
+    (reused_tasks) includes them. Duplicates within the DOE have no Task ID and are left out.
+    :param reused_df: DataFrame with 'Task Name', 'Task ID', 'Folder' and 'HDF5'
+    :return: Number of designs recorded
+    """
+    rows = []
+    for rec in reused_df.to_dict("records"):
+        if rec.get("Task ID") is None or pd.isna(rec.get("Task ID")):
+            continue
+        rows.append((folder, str(rec["Task Name"]), str(rec["Task ID"]).strip(),
+                     *(None if pd.isna(rec.get(key)) else str(rec[key]) for key in ("Folder", "HDF5"))))
+    con.executemany(
+        "INSERT INTO reused (folder, task_name, task_id, source_folder, file_path) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(folder, task_name) DO UPDATE SET task_id = excluded.task_id, "
+        "source_folder = excluded.source_folder, file_path = excluded.file_path", rows)
+    con.commit()
+    return len(rows)
+
+
+def reused_tasks(con, folder):
+    """
+    Designs of a cloud folder that reuse an earlier task's result (see record_reused), in the
+    layout of a task listing. Status and creation time are the original task's where the
+    registry has them; a reused result with a downloaded file counts as 'success'.
+    :return: DataFrame with 'Task Name', 'Task ID', 'Status' and 'Created'
+    """
+    rows = con.execute(
+        "SELECT r.task_name, r.task_id, "
+        "COALESCE((SELECT t.status FROM tasks t WHERE t.task_id = r.task_id AND t.status IS NOT NULL), "
+        "CASE WHEN r.file_path IS NOT NULL THEN 'success' END), "
+        "(SELECT t.created FROM tasks t WHERE t.task_id = r.task_id AND t.created IS NOT NULL) "
+        "FROM reused r WHERE r.folder = ? ORDER BY r.rowid", (folder,)).fetchall()
+    return pd.DataFrame(rows, columns=[COL_TASK_NAME, COL_TASK_ID, "Status", "Created"])
+
+
+def import_listing(con, listing_file, campaign=None):
+    """
+    Loads an Excel task listing into the registry. The listing replaces the campaign's
+    tasks: rows that are no longer in it are dropped, file paths of kept tasks are kept.
+    A listing last written before the campaign's latest cloud sync is older than the
+    registry and is left out, so it never drops tasks the sync found.
+    :return: Number of tasks in the listing, or None when it was left out
+    """
+    campaign = campaign or campaign_name(listing_file)
+    synced = con.execute("SELECT synced_ns FROM campaigns WHERE name = ?", (campaign,)).fetchone()
+    if synced is not None and synced[0] is not None and os.stat(listing_file).st_mtime_ns < synced[0]:
+        return None
+    n = replace_tasks(con, campaign, pd.read_excel(listing_file))
+    mark_source(con, campaign, listing_file)
+    return n
+
+
+def register_files(con, campaign, cache_dir, suffix=".hdf5"):
+    """ Stores the path of every downloaded task file of the campaign. :return: Number of files found """
+    found = []
+    for (tid,) in con.execute("SELECT task_id FROM tasks WHERE campaign = ?", (campaign,)).fetchall():
+        path = os.path.join(cache_dir, f"{tid}{suffix}")
+        if os.path.exists(path):
+            found.append((path, campaign, tid))
+    con.executemany("UPDATE tasks SET file_path = ? WHERE campaign = ? AND task_id = ?", found)
+    con.commit()
+    return len(found)
+
+
+# --- 4. QUERIES ---
+def query_tasks(con, campaign=None, status=None, sin_t=None, sin_b=None, task_ids=None):
+    """
+    Filtered lookup on the indexed columns.
+    :param status: Status or list of statuses
+    :param sin_t: (min, max) top SiN thickness in Angstrom, either end may be None
+    :param sin_b: (min, max) bottom SiN thickness in Angstrom
+    :param task_ids: Only these Task IDs
+    :return: DataFrame indexed by 'Task ID' with 'Task Name', 'Status', 'Created', 'SiN_T', 'SiN_B', 'File'
+    """
+    where, params = [], []
+    if campaign is not None:
+        where.append("campaign = ?")
+        params.append(campaign)
+    if status is not None:
+        status = [status] if isinstance(status, str) else list(status)
+        where.append(f"status IN ({', '.join('?' * len(status))})")
+        params += status
+    for column, bounds in (("sin_t", sin_t), ("sin_b", sin_b)):
+        if bounds is not None:
+            lo, hi = bounds
+            if lo is not None:
+                where.append(f"{column} >= ?")
+                params.append(lo)
+            if hi is not None:
+                where.append(f"{column} <= ?")
+                params.append(hi)
+
+    sql = f"SELECT {', '.join(COLUMNS)} FROM tasks" + (f" WHERE {' AND '.join(where)}" if where else "")
+    if task_ids is None:
+        df = pd.read_sql_query(sql + " ORDER BY rowid", con, params=params)
+    else:
+        # SQLite limits the number of parameters per statement, so long ID lists go in slices
+        task_ids = list(dict.fromkeys(str(tid).strip() for tid in task_ids))
+        joiner = " AND " if where else " WHERE "
+        parts = [pd.read_sql_query(sql + f"{joiner}task_id IN ({', '.join('?' * len(part))})",
+                                   con, params=params + part)
+                 for part in (task_ids[i:i + 500] for i in range(0, len(task_ids), 500))]
+        df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=list(COLUMNS))
+    return df.rename(columns=COLUMNS).set_index(COL_TASK_ID)
+
+
+def campaign_tasks(listing_file, registry_file=REGISTRY_FILE, **filters):
+    """
+    Tasks of the campaign named after listing_file, read from the registry.
+    The Excel listing is only read when it is newer than what the registry holds (or the
+    campaign is not registered yet); without the Excel file the registry alone is used.
+    :param registry_file: Registry read and, when the listing is (re)imported, written to;
+                          benchmarks and tests pass a path of their own
+    :param filters: Passed on to query_tasks (status, sin_t, sin_b, task_ids)
+    """
+    campaign = campaign_name(listing_file)
+    with closing(connect(registry_file)) as con:
+        known = con.execute("SELECT source_size, source_mtime_ns FROM campaigns WHERE name = ?",
+                            (campaign,)).fetchone()
+        if os.path.exists(listing_file):
+            st = os.stat(listing_file)
+            if known is None or tuple(known) != (st.st_size, st.st_mtime_ns):
+                n = import_listing(con, listing_file, campaign)
+                if n is None:
+                    print(f"{listing_file} is older than the last sync of {campaign}, using the registry")
+                else:
+                    print(f"Registered {n} tasks of {campaign} from {listing_file}")
+        elif known is None:
+            raise FileNotFoundError(f"{listing_file} not found and campaign '{campaign}' is not registered")
+        return query_tasks(con, campaign=campaign, **filters)
+
+
+def export_report(con, campaign, path, **filters):
+    """ Optional Excel report of a campaign in the same layout as the task listings. """
+    df = query_tasks(con, campaign=campaign, **filters).reset_index()
+    df.to_excel(path, index=False)
+    return len(df)
+
+
+if __name__ == "__main__":
+    # --- 5. LOAD CAMPAIGNS ---
+    with closing(connect()) as con:
+        for listing_file, cache_dir in CAMPAIGNS:
+            campaign = campaign_name(listing_file)
+            if os.path.exists(listing_file):
+                import_listing(con, listing_file, campaign)
+            if os.path.isdir(cache_dir):
+                register_files(con, campaign, cache_dir)
+            if EXPORT_REPORTS:
+                export_report(con, campaign, os.path.splitext(listing_file)[0] + "_registry.xlsx")
+
+        summary = pd.read_sql_query(
+            "SELECT campaign AS Campaign, COUNT(*) AS Tasks, COUNT(file_path) AS Downloaded, "
+            "SUM(sin_t IS NOT NULL AND sin_b IS NOT NULL) AS 'With Thickness' "
+            "FROM tasks GROUP BY campaign ORDER BY campaign", con)
+        statuses = pd.read_sql_query(
+            "SELECT campaign AS Campaign, COALESCE(status, 'unknown') AS Status, COUNT(*) AS Tasks "
+            "FROM tasks GROUP BY campaign, status", con)
+
+    print("\n" + "="*40)
+    print(f"TASK REGISTRY: {REGISTRY_FILE}")
+    print(summary.to_string(index=False))
+    if not statuses.empty:
+        print(statuses.pivot_table(index="Campaign", columns="Status", values="Tasks", fill_value=0).to_string())
+    print("="*40)
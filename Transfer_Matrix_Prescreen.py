@@ -0,0 +1,187 @@
+import numpy as np
+import pandas as pd
+import os
+import time
+
+# --- 1. CONFIGURATION ---
+OUTPUT_FILE = r"C:\Users\ssatter\Documents\Midnight\TMM_prescreened_SiN_thickness_DOE.xlsx"
+
+# Same stack as the job scripts (QWL_optimized_SiN23_Si_SiN1947_transmission_job.py).
+# For SiN_Si_SiN_transmission_job.py set both SiN indices to N_SIN = 1.947.
+N_SIN_TOP = 1.947
+N_SIN_BOT = 2.3
+N_SI = 3.7
+N_AMBIENT = 1.0
+SI_THICKNESS = 5.0      # um
+TO_UM = 1e-4            # DOE thicknesses are in Angstrom
+
+# "coherent": the 5 um Si slab as in the FDTD job scripts, thin-film fringes included.
+# "incoherent": each coated face on its own, combined by intensity through the Si
+# (incoherent_rt), as for a real wafer and for Stack_Template's semi-infinite substrate mode
+SUBSTRATE = "coherent"
+
+lambdas_23 = np.linspace(0.79, 0.9, 23)
+
+# Candidate grid in Angstrom (start, stop, step)
+SIN_T_RANGE = (750, 1200, 5)
+SIN_B_RANGE = (750, 1200, 5)
+
+# Selection: a design is promising if its mean T over TARGET_WL is at least T_MIN (%)
+TARGET_WL = [0.795, 0.8, 0.895]
+T_MIN = 90.0
+TOP_K = 200             # Never send more than this many designs to the cloud
+
+# Thickness pairs evaluated per NumPy block; bounds memory for very large grids
+CHUNK_SIZE = 200_000
+
+
+# --- 2. TRANSFER-MATRIX ENGINE ---
+def stack_rt(t_top_um, t_bot_um, wavelengths_um, n_top=N_SIN_TOP, n_bot=N_SIN_BOT,
+             n_si=N_SI, si_thickness=SI_THICKNESS, n_ambient=N_AMBIENT):
+    """
+    Coherent normal-incidence transfer matrix of ambient / SiN top / Si / SiN bottom / ambient,
+    matching the layer order seen by the downward GaussianBeam in make_doe_sim.
+    All array arguments broadcast against each other, so a whole DOE grid is one call.
+    :return: (T, R) as fractions (0 to 1) with the broadcast shape of the inputs
+    """
+    t_top_um, t_bot_um, wavelengths_um = np.broadcast_arrays(
+        np.asarray(t_top_um, dtype=float), np.asarray(t_bot_um, dtype=float),
+        np.asarray(wavelengths_um, dtype=float))
+    k0 = 2 * np.pi / wavelengths_um
+
+    # Running product of the 2x2 characteristic matrices, kept as four element arrays
+    m11 = np.ones(t_top_um.shape, dtype=complex)
+    m12 = np.zeros(t_top_um.shape, dtype=complex)
+    m21 = np.zeros(t_top_um.shape, dtype=complex)
+    m22 = np.ones(t_top_um.shape, dtype=complex)
+
+    for n, d in ((n_top, t_top_um), (n_si, si_thickness), (n_bot, t_bot_um)):
+        delta = k0 * n * d
+        cos_d, sin_d = np.cos(delta), np.sin(delta)
+        a11, a12, a21, a22 = cos_d, 1j * sin_d / n, 1j * n * sin_d, cos_d
+        m11, m12, m21, m22 = (m11 * a11 + m12 * a21, m11 * a12 + m12 * a22,
+                              m21 * a11 + m22 * a21, m21 * a12 + m22 * a22)
+
+    b = m11 + m12 * n_ambient
+    c = m21 + m22 * n_ambient
+    denom = n_ambient * b + c
+    r = (n_ambient * b - c) / denom
+    t = 2 * n_ambient / denom
+    return np.abs(t) ** 2, np.abs(r) ** 2
+
+
+def coating_rt(t_coat_um, wavelengths_um, n_coat, n_substrate=N_SI, n_ambient=N_AMBIENT):
+    """
+    Normal-incidence T and R of one coated face, ambient / coating / semi-infinite substrate.
+    Lossless, so R is the same from either side; this is the reflectance light bouncing
+    inside the Si slab sees at the top or bottom SiN coating.
+    :return: (T, R) as fractions (0 to 1) with the broadcast shape of the inputs
+    """
+    t_coat_um, wavelengths_um = np.broadcast_arrays(np.asarray(t_coat_um, dtype=float),
+                                                    np.asarray(wavelengths_um, dtype=float))
+    delta = 2 * np.pi / wavelengths_um * n_coat * t_coat_um
+    r01 = (n_ambient - n_coat) / (n_ambient + n_coat)
+    r12 = (n_coat - n_substrate) / (n_coat + n_substrate)
+    phase = np.exp(-2j * delta)
+    r = (r01 + r12 * phase) / (1 + r01 * r12 * phase)
+    R = np.abs(r) ** 2
+    return 1 - R, R
+
+
+def incoherent_rt(t_top, r_top, t_bot, r_bot):
+    """
+    Intensity (not amplitude) sum of all bounces between two faces of a thick, lossless slab:
+    T = T1 T2 / (1 - R1 R2) and R = R1 + T1^2 R2 / (1 - R1 R2). Each face has the same T and R
+    from either side (lossless, reciprocal). Inputs broadcast against each other.
+    :return: (T, R)
+    """
+    t_top, r_top, t_bot, r_bot = (np.asarray(x, dtype=float) for x in (t_top, r_top, t_bot, r_bot))
+    bounce = 1 - r_top * r_bot
+    return t_top * t_bot / bounce, r_top + t_top ** 2 * r_bot / bounce
+
+
+def incoherent_stack_rt(t_top_um, t_bot_um, wavelengths_um, n_top=N_SIN_TOP, n_bot=N_SIN_BOT,
+                        n_si=N_SI, si_thickness=SI_THICKNESS, n_ambient=N_AMBIENT):
+    """
+    The same stack as stack_rt with the Si slab treated incoherently, i.e. stack_rt averaged
+    over the Si thickness fringes. si_thickness does not matter for a lossless slab; it is
+    accepted so both functions take the same arguments.
+    :return: (T, R) as fractions (0 to 1) with the broadcast shape of the inputs
+    """
+    t1, r1 = coating_rt(t_top_um, wavelengths_um, n_top, n_si, n_ambient)
+    t2, r2 = coating_rt(t_bot_um, wavelengths_um, n_bot, n_si, n_ambient)
+    return incoherent_rt(t1, r1, t2, r2)
+
+
+def prescreen_grid(sin_t_A, sin_b_A, wavelengths_um, chunk_size=CHUNK_SIZE, rt=stack_rt, **stack_kwargs):
+    """
+    Evaluates every (SiN_T, SiN_B) pair of the two 1D thickness axes (Angstrom)
+    at every wavelength.
+    :param rt: stack_rt (coherent Si slab) or incoherent_stack_rt
+    :return: (T, R) arrays of shape (len(sin_t_A), len(sin_b_A), len(wavelengths_um))
+    """
+    sin_t_A = np.asarray(sin_t_A, dtype=float)
+    sin_b_A = np.asarray(sin_b_A, dtype=float)
+    wavelengths_um = np.asarray(wavelengths_um, dtype=float)
+
+    t_top, t_bot = np.meshgrid(sin_t_A * TO_UM, sin_b_A * TO_UM, indexing="ij")
+    t_top, t_bot = t_top.ravel(), t_bot.ravel()
+    T = np.empty((t_top.size, wavelengths_um.size))
+    R = np.empty_like(T)
+    for start in range(0, t_top.size, chunk_size):
+        stop = start + chunk_size
+        T[start:stop], R[start:stop] = rt(t_top[start:stop, None], t_bot[start:stop, None],
+                                          wavelengths_um[None, :], **stack_kwargs)
+    shape = (sin_t_A.size, sin_b_A.size, wavelengths_um.size)
+    return T.reshape(shape), R.reshape(shape)
+
+
+# --- 3. CANDIDATE SELECTION ---
+def select_candidates(sin_t_A, sin_b_A, T, wavelengths_um, targets=TARGET_WL, t_min=T_MIN, top_k=TOP_K):
+    """
+    Ranks the grid by mean transmission (%) at the target wavelengths and keeps the
+    designs above t_min, at most top_k of them.
+    :return: DataFrame with SiN_T, SiN_B (Angstrom), one T column per target and Mean_T (%)
+    """
+    wavelengths_um = np.asarray(wavelengths_um, dtype=float)
+    idx = [int(np.abs(wavelengths_um - wl).argmin()) for wl in targets]
+    t_targets = T[:, :, idx] * 100
+
+    t_grid, b_grid = np.meshgrid(sin_t_A, sin_b_A, indexing="ij")
+    df = pd.DataFrame({"SiN_T": t_grid.ravel(), "SiN_B": b_grid.ravel()})
+    for i, wl in enumerate(targets):
+        df[f"T_{wl}"] = t_targets[:, :, i].ravel()
+    df["Mean_T"] = t_targets.mean(axis=2).ravel()
+
+    df = df[df["Mean_T"] >= t_min].sort_values("Mean_T", ascending=False)
+    return df.head(top_k).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    # --- 4. RUN PRESCREEN ---
+    sin_t_A = np.arange(SIN_T_RANGE[0], SIN_T_RANGE[1] + SIN_T_RANGE[2], SIN_T_RANGE[2])
+    sin_b_A = np.arange(SIN_B_RANGE[0], SIN_B_RANGE[1] + SIN_B_RANGE[2], SIN_B_RANGE[2])
+    wavelengths = np.union1d(lambdas_23, TARGET_WL)
+
+    start = time.perf_counter()
+    T, R = prescreen_grid(sin_t_A, sin_b_A, wavelengths,
+                          rt=stack_rt if SUBSTRATE == "coherent" else incoherent_stack_rt)
+    elapsed = time.perf_counter() - start
+    n_designs = sin_t_A.size * sin_b_A.size
+    print(f"Evaluated {n_designs} designs x {wavelengths.size} wavelengths in {elapsed:.2f} s")
+
+    candidates = select_candidates(sin_t_A, sin_b_A, T, wavelengths)
+
+    # --- 5. SAVE DOE FOR THE JOB SCRIPTS ---
+    # SiN_T / SiN_B columns in Angstrom, the same format the job scripts read
+    out_dir = os.path.dirname(OUTPUT_FILE)
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    candidates.to_excel(OUTPUT_FILE, index=False)
+
+    print("\n" + "="*40)
+    print(f"{len(candidates)} of {n_designs} designs pass Mean T >= {T_MIN}%")
+    print(candidates.head(10).to_string(index=False))
+    print(f"Prescreened DOE saved to: {OUTPUT_FILE}")
+    print("Point the job script's pd.read_excel(...) at this file to run only these designs.")
+    print("="*40)
@@ -1,9 +1,13 @@
-import h5py
 import numpy as np
 import pandas as pd
 import os
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
+from Build_Spectra_Store import update_spectra_store
+from Spectra_Extraction import (build_target_summary, distinct_grids, print_error_summary,
+                                to_wavelength_um, values_at_wavelengths)
+from Task_Registry import campaign_tasks
+from Polarization_Synthesis import circular_spectra
 
 # --- 1. CONFIGURATION ---
 CACHE_DIR = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thickness_750to1200_Circular_polar_tasks"
@@ -13,74 +17,13 @@ PLOT_DIR = r"C:\Users\ssatter\Documents\Midnight\ARC_T_SiN_1947_B_SiN_23_var_thi
 # Target Wavelengths
 TARGET_WL = [0.795, 0.8, 0.895]
 
-# Paths within HDF5
-T_PATH = "data/0/flux/__xarray_dataarray_variable__"
-R_PATH = "data/1/flux/__xarray_dataarray_variable__"
-FREQ_PATH = "data/0/flux/f" 
+# POLARIZATION_MODE the campaign was run with (see the job script): sets the normalization
+# (Polarization_Synthesis.MODE_BEAMS) and, for "synthesize", merges the x- and y-polarized runs
+POLARIZATION_MODE = "dual_source"
+JONES = "circular"
 
-if not os.path.exists(PLOT_DIR):
-    os.makedirs(PLOT_DIR)
 
-# --- 2. LOAD TASK MAPPING ---
-try:
-    mapping_df = pd.read_excel(EXCEL_FILE)
-    # Ensure Task ID is treated as a string to match filename parsing
-    name_mapping = dict(zip(mapping_df["Task ID"].astype(str), mapping_df["Task Name"]))
-    print(f"Loaded {len(name_mapping)} task mappings.")
-except Exception as e:
-    print(f"Error reading Excel: {e}")
-    name_mapping = {}
-
-# --- 3. DATA EXTRACTION ---
-results_list = []
-wavelengths_set = False
-indices = []
-
-files = [f for f in os.listdir(CACHE_DIR) if f.endswith(".hdf5")]
-print(f"Extracting data at {TARGET_WL} from {len(files)} files...")
-
-for filename in files:
-    filepath = os.path.join(CACHE_DIR, filename)
-    task_id = filename.replace(".hdf5", "")
-    run_name = name_mapping.get(task_id, task_id)
-    
-    try:
-        with h5py.File(filepath, "r") as f:
-            if FREQ_PATH in f and not wavelengths_set:
-                freqs = f[FREQ_PATH][()]
-                wavelengths = 299792458 / freqs * 1e6
-                # Find the closest data indices for our targets
-                indices = [np.abs(wavelengths - t).argmin() for t in TARGET_WL]
-                actual_wl = [wavelengths[i] for i in indices]
-                print(f"Mapped targets to actual simulation wavelengths: {np.round(actual_wl, 4)}")
-                wavelengths_set = True
-
-            if T_PATH in f and R_PATH in f:
-                t_vals = (np.abs(f[T_PATH][()]) * 100)/2
-                r_vals = (np.abs(f[R_PATH][()]) * 100)/2
-                
-                # Extract values at specific indices
-                for i, target in enumerate(TARGET_WL):
-                    results_list.append({
-                        "Run Name": run_name,
-                        "Target Wavelength": target,
-                        "Transmission (%)": t_vals[indices[i]],
-                        "Reflection (%)": r_vals[indices[i]]
-                    })
-    except Exception as e:
-        print(f"   [!] Error reading {filename}: {e}")
-
-# --- 4. FORMAT RESULTS ---
-summary_df = pd.DataFrame(results_list)
-
-# Diagnostic: Check for duplicates that would crash a standard .pivot()
-duplicates = summary_df.duplicated(subset=["Run Name", "Target Wavelength"]).any()
-if duplicates:
-    print("Note: Found duplicate Run Names for the same wavelength. These will be averaged in the plot.")
-
-summary_df.to_csv(os.path.join(PLOT_DIR, "DOE_Target_Summary.csv"), index=False)
-
-# --- 5. PLOTTING TARGET VARIATION ---
+# --- 2. PLOTTING TARGET VARIATION ---
 def plot_target_comparison(metric):
     plt.figure(figsize=(16, 8), dpi=300)
     plt.title(f"DOE Comparison at Target Wavelengths: {metric}", fontsize=16, fontweight='bold')
@@ -105,13 +48,54 @@ def plot_target_comparison(metric):
     plt.close() # Free up memory
     print(f"Saved: {save_path}")
 
-# Run plotting functions
-if not summary_df.empty:
-    plot_target_comparison("Transmission (%)")
-    plot_target_comparison("Reflection (%)")
-else:
-    print("No data extracted. Check your HDF5 file paths or CACHE_DIR.")
 
-print("\n" + "="*40)
-print(f"DONE! Target summary CSV and plots created in {PLOT_DIR}")
-print("="*40)
\ No newline at end of file
+if __name__ == "__main__":
+    if not os.path.exists(PLOT_DIR):
+        os.makedirs(PLOT_DIR)
+
+    # --- 3. LOAD TASK MAPPING ---
+    try:
+        # Task IDs in the registry are stripped strings, matching the file names
+        name_mapping = campaign_tasks(EXCEL_FILE)["Task Name"].to_dict()
+        print(f"Loaded {len(name_mapping)} task mappings.")
+    except Exception as e:
+        print(f"Error reading task list: {e}")
+        name_mapping = {}
+
+    # --- 4. DATA EXTRACTION (incremental: only new or changed files are parsed) ---
+    spectra = update_spectra_store(CACHE_DIR)
+    print(f"Extracted data at {TARGET_WL} from {len(spectra['task_id'])} files.")
+    print_error_summary(spectra["errors"], len(spectra["task_id"]) + len(spectra["errors"]))
+    # One row per design, T and R as fractions of the total incident power
+    spectra = circular_spectra(spectra, name_mapping, POLARIZATION_MODE, JONES)
+
+    if len(spectra["task_id"]):
+        # Targets are interpolated between samples, per distinct frequency grid
+        grids, _ = distinct_grids(to_wavelength_um(spectra["freq"]))
+        covered = ~np.isnan(values_at_wavelengths(grids, np.ones_like(grids), TARGET_WL))
+        print(f"Interpolating targets on {len(grids)} distinct frequency grid(s)")
+        outside = np.asarray(TARGET_WL)[~covered.all(axis=0)]
+        if outside.size:
+            print(f"  [!] Outside the simulated range of some tasks (left blank): {outside}")
+
+    # --- 5. FORMAT RESULTS ---
+    # Normalized by the total incident power (circular_spectra above)
+    summary_df = build_target_summary(spectra, name_mapping, TARGET_WL, scale=100)
+
+    # Diagnostic: Check for duplicates that would crash a standard .pivot()
+    duplicates = summary_df.duplicated(subset=["Run Name", "Target Wavelength"]).any()
+    if duplicates:
+        print("Note: Found duplicate Run Names for the same wavelength. These will be averaged in the plot.")
+
+    summary_df.to_csv(os.path.join(PLOT_DIR, "DOE_Target_Summary.csv"), index=False)
+
+    # Run plotting functions
+    if not summary_df.empty:
+        plot_target_comparison("Transmission (%)")
+        plot_target_comparison("Reflection (%)")
+    else:
+        print("No data extracted. Check your HDF5 file paths or CACHE_DIR.")
+
+    print("\n" + "="*40)
+    print(f"DONE! Target summary CSV and plots created in {PLOT_DIR}")
+    print("="*40)
\ No newline at end of file